@@ -142,6 +142,174 @@ STATIC_URL = "/static/"
 # Postmark Configuration
 POSTMARK_API_TOKEN = config("POSTMARK_API_TOKEN", default="")
 POSTMARK_FROM_EMAIL = config("POSTMARK_FROM_EMAIL", default="noreply@yourdomain.com")
+POSTMARK_INBOUND_EMAIL = config(
+    "POSTMARK_INBOUND_EMAIL",
+    default="4c17207b2cb109e33fb619e01b59252c@inbound.postmarkapp.com",
+)
+# Point at a local stand-in to test or benchmark without the real API
+POSTMARK_API_URL = config("POSTMARK_API_URL", default="https://api.postmarkapp.com/")
+# Seconds before a Postmark request times out
+POSTMARK_TIMEOUT = config("POSTMARK_TIMEOUT", default=10.0, cast=float)
+# Keep-alive pools shared by every request in a worker process
+POSTMARK_POOL_CONNECTIONS = config("POSTMARK_POOL_CONNECTIONS", default=4, cast=int)
+POSTMARK_POOL_MAXSIZE = config("POSTMARK_POOL_MAXSIZE", default=10, cast=int)
 
 # Google Gemini AI configuration
 GEMINI_API_KEY = config("GEMINI_API_KEY", default="")
+# Empty uses the SDK's default endpoint
+GEMINI_API_URL = config("GEMINI_API_URL", default="")
+GEMINI_TIMEOUT = config("GEMINI_TIMEOUT", default=60.0, cast=float)
+GEMINI_POOL_MAXSIZE = config("GEMINI_POOL_MAXSIZE", default=10, cast=int)
+
+# Inbound routing: seconds before the in-process HOA routing index is
+# reloaded to pick up HOAs changed by other processes
+HOA_ROUTING_INDEX_TTL = config("HOA_ROUTING_INDEX_TTL", default=300, cast=int)
+
+# Inbound queue: the Postmark webhook stores payloads and returns 202, and
+# `manage.py process_inbound_queue` workers process them
+INBOUND_WEBHOOK_ASYNC = config("INBOUND_WEBHOOK_ASYNC", default=True, cast=bool)
+INBOUND_QUEUE_WORKERS = config("INBOUND_QUEUE_WORKERS", default=2, cast=int)
+INBOUND_QUEUE_BATCH_SIZE = config("INBOUND_QUEUE_BATCH_SIZE", default=20, cast=int)
+INBOUND_QUEUE_POLL_INTERVAL = config(
+    "INBOUND_QUEUE_POLL_INTERVAL", default=1.0, cast=float
+)
+INBOUND_QUEUE_VISIBILITY_TIMEOUT = config(
+    "INBOUND_QUEUE_VISIBILITY_TIMEOUT", default=60, cast=int
+)
+INBOUND_QUEUE_MAX_ATTEMPTS = config("INBOUND_QUEUE_MAX_ATTEMPTS", default=5, cast=int)
+INBOUND_QUEUE_RETRY_BACKOFF = config(
+    "INBOUND_QUEUE_RETRY_BACKOFF", default=30, cast=int
+)
+
+# Number of recently stored inbound message IDs remembered per process to
+# short-circuit Postmark retries without a database query
+INBOUND_RECENT_MESSAGE_IDS = config(
+    "INBOUND_RECENT_MESSAGE_IDS", default=10000, cast=int
+)
+
+# Content-addressed store for inbound email attachments
+ATTACHMENT_STORE_ROOT = config(
+    "ATTACHMENT_STORE_ROOT", default=f"{MEDIA_ROOT}/attachments"
+)
+
+# Number of rendered onboarding emails cached per process
+ONBOARDING_EMAIL_CACHE_SIZE = config(
+    "ONBOARDING_EMAIL_CACHE_SIZE", default=1000, cast=int
+)
+
+# Bulk onboarding campaigns: messages per Postmark batch call (max 500),
+# concurrent batch calls and threads rendering email bodies
+CAMPAIGN_BATCH_SIZE = config("CAMPAIGN_BATCH_SIZE", default=500, cast=int)
+CAMPAIGN_MAX_IN_FLIGHT = config("CAMPAIGN_MAX_IN_FLIGHT", default=4, cast=int)
+CAMPAIGN_RENDER_WORKERS = config("CAMPAIGN_RENDER_WORKERS", default=4, cast=int)
+
+# Transactional outbox: views queue emails in the same transaction as their
+# state change and `manage.py drain_outbox` delivers them
+OUTBOX_ENABLED = config("OUTBOX_ENABLED", default=True, cast=bool)
+OUTBOX_WORKERS = config("OUTBOX_WORKERS", default=1, cast=int)
+OUTBOX_BATCH_SIZE = config("OUTBOX_BATCH_SIZE", default=50, cast=int)
+# Concurrent sends per worker process
+OUTBOX_CONCURRENCY = config("OUTBOX_CONCURRENCY", default=8, cast=int)
+# Concurrent sends to one recipient domain, across all workers
+OUTBOX_DOMAIN_CONCURRENCY = config("OUTBOX_DOMAIN_CONCURRENCY", default=2, cast=int)
+OUTBOX_POLL_INTERVAL = config("OUTBOX_POLL_INTERVAL", default=1.0, cast=float)
+OUTBOX_VISIBILITY_TIMEOUT = config("OUTBOX_VISIBILITY_TIMEOUT", default=60, cast=int)
+OUTBOX_MAX_ATTEMPTS = config("OUTBOX_MAX_ATTEMPTS", default=8, cast=int)
+# Retry delays are drawn uniformly from [0, backoff * 2^(attempt - 1)],
+# capped at OUTBOX_MAX_BACKOFF seconds
+OUTBOX_RETRY_BACKOFF = config("OUTBOX_RETRY_BACKOFF", default=30, cast=int)
+OUTBOX_MAX_BACKOFF = config("OUTBOX_MAX_BACKOFF", default=3600, cast=int)
+
+# Token buckets shared by all workers through the database: sustained calls
+# per second and allowed burst for each provider, and how long a caller may
+# wait for a token before giving up
+POSTMARK_RATE_LIMIT = config("POSTMARK_RATE_LIMIT", default=10.0, cast=float)
+POSTMARK_RATE_BURST = config("POSTMARK_RATE_BURST", default=20.0, cast=float)
+GEMINI_RATE_LIMIT = config("GEMINI_RATE_LIMIT", default=2.0, cast=float)
+GEMINI_RATE_BURST = config("GEMINI_RATE_BURST", default=5.0, cast=float)
+RATE_LIMIT_TIMEOUT = config("RATE_LIMIT_TIMEOUT", default=30.0, cast=float)
+
+# Analyse a reply and write the follow-up in one structured Gemini call
+# instead of two sequential calls (can be overridden per request)
+GEMINI_SINGLE_CALL = config("GEMINI_SINGLE_CALL", default=True, cast=bool)
+
+# Cache of Gemini results keyed by content, HOA context, prompt version and
+# model: an in-process LRU in front of the LLMCacheEntry table
+LLM_CACHE_ENABLED = config("LLM_CACHE_ENABLED", default=True, cast=bool)
+LLM_CACHE_TTL = config("LLM_CACHE_TTL", default=30 * 24 * 3600, cast=int)
+LLM_CACHE_MAX_ENTRIES = config("LLM_CACHE_MAX_ENTRIES", default=10000, cast=int)
+LLM_CACHE_MEMORY_SIZE = config("LLM_CACHE_MEMORY_SIZE", default=512, cast=int)
+
+# Concurrent Gemini requests made by `manage.py analyze_responses`
+GEMINI_ANALYSIS_CONCURRENCY = config("GEMINI_ANALYSIS_CONCURRENCY", default=8, cast=int)
+
+# Rule-based extraction of numbered answers: replies it extracts with at least
+# LOCAL_EXTRACTOR_MIN_CONFIDENCE (0-1) skip the Gemini analysis, except for a
+# LOCAL_EXTRACTOR_SHADOW_RATE sample used to measure agreement with Gemini
+LOCAL_EXTRACTOR_ENABLED = config("LOCAL_EXTRACTOR_ENABLED", default=True, cast=bool)
+LOCAL_EXTRACTOR_MIN_CONFIDENCE = config(
+    "LOCAL_EXTRACTOR_MIN_CONFIDENCE", default=0.8, cast=float
+)
+LOCAL_EXTRACTOR_SHADOW_RATE = config(
+    "LOCAL_EXTRACTOR_SHADOW_RATE", default=0.05, cast=float
+)
+
+# Gemini resilience: overall deadline per call (seconds, covering retries),
+# retries with full-jitter backoff for 429/5xx/network errors, and a breaker
+# that opens for GEMINI_BREAKER_RESET seconds once at least
+# GEMINI_BREAKER_MIN_CALLS calls in a GEMINI_BREAKER_WINDOW second window
+# fail at GEMINI_BREAKER_FAILURE_RATE or more
+GEMINI_DEADLINE = config("GEMINI_DEADLINE", default=60.0, cast=float)
+GEMINI_MAX_RETRIES = config("GEMINI_MAX_RETRIES", default=2, cast=int)
+GEMINI_RETRY_BACKOFF = config("GEMINI_RETRY_BACKOFF", default=1.0, cast=float)
+GEMINI_MAX_BACKOFF = config("GEMINI_MAX_BACKOFF", default=10.0, cast=float)
+GEMINI_BREAKER_FAILURE_RATE = config(
+    "GEMINI_BREAKER_FAILURE_RATE", default=0.5, cast=float
+)
+GEMINI_BREAKER_MIN_CALLS = config("GEMINI_BREAKER_MIN_CALLS", default=10, cast=int)
+GEMINI_BREAKER_WINDOW = config("GEMINI_BREAKER_WINDOW", default=60.0, cast=float)
+GEMINI_BREAKER_RESET = config("GEMINI_BREAKER_RESET", default=30.0, cast=float)
+# Send a second request when the first has not answered after the recent p95
+# latency (GEMINI_HEDGE_DELAY seconds until enough latencies are known)
+GEMINI_HEDGE_ENABLED = config("GEMINI_HEDGE_ENABLED", default=False, cast=bool)
+GEMINI_HEDGE_DELAY = config("GEMINI_HEDGE_DELAY", default=5.0, cast=float)
+
+# LLM backend the analyzer sends prompts to: "gemini", or "offline" for a
+# deterministic local stand-in used to benchmark the pipeline without network
+LLM_BACKEND = config("LLM_BACKEND", default="gemini")
+# Offline backend latency spec (e.g. "lognormal:800,0.4", in milliseconds),
+# share of attempts failing with a retryable error, and random seed
+LLM_OFFLINE_LATENCY = config("LLM_OFFLINE_LATENCY", default="fixed:0")
+LLM_OFFLINE_FAILURE_RATE = config("LLM_OFFLINE_FAILURE_RATE", default=0.0, cast=float)
+LLM_OFFLINE_SEED = config("LLM_OFFLINE_SEED", default=0, cast=int)
+# Extra offline latency per 1,000 prompt tokens not served from the prefix cache
+LLM_OFFLINE_PREFILL_MS = config("LLM_OFFLINE_PREFILL_MS", default=0.0, cast=float)
+
+# Reuse the analysis of an earlier reply whose normalized text (with the HOA
+# name masked) has at least this estimated Jaccard similarity
+NEAR_DUPLICATE_ENABLED = config("NEAR_DUPLICATE_ENABLED", default=True, cast=bool)
+NEAR_DUPLICATE_THRESHOLD = config("NEAR_DUPLICATE_THRESHOLD", default=0.9, cast=float)
+
+# Models tried in order, cheapest first; a result is escalated to the next
+# model when its confidence is below GEMINI_ESCALATION_CONFIDENCE (0-100) or
+# it fails to parse
+GEMINI_MODELS = config(
+    "GEMINI_MODELS",
+    default="gemini-2.0-flash-lite-001,gemini-2.0-flash-001",
+    cast=Csv(),
+)
+GEMINI_ESCALATION_CONFIDENCE = config(
+    "GEMINI_ESCALATION_CONFIDENCE", default=70, cast=int
+)
+
+# Register the static instructions shared by every prompt as Gemini cached
+# content for GEMINI_PROMPT_CACHE_TTL seconds; prefixes shorter than
+# GEMINI_PROMPT_CACHE_MIN_TOKENS (Gemini's minimum) are sent inline first so
+# that implicit caching can still apply
+GEMINI_PROMPT_CACHE_ENABLED = config(
+    "GEMINI_PROMPT_CACHE_ENABLED", default=True, cast=bool
+)
+GEMINI_PROMPT_CACHE_TTL = config("GEMINI_PROMPT_CACHE_TTL", default=3600, cast=int)
+GEMINI_PROMPT_CACHE_MIN_TOKENS = config(
+    "GEMINI_PROMPT_CACHE_MIN_TOKENS", default=1024, cast=int
+)
@@ -1,6 +1,26 @@
+import json
+
 from django.contrib import admin
+from django.utils import timezone
+from django.utils.html import format_html
+
+from services.llm_metrics import summarize_calls
 
-from .models import HOA, EmailResponse, Property
+from .models import (
+    HOA,
+    Campaign,
+    CircuitBreakerState,
+    EmailAttachment,
+    EmailRawPayload,
+    EmailResponse,
+    InboundEmailJob,
+    LLMCacheEntry,
+    LLMCall,
+    OutboundEmail,
+    OutboxMessage,
+    Property,
+    RateLimitBucket,
+)
 
 
 @admin.register(HOA)
@@ -16,6 +36,7 @@ class HOAAdmin(admin.ModelAdmin):
     list_filter = ["management_company", "created_at", "established_date"]
     search_fields = ["name", "contact_email", "management_company", "address"]
     readonly_fields = ["created_at", "updated_at", "property_count"]
+    actions = ["create_campaign"]
     fieldsets = (
         (
             "Basic Information",
@@ -38,6 +59,19 @@ class HOAAdmin(admin.ModelAdmin):
         ),
     )
 
+    @admin.action(description="Create onboarding campaign for selected HOAs")
+    def create_campaign(self, request, queryset):
+        hoa_ids = list(queryset.values_list("id", flat=True))
+        campaign = Campaign.objects.create(
+            name=f"Admin campaign {timezone.now():%Y-%m-%d %H:%M}",
+            filters={"hoa_ids": hoa_ids},
+        )
+        self.message_user(
+            request,
+            f"Created campaign #{campaign.id} for {len(hoa_ids)} HOAs. "
+            "Run `python manage.py run_campaign --pending` to send it.",
+        )
+
 
 @admin.register(Property)
 class PropertyAdmin(admin.ModelAdmin):
@@ -75,6 +109,14 @@ class PropertyAdmin(admin.ModelAdmin):
     )
 
 
+class EmailAttachmentInline(admin.TabularInline):
+    model = EmailAttachment
+    extra = 0
+    can_delete = False
+    fields = ["name", "content_type", "size", "sha256"]
+    readonly_fields = ["name", "content_type", "size", "sha256"]
+
+
 @admin.register(EmailResponse)
 class EmailResponseAdmin(admin.ModelAdmin):
     list_display = [
@@ -87,17 +129,39 @@ class EmailResponseAdmin(admin.ModelAdmin):
     ]
     list_filter = ["status", "created_at", "hoa", "response_completeness_score"]
     search_fields = ["hoa__name", "from_email", "subject", "text_content"]
-    readonly_fields = ["created_at", "updated_at", "message_id", "content_preview"]
+    raw_id_fields = ["outbound_email"]
+    inlines = [EmailAttachmentInline]
+    readonly_fields = [
+        "created_at",
+        "updated_at",
+        "message_id",
+        "content_preview",
+        "raw_payload_json",
+    ]
 
     fieldsets = (
         (
             "Basic Information",
-            {"fields": ("hoa", "from_email", "subject", "message_id", "status")},
+            {
+                "fields": (
+                    "hoa",
+                    "outbound_email",
+                    "from_email",
+                    "subject",
+                    "message_id",
+                    "status",
+                )
+            },
         ),
         (
             "Email Content",
             {
-                "fields": ("text_content", "html_content", "raw_content"),
+                "fields": (
+                    "text_content",
+                    "html_content",
+                    "normalized_content",
+                    "raw_payload_json",
+                ),
                 "classes": ("collapse",),
             },
         ),
@@ -124,6 +188,10 @@ class EmailResponseAdmin(admin.ModelAdmin):
                     "ai_reasoning",
                     "ai_processed_at",
                     "response_completeness_score",
+                    "ai_call_count",
+                    "ai_latency_ms",
+                    "ai_input_tokens",
+                    "ai_output_tokens",
                 ),
                 "classes": ("collapse",),
             },
@@ -147,7 +215,243 @@ class EmailResponseAdmin(admin.ModelAdmin):
         ),
     )
 
+    @admin.display(description="Raw payload")
+    def raw_payload_json(self, obj):
+        # Only loaded on the change page, never for the changelist
+        try:
+            payload = obj.raw_payload.load()
+        except EmailRawPayload.DoesNotExist:
+            return "-"
+        return format_html("<pre>{}</pre>", json.dumps(payload, indent=2))
+
     def save_model(self, request, obj, form, change):
         # Auto-calculate completeness score when saving
         obj.calculate_completeness_score()
         super().save_model(request, obj, form, change)
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = [
+        "subject",
+        "hoa",
+        "to_email",
+        "template",
+        "status",
+        "error_code",
+        "message_id",
+        "campaign",
+        "sent_at",
+    ]
+    list_filter = ["template", "status", "campaign", "sent_at"]
+    search_fields = ["hoa__name", "to_email", "subject", "message_id"]
+    readonly_fields = ["message_id", "sent_at", "created_at", "updated_at"]
+    raw_id_fields = ["hoa", "campaign"]
+
+
+@admin.register(Campaign)
+class CampaignAdmin(admin.ModelAdmin):
+    list_display = [
+        "name",
+        "status",
+        "total_messages",
+        "sent_count",
+        "failed_count",
+        "created_at",
+        "finished_at",
+    ]
+    list_filter = ["status", "created_at"]
+    search_fields = ["name"]
+    readonly_fields = [
+        "status",
+        "total_messages",
+        "sent_count",
+        "failed_count",
+        "error_message",
+        "created_at",
+        "started_at",
+        "finished_at",
+    ]
+
+
+@admin.register(InboundEmailJob)
+class InboundEmailJobAdmin(admin.ModelAdmin):
+    list_display = [
+        "id",
+        "status",
+        "attempts",
+        "max_attempts",
+        "available_at",
+        "claimed_by",
+        "email_response",
+        "created_at",
+    ]
+    list_filter = ["status", "created_at"]
+    search_fields = ["last_error"]
+    readonly_fields = ["created_at", "updated_at", "claim_token", "claimed_by"]
+    actions = ["requeue_jobs"]
+
+    @admin.action(description="Requeue selected jobs")
+    def requeue_jobs(self, request, queryset):
+        count = queryset.exclude(status="done").update(
+            status="pending",
+            attempts=0,
+            available_at=timezone.now(),
+            claim_token=None,
+            updated_at=timezone.now(),
+        )
+        self.message_user(request, f"Requeued {count} inbound jobs.")
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = [
+        "id",
+        "outbound_email",
+        "destination_domain",
+        "status",
+        "attempts",
+        "max_attempts",
+        "available_at",
+        "created_at",
+    ]
+    list_filter = ["status", "destination_domain", "created_at"]
+    search_fields = ["idempotency_key", "destination_domain", "last_error"]
+    readonly_fields = [
+        "idempotency_key",
+        "created_at",
+        "updated_at",
+        "claim_token",
+        "claimed_by",
+    ]
+    raw_id_fields = ["outbound_email"]
+    actions = ["requeue_messages"]
+
+    @admin.action(description="Requeue selected messages")
+    def requeue_messages(self, request, queryset):
+        count = queryset.filter(status__in=["failed", "dead"]).update(
+            status="pending",
+            attempts=0,
+            available_at=timezone.now(),
+            claim_token=None,
+            updated_at=timezone.now(),
+        )
+        self.message_user(request, f"Requeued {count} outbox messages.")
+
+
+@admin.register(RateLimitBucket)
+class RateLimitBucketAdmin(admin.ModelAdmin):
+    list_display = [
+        "name",
+        "rate",
+        "capacity",
+        "acquired_count",
+        "rejected_count",
+        "waited_count",
+        "average_wait",
+        "max_wait",
+    ]
+    readonly_fields = [
+        "tokens",
+        "refilled_at",
+        "version",
+        "acquired_count",
+        "rejected_count",
+        "waited_count",
+        "total_wait_seconds",
+        "max_wait_seconds",
+    ]
+
+    @admin.display(description="Avg wait")
+    def average_wait(self, obj):
+        return f"{obj.average_wait_ms:.1f} ms"
+
+    @admin.display(description="Max wait")
+    def max_wait(self, obj):
+        return f"{obj.max_wait_seconds * 1000:.1f} ms"
+
+
+@admin.register(CircuitBreakerState)
+class CircuitBreakerStateAdmin(admin.ModelAdmin):
+    list_display = [
+        "name",
+        "state",
+        "total_calls",
+        "total_failures",
+        "timeouts",
+        "retries",
+        "hedges",
+        "hedge_wins",
+        "short_circuits",
+        "trips",
+    ]
+    readonly_fields = [
+        "window_started_at",
+        "window_calls",
+        "window_failures",
+        "opened_at",
+        "total_calls",
+        "total_failures",
+        "timeouts",
+        "retries",
+        "hedges",
+        "hedge_wins",
+        "short_circuits",
+        "trips",
+        "updated_at",
+    ]
+
+
+@admin.register(LLMCacheEntry)
+class LLMCacheEntryAdmin(admin.ModelAdmin):
+    list_display = [
+        "key_prefix",
+        "kind",
+        "prompt_version",
+        "model",
+        "hit_count",
+        "last_used_at",
+        "expires_at",
+    ]
+    list_filter = ["kind", "prompt_version", "model"]
+    search_fields = ["key"]
+    readonly_fields = ["key", "hit_count", "created_at", "last_used_at"]
+    actions = ["expire_entries"]
+
+    @admin.display(description="Key")
+    def key_prefix(self, obj):
+        return obj.key[:12]
+
+    @admin.action(description="Expire selected entries")
+    def expire_entries(self, request, queryset):
+        updated = queryset.update(expires_at=timezone.now())
+        self.message_user(request, f"Expired {updated} cache entries.")
+
+
+@admin.register(LLMCall)
+class LLMCallAdmin(admin.ModelAdmin):
+    list_display = [
+        "created_at",
+        "email_response",
+        "kind",
+        "model",
+        "prompt_version",
+        "success",
+        "wall_ms",
+        "ttfb_ms",
+        "input_tokens",
+        "output_tokens",
+        "cached_tokens",
+    ]
+    list_filter = ["kind", "model", "prompt_version", "success", "created_at"]
+    list_select_related = ["email_response"]
+    raw_id_fields = ["email_response"]
+    change_list_template = "admin/hoa_management/llmcall/change_list.html"
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        # Summarize the filtered calls, not just the current page
+        changelist = getattr(response, "context_data", {}).get("cl")
+        if changelist is not None:
+            response.context_data["summary"] = summarize_calls(changelist.queryset)
+        return response
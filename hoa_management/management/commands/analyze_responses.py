@@ -0,0 +1,246 @@
+import asyncio
+import time
+from datetime import date, datetime
+from datetime import time as dt_time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from hoa_management.models import EmailResponse
+from services.gemini_service import AI_RESULT_FIELDS, GeminiEmailAnalyzer
+from services.latency import percentiles
+from services.llm_backends import LLM_BACKENDS, get_llm_backend
+from services.near_duplicates import near_duplicate_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Analyze email responses that have not been through Gemini yet and store "
+        "the generated follow-ups; safe to interrupt and rerun"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--status",
+            action="append",
+            choices=[choice for choice, _label in EmailResponse.STATUS_CHOICES],
+            help="Only responses with this status (repeatable)",
+        )
+        parser.add_argument(
+            "--hoa-ids", help="Comma separated list of HOA ids to include"
+        )
+        parser.add_argument(
+            "--since", help="Only responses received on or after this date (YYYY-MM-DD)"
+        )
+        parser.add_argument(
+            "--until",
+            help="Only responses received on or before this date (YYYY-MM-DD)",
+        )
+        parser.add_argument("--limit", type=int, help="Stop after this many responses")
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.GEMINI_ANALYSIS_CONCURRENCY,
+            help=f"Concurrent Gemini requests (default: {settings.GEMINI_ANALYSIS_CONCURRENCY})",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Responses loaded and saved per batch (default: 100)",
+        )
+        parser.add_argument(
+            "--backend",
+            choices=sorted(LLM_BACKENDS),
+            help="LLM backend to use; offline benchmarks the pipeline without "
+            "network access (default: LLM_BACKEND)",
+        )
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument(
+            "--single-call",
+            dest="single_call",
+            action="store_const",
+            const=True,
+            help="Analyze and generate in one Gemini call",
+        )
+        mode.add_argument(
+            "--two-calls",
+            dest="single_call",
+            action="store_const",
+            const=False,
+            help="Use separate analysis and generation calls",
+        )
+
+    def parse_date(self, value: str, end_of_day: bool = False) -> datetime:
+        try:
+            day = date.fromisoformat(value)
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {value}") from e
+        return timezone.make_aware(
+            datetime.combine(day, dt_time.max if end_of_day else dt_time.min)
+        )
+
+    def build_queryset(self, options):
+        queryset = EmailResponse.objects.filter(ai_processed_at__isnull=True)
+        if options["status"]:
+            queryset = queryset.filter(status__in=options["status"])
+        if options["hoa_ids"]:
+            try:
+                hoa_ids = [int(hoa_id) for hoa_id in options["hoa_ids"].split(",")]
+            except ValueError as e:
+                raise CommandError("--hoa-ids must be comma separated ids") from e
+            queryset = queryset.filter(hoa_id__in=hoa_ids)
+        if options["since"]:
+            queryset = queryset.filter(
+                created_at__gte=self.parse_date(options["since"])
+            )
+        if options["until"]:
+            queryset = queryset.filter(
+                created_at__lte=self.parse_date(options["until"], end_of_day=True)
+            )
+        return queryset.order_by("id")
+
+    def handle(self, *args, **options):
+        try:
+            analyzer = GeminiEmailAnalyzer(get_llm_backend(options["backend"]))
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+
+        queryset = self.build_queryset(options)
+        total = queryset.count()
+        if options["limit"]:
+            total = min(total, options["limit"])
+        if not total:
+            self.stdout.write("No unprocessed email responses found.")
+            return
+
+        self.stdout.write(
+            f"Analyzing {total} email responses with concurrency {options['concurrency']}..."
+        )
+        started = time.perf_counter()
+        try:
+            summary = asyncio.run(self.run(analyzer, queryset, total, options))
+        except KeyboardInterrupt:
+            self.stdout.write(
+                self.style.WARNING("Interrupted; rerun to continue where it stopped.")
+            )
+            return
+        self.report(summary, time.perf_counter() - started)
+
+    async def run(self, analyzer, queryset, total, options) -> dict:
+        """Analyze responses batch by batch, saving each batch before the next"""
+        semaphore = asyncio.Semaphore(options["concurrency"])
+        summary = {
+            "processed": 0,
+            "failed": 0,
+            "cached": 0,
+            "local": 0,
+            "near_duplicate": 0,
+            "calls": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "latencies": [],
+        }
+        started = time.perf_counter()
+        last_id = 0
+
+        async def process(email_response):
+            async with semaphore:
+                call_started = time.perf_counter()
+                result = await analyzer.aprocess_email_response(
+                    email_response, options["single_call"]
+                )
+                return email_response, result, time.perf_counter() - call_started
+
+        while summary["processed"] + summary["failed"] < total:
+            remaining = total - summary["processed"] - summary["failed"]
+            batch = await sync_to_async(self.load_batch)(
+                queryset, last_id, min(options["batch_size"], remaining)
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            for group in await sync_to_async(self.split_batch)(analyzer, batch):
+                results = await asyncio.gather(*(process(er) for er in group))
+                await sync_to_async(self.save_batch)(analyzer, results, summary)
+
+            done = summary["processed"] + summary["failed"]
+            rate = done / (time.perf_counter() - started)
+            self.stdout.write(
+                f"  {done}/{total} done ({summary['failed']} failed), {rate:.1f} responses/s"
+            )
+        return summary
+
+    @staticmethod
+    def load_batch(queryset, last_id: int, size: int) -> list[EmailResponse]:
+        # Keyset pagination so failed responses are not picked up again this run
+        return list(
+            queryset.filter(id__gt=last_id)
+            .select_related("hoa")
+            .prefetch_related("hoa__properties")[:size]
+        )
+
+    @staticmethod
+    def split_batch(analyzer, batch: list[EmailResponse]) -> list[list[EmailResponse]]:
+        """
+        Hold back near-duplicates of other responses in the batch until those
+        are saved, so that they can reuse their analyses
+        """
+        if not settings.NEAR_DUPLICATE_ENABLED:
+            return [batch]
+        contents = [analyzer.email_content(er) for er in batch]
+        first, held_back = near_duplicate_index.split_batch(batch, contents)
+        return [group for group in (first, held_back) if group]
+
+    @staticmethod
+    def save_batch(analyzer, results, summary: dict) -> None:
+        """Store successful results; failures stay unprocessed for the next run"""
+        to_update = []
+        now = timezone.now()
+        for email_response, (analysis_result, follow_up, usage), elapsed in results:
+            summary["latencies"].append(elapsed)
+            if analysis_result.get("category") == "error":
+                summary["failed"] += 1
+                continue
+            analyzer.apply_result(email_response, analysis_result, follow_up, usage)
+            # bulk_update does not apply auto_now
+            email_response.updated_at = now
+            to_update.append(email_response)
+            summary["processed"] += 1
+            source = analysis_result.get("source")
+            if source == "near_duplicate":
+                summary["near_duplicate"] += 1
+            elif not usage["calls"]:
+                summary["cached"] += 1
+            if source == "local":
+                summary["local"] += 1
+            summary["calls"] += usage["calls"]
+            summary["input_tokens"] += usage["input_tokens"]
+            summary["output_tokens"] += usage["output_tokens"]
+
+        EmailResponse.objects.bulk_update(to_update, [*AI_RESULT_FIELDS, "updated_at"])
+
+    def report(self, summary: dict, elapsed: float) -> None:
+        done = summary["processed"] + summary["failed"]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Analyzed {summary['processed']} responses "
+                f"({summary['failed']} failed, {summary['cached']} from cache, "
+                f"{summary['local']} extracted locally, "
+                f"{summary['near_duplicate']} from near-duplicates) "
+                f"in {elapsed:.1f}s, {done / max(elapsed, 1e-9):.1f} responses/s"
+            )
+        )
+        self.stdout.write(
+            f"Gemini calls: {summary['calls']}, tokens: {summary['input_tokens']} in / "
+            f"{summary['output_tokens']} out"
+        )
+        latency = percentiles(sorted(summary["latencies"]))
+        if latency:
+            self.stdout.write(
+                "Per-response latency: "
+                + ", ".join(f"{name} {value:.0f} ms" for name, value in latency.items())
+            )
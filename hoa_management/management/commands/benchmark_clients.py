@@ -0,0 +1,83 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from services.clients import build_postmark_client, postmark_connection_stats
+from services.postmark_standin import PostmarkStandIn
+
+
+class Command(BaseCommand):
+    help = "Compare per-send latency of a fresh Postmark client per send against the shared pooled client"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sends",
+            type=int,
+            default=200,
+            help="Emails sent with each client strategy (default: 200)",
+        )
+        parser.add_argument(
+            "--api-url",
+            help="Postmark-compatible endpoint to send to "
+            "(default: an in-process stand-in server)",
+        )
+
+    def send(self, client) -> float:
+        """Send one email and return its latency in milliseconds"""
+        started = time.perf_counter()
+        client.emails.send(
+            From="benchmark@example.com",
+            To="hoa@example.com",
+            Subject="Benchmark",
+            HtmlBody="<p>Benchmark</p>",
+        )
+        return (time.perf_counter() - started) * 1000
+
+    def report(self, label: str, latencies: list[float]) -> float:
+        latencies = sorted(latencies)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        mean = statistics.mean(latencies)
+        self.stdout.write(
+            f"{label}: mean {mean:.2f} ms, "
+            f"p50 {statistics.median(latencies):.2f} ms, p95 {p95:.2f} ms"
+        )
+        return mean
+
+    def handle(self, *args, **options):
+        sends = options["sends"]
+        standin = None
+        api_url = options["api_url"]
+        if not api_url:
+            standin = PostmarkStandIn(port=0).start()
+            api_url = standin.url
+        self.stdout.write(f"Sending {sends} emails per strategy to {api_url}")
+
+        try:
+            # Previous behaviour: every EmailService built its own client
+            fresh = []
+            for _i in range(sends):
+                client = build_postmark_client("benchmark-token", api_url)
+                fresh.append(self.send(client))
+                client.session.close()
+
+            pooled_client = build_postmark_client("benchmark-token", api_url)
+            pooled = [self.send(pooled_client) for _i in range(sends)]
+        finally:
+            if standin:
+                standin.stop()
+
+        fresh_mean = self.report("Fresh client per send", fresh)
+        pooled_mean = self.report("Shared pooled client", pooled)
+
+        stats = postmark_connection_stats(pooled_client)
+        self.stdout.write(
+            f"Pooled client: {stats['requests']} requests over "
+            f"{stats['connections_opened']} connections"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Per-send latency reduced by {fresh_mean - pooled_mean:.2f} ms "
+                f"({fresh_mean / pooled_mean:.1f}x)"
+            )
+        )
@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 
-from hoa_management.models import HOA, EmailResponse
+from hoa_management.models import HOA, EmailRawPayload, EmailResponse
 
 
 class Command(BaseCommand):
@@ -48,11 +48,14 @@ Best regards,
 John Smith
 Board President
 {hoa.name}""",
-            raw_content='{"sample": "postmark webhook data"}',
             response_completeness_score=0,  # Will be calculated by LLM later
             status="new",
         )
 
+        EmailRawPayload.from_payload(
+            sample_response.id, {"sample": "postmark webhook data"}
+        ).save(force_insert=True)
+
         self.stdout.write(
             self.style.SUCCESS(
                 f"Successfully created sample email response for {hoa.name} (ID: {sample_response.id})"
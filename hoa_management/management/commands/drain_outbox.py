@@ -0,0 +1,87 @@
+import multiprocessing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from services.outbox import EmailOutbox
+
+
+def run_outbox_worker(batch_size, poll_interval, once, concurrency):
+    """Entry point for a single outbox worker process"""
+    # Never share the parent's database connection across processes
+    connections.close_all()
+    EmailOutbox(concurrency=concurrency).run_worker(
+        batch_size=batch_size, poll_interval=poll_interval, once=once
+    )
+
+
+class Command(BaseCommand):
+    help = "Run a pool of workers that deliver emails queued in the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.OUTBOX_WORKERS,
+            help=f"Number of worker processes (default: {settings.OUTBOX_WORKERS})",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.OUTBOX_BATCH_SIZE,
+            help=f"Messages claimed per batch (default: {settings.OUTBOX_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.OUTBOX_POLL_INTERVAL,
+            help="Seconds to wait when no message is due",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.OUTBOX_CONCURRENCY,
+            help=f"Concurrent sends per worker (default: {settings.OUTBOX_CONCURRENCY})",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no message is due instead of polling forever",
+        )
+
+    def handle(self, *args, **options):
+        num_workers = options["workers"]
+        worker_args = (
+            options["batch_size"],
+            options["poll_interval"],
+            options["once"],
+            options["concurrency"],
+        )
+
+        self.stdout.write(f"Starting {num_workers} outbox workers...")
+
+        if num_workers <= 1:
+            run_outbox_worker(*worker_args)
+            self.stdout.write(self.style.SUCCESS("Outbox worker finished."))
+            return
+
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=run_outbox_worker, args=worker_args)
+            for _i in range(num_workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping outbox workers...")
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
+
+        self.stdout.write(self.style.SUCCESS("Outbox workers finished."))
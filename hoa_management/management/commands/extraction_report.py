@@ -0,0 +1,62 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from hoa_management.models import EmailResponse
+
+
+class Command(BaseCommand):
+    help = (
+        "Report how often the local extractor replaced the Gemini analysis and "
+        "how well it agreed with Gemini on the replies sent to both"
+    )
+
+    def handle(self, *args, **options):
+        results = EmailResponse.objects.filter(
+            ai_analysis_result__isnull=False
+        ).values_list("ai_analysis_result", flat=True)
+
+        analyzed = local = compared = confident = confident_agreed = 0
+        field_totals = Counter()
+        field_agreed = Counter()
+        for result in results.iterator():
+            if not isinstance(result, dict) or result.get("category") == "error":
+                continue
+            analyzed += 1
+            if result.get("source") == "local":
+                local += 1
+                continue
+
+            comparison = result.get("local_extraction")
+            if not comparison:
+                continue
+            compared += 1
+            agreement = comparison["agreement"]
+            for field, agreed in agreement.items():
+                field_totals[field] += 1
+                field_agreed[field] += agreed
+            if comparison["confidence"] >= settings.LOCAL_EXTRACTOR_MIN_CONFIDENCE:
+                # Shadow sample: the local result would have been used
+                confident += 1
+                confident_agreed += all(agreement.values())
+
+        if not analyzed:
+            self.stdout.write("No analyzed email responses found.")
+            return
+
+        self.stdout.write(f"Analyzed responses: {analyzed}")
+        self.stdout.write(
+            f"Gemini analysis skipped: {local} ({100 * local / analyzed:.1f}%)"
+        )
+        self.stdout.write(f"Compared with Gemini: {compared}")
+        if confident:
+            self.stdout.write(
+                f"Shadowed confident extractions fully agreeing with Gemini: "
+                f"{confident_agreed}/{confident} ({100 * confident_agreed / confident:.1f}%)"
+            )
+        for field in sorted(field_totals):
+            self.stdout.write(
+                f"  {field}: {field_agreed[field]}/{field_totals[field]} agree "
+                f"({100 * field_agreed[field] / field_totals[field]:.1f}%)"
+            )
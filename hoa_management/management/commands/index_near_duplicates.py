@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from hoa_management.models import EmailResponse
+from services.gemini_service import GeminiEmailAnalyzer
+from services.near_duplicates import near_duplicate_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Add analyzed email responses to the near-duplicate index so that later "
+        "near-identical replies can reuse their analyses"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Reindex responses that already have a signature",
+        )
+
+    def handle(self, *args, **options):
+        queryset = EmailResponse.objects.filter(
+            ai_analysis_result__isnull=False
+        ).select_related("hoa")
+        if not options["all"]:
+            queryset = queryset.filter(minhash_signature__isnull=True)
+
+        indexed = with_duplicate = 0
+        for email_response in queryset.iterator(chunk_size=500):
+            content = GeminiEmailAnalyzer.email_content(email_response)
+            if email_response.normalized_content is not None:
+                EmailResponse.objects.filter(pk=email_response.pk).update(
+                    normalized_content=email_response.normalized_content
+                )
+            # Indexes the response, then looks for an earlier near-duplicate
+            if near_duplicate_index.find(email_response, content):
+                with_duplicate += 1
+            indexed += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {indexed} email responses, {with_duplicate} of them "
+                f"with a near-duplicate"
+            )
+        )
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from hoa_management.models import LLMCacheEntry
+from services.gemini_service import GeminiEmailAnalyzer
+from services.llm_cache import llm_result_cache
+
+
+class Command(BaseCommand):
+    help = "Report on, prune or clear the Gemini result cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            help="Delete expired entries and trim the cache to LLM_CACHE_MAX_ENTRIES",
+        )
+        parser.add_argument(
+            "--clear", action="store_true", help="Delete every cache entry"
+        )
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            count = LLMCacheEntry.objects.count()
+            llm_result_cache.clear()
+            self.stdout.write(self.style.SUCCESS(f"Cleared {count} cache entries"))
+            return
+        if options["prune"]:
+            deleted = llm_result_cache.prune()
+            self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} cache entries"))
+
+        current = GeminiEmailAnalyzer.PROMPT_VERSION
+        rows = (
+            LLMCacheEntry.objects.values("kind", "prompt_version", "model")
+            .annotate(entries=Count("id"), hits=Sum("hit_count"))
+            .order_by("kind", "prompt_version", "model")
+        )
+        self.stdout.write(f"Current prompt version: {current}")
+        for row in rows:
+            stale = "" if row["prompt_version"] == current else " (stale)"
+            self.stdout.write(
+                f"  {row['kind']:<10} v{row['prompt_version']:<6} {row['model']}: "
+                f"{row['entries']} entries, {row['hits'] or 0} database hits{stale}"
+            )
+        if not rows:
+            self.stdout.write("  (empty)")
@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from hoa_management.models import LLMCall
+from services.llm_metrics import summarize_calls
+from services.resilience import gemini_breaker
+
+
+class Command(BaseCommand):
+    help = (
+        "Report latency percentiles and token usage of recorded Gemini calls "
+        "and the state of the Gemini circuit breaker"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=float, help="Only include calls from the last N days"
+        )
+        parser.add_argument(
+            "--kind",
+            choices=[kind for kind, _label in LLMCall._meta.get_field("kind").choices],
+            help="Only include one kind of call",
+        )
+        parser.add_argument("--model", help="Only include calls to this model")
+
+    def handle(self, *args, **options):
+        calls = LLMCall.objects.all()
+        if options["days"]:
+            calls = calls.filter(
+                created_at__gte=timezone.now() - timedelta(days=options["days"])
+            )
+        if options["kind"]:
+            calls = calls.filter(kind=options["kind"])
+        if options["model"]:
+            calls = calls.filter(model=options["model"])
+
+        summary = summarize_calls(calls)
+        if not summary["calls"]:
+            self.stdout.write("No Gemini calls recorded.")
+            return
+
+        self.stdout.write(
+            f"Gemini calls: {summary['calls']} ({summary['failures']} failed)"
+        )
+        self.stdout.write(
+            f"Tokens: {summary['input_tokens']} in "
+            f"({summary['cached_tokens']} cached, "
+            f"{100 * summary['cached_ratio']:.1f}%) / {summary['output_tokens']} out"
+        )
+        for label, key in (("Wall time", "wall_ms"), ("Time to first byte", "ttfb_ms")):
+            if summary[key]:
+                self.stdout.write(
+                    f"{label}: "
+                    + ", ".join(
+                        f"{name} {value:.0f} ms" for name, value in summary[key].items()
+                    )
+                )
+
+        self.stdout.write("By kind and model:")
+        for row in summary["by_kind"]:
+            self.stdout.write(
+                f"  {row['kind']:<10} tier {row['tier']} {row['model']}: "
+                f"{row['calls']} calls, {row['failures']} failed, "
+                f"{100 * row['escalation_rate']:.1f}% escalated, "
+                f"avg {row['avg_wall_ms']:.0f} ms, p95 {row['p95_wall_ms']:.0f} ms, "
+                f"{row['input_tokens']} in / {row['output_tokens']} out, "
+                f"{100 * row['cached_ratio']:.1f}% cached"
+            )
+            if row["avg_wall_cached_ms"] is not None:
+                uncached = row["avg_wall_uncached_ms"]
+                self.stdout.write(
+                    f"    {row['cached_calls']} calls with cached tokens: "
+                    f"avg {row['avg_wall_cached_ms']:.0f} ms"
+                    + (
+                        f" vs {uncached:.0f} ms without "
+                        f"({row['avg_wall_cached_ms'] - uncached:+.0f} ms)"
+                        if uncached is not None
+                        else ""
+                    )
+                )
+        self.stdout.write("By category:")
+        for row in summary["by_category"]:
+            self.stdout.write(
+                f"  {row['category']:<25} {row['calls']} calls, "
+                f"avg {row['avg_input']:.0f} tokens in, "
+                f"{row['input_tokens']} in / {row['output_tokens']} out"
+            )
+
+        breaker = gemini_breaker.stats()
+        self.stdout.write(
+            f"Circuit breaker: {breaker['state']}, {breaker['calls']} calls, "
+            f"{breaker['failures']} failed, {breaker['timeouts']} timed out, "
+            f"{breaker['retries']} retries, {breaker['hedges']} hedges "
+            f"({breaker['hedge_wins']} won), {breaker['short_circuits']} "
+            f"short-circuited, {breaker['trips']} trips"
+        )
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+from django.db.models.functions import Length
+
+from hoa_management.models import EmailRawPayload, EmailResponse
+
+
+class Command(BaseCommand):
+    help = "Report raw payload compression savings and EmailResponse row-fetch timings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=500,
+            help="Email responses fetched per timing run (default: 500)",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Timing runs per query, the best run is reported (default: 5)",
+        )
+
+    def time_query(self, build_queryset, repeat: int) -> float:
+        """Return the best wall time in milliseconds for evaluating a queryset"""
+        best = float("inf")
+        for _i in range(repeat):
+            started = time.perf_counter()
+            list(build_queryset())
+            best = min(best, time.perf_counter() - started)
+        return best * 1000
+
+    def handle(self, *args, **options):
+        totals = EmailRawPayload.objects.aggregate(
+            count=Count("pk"),
+            original=Sum("original_size"),
+            compressed=Sum(Length("data")),
+        )
+        count = totals["count"]
+        original = totals["original"] or 0
+        compressed = totals["compressed"] or 0
+
+        self.stdout.write(f"Raw payloads: {count}")
+        self.stdout.write(f"Uncompressed JSON: {original / 1024:.1f} KiB")
+        self.stdout.write(f"Stored (zlib): {compressed / 1024:.1f} KiB")
+        if original:
+            self.stdout.write(
+                f"Size reduction: {100 * (1 - compressed / original):.1f}% "
+                f"({original / max(compressed, 1):.1f}x)"
+            )
+
+        rows = options["rows"]
+        repeat = options["repeat"]
+
+        # Current layout: list and detail queries never touch the payload table
+        slim_ms = self.time_query(lambda: EmailResponse.objects.all()[:rows], repeat)
+        # Previous layout: every row carried the full payload inline
+        inline_ms = self.time_query(
+            lambda: EmailResponse.objects.select_related("raw_payload")[:rows],
+            repeat,
+        )
+
+        self.stdout.write(f"Fetch {rows} rows without payload: {slim_ms:.2f} ms")
+        self.stdout.write(f"Fetch {rows} rows with payload: {inline_ms:.2f} ms")
+        if slim_ms:
+            self.stdout.write(
+                self.style.SUCCESS(f"Row-fetch speedup: {inline_ms / slim_ms:.2f}x")
+            )
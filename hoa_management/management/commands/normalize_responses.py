@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from hoa_management.models import EmailResponse
+from services.email_normalizer import estimate_tokens, normalize_email_response
+
+
+class Command(BaseCommand):
+    help = (
+        "Store the normalized body of email responses and report how many prompt "
+        "tokens normalization saves"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Renormalize responses that already have a normalized body",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="Responses updated per query (default: 200)",
+        )
+
+    def handle(self, *args, **options):
+        queryset = EmailResponse.objects.select_related("hoa").order_by("id")
+        if not options["all"]:
+            queryset = queryset.filter(normalized_content__isnull=True)
+
+        raw_tokens = normalized_tokens = 0
+        reductions = []
+        batch = []
+        started = time.perf_counter()
+
+        for email_response in queryset.iterator(chunk_size=options["batch_size"]):
+            # What the prompts embedded before normalization
+            raw = email_response.text_content or email_response.html_content or ""
+            email_response.normalized_content = normalize_email_response(email_response)
+            before = estimate_tokens(raw)
+            after = estimate_tokens(email_response.normalized_content)
+            raw_tokens += before
+            normalized_tokens += after
+            if before:
+                reductions.append(1 - after / before)
+
+            batch.append(email_response)
+            if len(batch) >= options["batch_size"]:
+                EmailResponse.objects.bulk_update(batch, ["normalized_content"])
+                batch = []
+        if batch:
+            EmailResponse.objects.bulk_update(batch, ["normalized_content"])
+
+        count = len(reductions)
+        if not count:
+            self.stdout.write("No email responses to normalize.")
+            return
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Normalized {count} email responses in {elapsed:.1f}s "
+                f"({count / max(elapsed, 1e-9):.0f}/s)"
+            )
+        )
+        self.stdout.write(
+            f"Estimated content tokens: {raw_tokens} before, {normalized_tokens} after "
+            f"({100 * (1 - normalized_tokens / max(raw_tokens, 1)):.1f}% fewer)"
+        )
+        reductions.sort()
+        median = reductions[count // 2]
+        p10 = reductions[int(count * 0.1)]
+        self.stdout.write(
+            f"Per-response reduction: median {100 * median:.1f}%, "
+            f"p10 {100 * p10:.1f}% (least reduced tenth)"
+        )
@@ -0,0 +1,76 @@
+import multiprocessing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from services.inbound_queue import InboundEmailQueue
+
+
+def run_queue_worker(batch_size, poll_interval, once):
+    """Entry point for a single inbound queue worker process"""
+    # Never share the parent's database connection across processes
+    connections.close_all()
+    InboundEmailQueue().run_worker(
+        batch_size=batch_size, poll_interval=poll_interval, once=once
+    )
+
+
+class Command(BaseCommand):
+    help = "Run a pool of workers that process queued Postmark inbound emails"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.INBOUND_QUEUE_WORKERS,
+            help=f"Number of worker processes (default: {settings.INBOUND_QUEUE_WORKERS})",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.INBOUND_QUEUE_BATCH_SIZE,
+            help=f"Jobs claimed per batch (default: {settings.INBOUND_QUEUE_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.INBOUND_QUEUE_POLL_INTERVAL,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is drained instead of polling forever",
+        )
+
+    def handle(self, *args, **options):
+        num_workers = options["workers"]
+        worker_args = (options["batch_size"], options["poll_interval"], options["once"])
+
+        self.stdout.write(f"Starting {num_workers} inbound queue workers...")
+
+        if num_workers <= 1:
+            run_queue_worker(*worker_args)
+            self.stdout.write(self.style.SUCCESS("Inbound queue worker finished."))
+            return
+
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=run_queue_worker, args=worker_args)
+            for _i in range(num_workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping inbound queue workers...")
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
+
+        self.stdout.write(self.style.SUCCESS("Inbound queue workers finished."))
@@ -0,0 +1,185 @@
+import gzip
+import json
+import time
+from collections.abc import Iterator
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, transaction
+
+from hoa_management.models import EmailAttachment, EmailRawPayload, EmailResponse
+from services.email_processor import EmailResponseProcessor
+
+
+class Command(BaseCommand):
+    help = "Replay archived Postmark inbound payloads from an NDJSON file (optionally gzipped)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to an .ndjson or .ndjson.gz archive")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Payloads resolved and inserted per chunk (default: 1000)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Resolve and de-duplicate payloads without inserting them",
+        )
+
+    def iter_payloads(self, path: str) -> Iterator[dict]:
+        """Stream payloads from the archive one line at a time"""
+        with open(path, "rb") as probe:
+            is_gzip = probe.read(2) == b"\x1f\x8b"
+        opener = gzip.open if is_gzip else open
+
+        with opener(path, "rt", encoding="utf-8") as archive:
+            for line_number, line in enumerate(archive, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    self.stats["malformed"] += 1
+                    self.stderr.write(f"Skipping malformed JSON on line {line_number}")
+
+    def handle(self, *args, **options):
+        processor = EmailResponseProcessor()
+        chunk_size = options["chunk_size"]
+        dry_run = options["dry_run"]
+        self.stats = {
+            "read": 0,
+            "inserted": 0,
+            "duplicates": 0,
+            "unroutable": 0,
+            "malformed": 0,
+        }
+
+        try:
+            payloads = self.iter_payloads(options["path"])
+            started = time.perf_counter()
+
+            while chunk := list(islice(payloads, chunk_size)):
+                self.stats["read"] += len(chunk)
+                self.replay_chunk(processor, chunk, dry_run)
+
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{self.stats['read']} read, {self.stats['inserted']} inserted "
+                    f"({self.stats['read'] / max(elapsed, 1e-9):.0f} rows/s)"
+                )
+        except OSError as e:
+            raise CommandError(f"Could not read {options['path']}: {e}") from e
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Replayed {self.stats['read']} payloads in {elapsed:.1f}s "
+                f"({self.stats['read'] / max(elapsed, 1e-9):.0f} rows/s): "
+                f"{self.stats['inserted']} inserted, "
+                f"{self.stats['duplicates']} duplicates, "
+                f"{self.stats['unroutable']} unroutable, "
+                f"{self.stats['malformed']} malformed"
+                + (" (dry run)" if dry_run else "")
+            )
+        )
+
+    @staticmethod
+    def insert(email_responses: list[EmailResponse]) -> list[EmailResponse]:
+        """
+        Insert email responses, skipping message_ids stored concurrently
+
+        Returns:
+            The responses this call inserted, with their primary keys set
+        """
+        if connection.features.can_return_rows_from_bulk_insert:
+            try:
+                with transaction.atomic():
+                    return EmailResponse.objects.bulk_create(email_responses)
+            except IntegrityError:
+                # The webhook stored one of them meanwhile
+                pass
+        inserted = []
+        for email_response in email_responses:
+            email_response.pk = None
+            try:
+                with transaction.atomic():
+                    email_response.save(force_insert=True)
+            except IntegrityError:
+                continue
+            inserted.append(email_response)
+        return inserted
+
+    def replay_chunk(
+        self, processor: EmailResponseProcessor, chunk: list[dict], dry_run: bool
+    ) -> None:
+        """Resolve, de-duplicate and bulk insert one chunk of payloads"""
+        routes = processor.resolve_routes(chunk)
+
+        # One query per chunk to find messages that are already stored
+        message_ids = {payload.get("MessageID", "") for payload in chunk}
+        seen = set(
+            EmailResponse.objects.filter(message_id__in=message_ids).values_list(
+                "message_id", flat=True
+            )
+        )
+
+        email_responses = []
+        payloads_by_message_id = {}
+        for payload, (hoa, outbound_email) in zip(chunk, routes, strict=True):
+            if hoa is None:
+                self.stats["unroutable"] += 1
+                continue
+            message_id = payload.get("MessageID", "")
+            if message_id in seen:
+                self.stats["duplicates"] += 1
+                continue
+            seen.add(message_id)
+            payloads_by_message_id[message_id] = payload
+            email_responses.append(
+                processor.build_email_response(payload, hoa, outbound_email)
+            )
+
+        if dry_run or not email_responses:
+            self.stats["inserted"] += len(email_responses)
+            return
+
+        # Attachment files are written before the rows that reference them
+        extracted = {
+            message_id: processor.extract_attachments(payload)
+            for message_id, payload in payloads_by_message_id.items()
+        }
+
+        with transaction.atomic():
+            # Messages stored by the webhook since the chunk was de-duplicated
+            existing = set(
+                EmailResponse.objects.filter(
+                    message_id__in=payloads_by_message_id
+                ).values_list("message_id", flat=True)
+            )
+            new_responses = [
+                email_response
+                for email_response in email_responses
+                if email_response.message_id not in existing
+            ]
+            inserted = self.insert(new_responses)
+            self.stats["duplicates"] += len(email_responses) - len(inserted)
+
+            raw_payloads = []
+            attachments = []
+            for email_response in inserted:
+                stored_payload, message_attachments = extracted[
+                    email_response.message_id
+                ]
+                raw_payloads.append(
+                    EmailRawPayload.from_payload(email_response.id, stored_payload)
+                )
+                for attachment in message_attachments:
+                    attachment.email_response_id = email_response.id
+                    attachments.append(attachment)
+
+            EmailRawPayload.objects.bulk_create(raw_payloads, ignore_conflicts=True)
+            EmailAttachment.objects.bulk_create(attachments)
+        self.stats["inserted"] += len(inserted)
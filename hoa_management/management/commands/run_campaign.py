@@ -0,0 +1,116 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from hoa_management.models import Campaign
+from services.campaign_service import CampaignRunner
+
+
+class Command(BaseCommand):
+    help = "Send onboarding emails to a selection of HOAs through Postmark's batch API"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--name", help="Name for a new campaign")
+        parser.add_argument(
+            "--management-company", help="Only HOAs managed by this company"
+        )
+        parser.add_argument(
+            "--name-contains", help="Only HOAs whose name contains this text"
+        )
+        parser.add_argument(
+            "--hoa-ids", help="Comma separated list of HOA ids to include"
+        )
+        parser.add_argument(
+            "--not-contacted",
+            action="store_true",
+            help="Skip HOAs that already received an onboarding email",
+        )
+        parser.add_argument(
+            "--demo-email", help="Demo address all campaign emails are sent to"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Messages per Postmark batch call (default: CAMPAIGN_BATCH_SIZE)",
+        )
+        parser.add_argument(
+            "--max-in-flight",
+            type=int,
+            help="Concurrent batch calls (default: CAMPAIGN_MAX_IN_FLIGHT)",
+        )
+        parser.add_argument(
+            "--render-workers",
+            type=int,
+            help="Threads rendering email bodies (default: CAMPAIGN_RENDER_WORKERS)",
+        )
+        parser.add_argument(
+            "--campaign-id",
+            type=int,
+            help="Resume an existing campaign instead of creating one",
+        )
+        parser.add_argument(
+            "--pending",
+            action="store_true",
+            help="Run every pending campaign (e.g. those created from the admin)",
+        )
+
+    def handle(self, *args, **options):
+        if options["pending"]:
+            campaigns = list(Campaign.objects.filter(status="pending"))
+        elif options["campaign_id"]:
+            try:
+                campaigns = [Campaign.objects.get(pk=options["campaign_id"])]
+            except Campaign.DoesNotExist as e:
+                raise CommandError(
+                    f"Campaign {options['campaign_id']} does not exist"
+                ) from e
+        else:
+            filters = {"not_contacted": options["not_contacted"]}
+            if options["hoa_ids"]:
+                try:
+                    filters["hoa_ids"] = [
+                        int(hoa_id) for hoa_id in options["hoa_ids"].split(",")
+                    ]
+                except ValueError as e:
+                    raise CommandError("--hoa-ids must be comma separated ids") from e
+            if options["management_company"]:
+                filters["management_company"] = options["management_company"]
+            if options["name_contains"]:
+                filters["name_contains"] = options["name_contains"]
+            campaigns = [
+                Campaign.objects.create(
+                    name=options["name"]
+                    or f"Onboarding campaign {timezone.now():%Y-%m-%d %H:%M}",
+                    filters=filters,
+                    demo_email=options["demo_email"],
+                )
+            ]
+
+        if not campaigns:
+            self.stdout.write("No campaigns to run")
+            return
+
+        runner = CampaignRunner(
+            batch_size=options["batch_size"],
+            max_in_flight=options["max_in_flight"],
+            render_workers=options["render_workers"],
+        )
+        for campaign in campaigns:
+            self.stdout.write(f"Running campaign #{campaign.id}: {campaign.name}")
+            started = time.perf_counter()
+            campaign = runner.run(campaign)
+            elapsed = time.perf_counter() - started
+
+            summary = (
+                f"Campaign #{campaign.id} {campaign.status}: "
+                f"{campaign.sent_count} sent, {campaign.failed_count} failed "
+                f"of {campaign.total_messages} in {elapsed:.1f}s "
+                f"({campaign.total_messages / max(elapsed, 1e-9):.0f} emails/s)"
+            )
+            if campaign.status == "completed":
+                self.stdout.write(self.style.SUCCESS(summary))
+            else:
+                self.stdout.write(self.style.ERROR(summary))
+                if campaign.error_message:
+                    self.stderr.write(campaign.error_message)
@@ -0,0 +1,98 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from services.postmark_standin import PostmarkStandIn
+
+
+class Command(BaseCommand):
+    help = "Run a local Postmark stand-in server for load and latency testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1", help="Bind address")
+        parser.add_argument(
+            "--port", type=int, default=8025, help="Port to listen on (default: 8025)"
+        )
+        parser.add_argument(
+            "--latency",
+            default="fixed:0",
+            help="Request latency in ms: fixed:50, uniform:20,80, exponential:50, "
+            "lognormal:50,0.5 or normal:50,10 (default: fixed:0)",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of requests failing with HTTP 500",
+        )
+        parser.add_argument(
+            "--throttle-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of requests failing with HTTP 429",
+        )
+        parser.add_argument(
+            "--max-rps",
+            type=float,
+            help="Requests per second above which requests get HTTP 429",
+        )
+        parser.add_argument(
+            "--reject-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of messages rejected as inactive recipients (ErrorCode 406)",
+        )
+        parser.add_argument(
+            "--webhook-url",
+            help="Inbound webhook to post simulated replies to, e.g. "
+            "http://127.0.0.1:8000/webhook/postmark-inbound/",
+        )
+        parser.add_argument(
+            "--reply-rate",
+            type=float,
+            default=1.0,
+            help="Fraction of accepted messages answered with a reply (default: 1.0)",
+        )
+        parser.add_argument(
+            "--reply-delay",
+            default="fixed:0",
+            help="Delay before a reply is posted, same format as --latency",
+        )
+        parser.add_argument(
+            "--server-token",
+            help="Only accept this X-Postmark-Server-Token (default: any token)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            standin = PostmarkStandIn(
+                host=options["host"],
+                port=options["port"],
+                latency=options["latency"],
+                error_rate=options["error_rate"],
+                throttle_rate=options["throttle_rate"],
+                reject_rate=options["reject_rate"],
+                max_rps=options["max_rps"],
+                webhook_url=options["webhook_url"],
+                reply_rate=options["reply_rate"] if options["webhook_url"] else 0.0,
+                reply_delay=options["reply_delay"],
+                server_token=options["server_token"],
+            )
+        except (ValueError, OSError) as e:
+            raise CommandError(str(e)) from e
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Postmark stand-in listening on {standin.url}")
+        )
+        self.stdout.write(
+            f"Point the app at it with POSTMARK_API_URL={standin.url} "
+            "and any POSTMARK_API_TOKEN; statistics at /stats"
+        )
+        try:
+            standin.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stats = standin.stats()
+            standin.stop()
+        self.stdout.write(json.dumps(stats, indent=2))
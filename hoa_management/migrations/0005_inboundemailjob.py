@@ -0,0 +1,38 @@
+# Generated by Django 5.0.9 on 2026-10-18 12:39
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hoa_management', '0004_hoa_demo_email_used'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboundEmailJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.TextField(help_text='Raw webhook request body')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('rejected', 'Rejected'), ('dead', 'Dead Letter')], default='pending', help_text='Processing status of the job', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Number of times a worker has claimed this job')),
+                ('max_attempts', models.PositiveIntegerField(default=5, help_text='Attempts allowed before the job is dead-lettered')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Job cannot be claimed before this time (visibility timeout or retry backoff)')),
+                ('claim_token', models.CharField(blank=True, db_index=True, help_text='Token identifying the current claim on this job', max_length=32, null=True)),
+                ('claimed_by', models.CharField(blank=True, help_text='Worker holding the claim', max_length=100, null=True)),
+                ('last_error', models.TextField(blank=True, help_text='Last error or rejection reason', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('email_response', models.ForeignKey(blank=True, help_text='Email response created from this payload', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inbound_jobs', to='hoa_management.emailresponse')),
+            ],
+            options={
+                'verbose_name': 'Inbound Email Job',
+                'verbose_name_plural': 'Inbound Email Jobs',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='hoa_managem_status_ac2c59_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.0.9 on 2026-10-18 12:42
+
+import ast
+import json
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def parse_raw_content(raw_content):
+    """Recover the payload from the str(dict) or JSON text stored previously"""
+    for parse in (json.loads, ast.literal_eval):
+        try:
+            return parse(raw_content)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            continue
+    return raw_content
+
+
+def move_raw_content(apps, schema_editor):
+    EmailResponse = apps.get_model('hoa_management', 'EmailResponse')
+    EmailRawPayload = apps.get_model('hoa_management', 'EmailRawPayload')
+
+    batch = []
+    rows = EmailResponse.objects.values_list('id', 'raw_content').iterator(chunk_size=500)
+    for email_response_id, raw_content in rows:
+        encoded = json.dumps(
+            parse_raw_content(raw_content), sort_keys=True, separators=(',', ':'), ensure_ascii=False
+        ).encode('utf-8')
+        batch.append(EmailRawPayload(
+            email_response_id=email_response_id,
+            codec='zlib',
+            data=zlib.compress(encoded),
+            original_size=len(encoded),
+        ))
+        if len(batch) >= 500:
+            EmailRawPayload.objects.bulk_create(batch)
+            batch = []
+    EmailRawPayload.objects.bulk_create(batch)
+
+
+def restore_raw_content(apps, schema_editor):
+    EmailResponse = apps.get_model('hoa_management', 'EmailResponse')
+    EmailRawPayload = apps.get_model('hoa_management', 'EmailRawPayload')
+
+    for raw_payload in EmailRawPayload.objects.iterator(chunk_size=500):
+        EmailResponse.objects.filter(pk=raw_payload.email_response_id).update(
+            raw_content=zlib.decompress(raw_payload.data).decode('utf-8')
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hoa_management', '0005_inboundemailjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailRawPayload',
+            fields=[
+                ('email_response', models.OneToOneField(help_text='Email response this payload belongs to', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='raw_payload', serialize=False, to='hoa_management.emailresponse')),
+                ('codec', models.CharField(choices=[('zlib', 'zlib')], default='zlib', help_text='Compression codec of the stored data', max_length=10)),
+                ('data', models.BinaryField(help_text='Compressed canonical JSON payload')),
+                ('original_size', models.PositiveIntegerField(help_text='Size of the uncompressed JSON payload in bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Email Raw Payload',
+                'verbose_name_plural': 'Email Raw Payloads',
+            },
+        ),
+        migrations.RunPython(move_raw_content, restore_raw_content),
+        # A default lets the column be re-added when migrating backwards
+        migrations.AlterField(
+            model_name='emailresponse',
+            name='raw_content',
+            field=models.TextField(default='', help_text='Full raw email content'),
+        ),
+        migrations.RemoveField(
+            model_name='emailresponse',
+            name='raw_content',
+        ),
+    ]
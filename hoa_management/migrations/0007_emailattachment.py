@@ -0,0 +1,32 @@
+# Generated by Django 5.0.9 on 2026-10-18 12:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hoa_management', '0006_emailrawpayload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailAttachment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Original file name', max_length=255)),
+                ('content_type', models.CharField(blank=True, help_text='MIME type reported by Postmark', max_length=100)),
+                ('size', models.PositiveBigIntegerField(help_text='File size in bytes')),
+                ('sha256', models.CharField(db_index=True, help_text='SHA-256 of the file content, used as its storage key', max_length=64)),
+                ('content_id', models.CharField(blank=True, help_text='Content-ID for inline attachments', max_length=255, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('email_response', models.ForeignKey(help_text='Email response this attachment was received with', on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='hoa_management.emailresponse')),
+            ],
+            options={
+                'verbose_name': 'Email Attachment',
+                'verbose_name_plural': 'Email Attachments',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.9 on 2026-10-18 12:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hoa_management', '0007_emailattachment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('to_email', models.EmailField(help_text='Address the email was delivered to', max_length=254)),
+                ('subject', models.CharField(help_text='Email subject line', max_length=500)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('hoa', models.ForeignKey(help_text='HOA this email was sent for', on_delete=django.db.models.deletion.CASCADE, related_name='outbound_emails', to='hoa_management.hoa')),
+            ],
+            options={
+                'verbose_name': 'Outbound Email',
+                'verbose_name_plural': 'Outbound Emails',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='emailresponse',
+            name='outbound_email',
+            field=models.ForeignKey(blank=True, help_text='Outbound email this response replied to', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='responses', to='hoa_management.outboundemail'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.9 on 2026-10-18 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hoa_management', '0008_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboundemail',
+            name='error_message',
+            field=models.TextField(blank=True, help_text='Error returned when sending failed', null=True),
+        ),
+        migrations.AddField(
+            model_name='outboundemail',
+            name='message_id',
+            field=models.CharField(blank=True, help_text='Message ID returned by Postmark', max_length=255, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='outboundemail',
+            name='sent_at',
+            field=models.DateTimeField(blank=True, help_text='When Postmark accepted the email', null=True),
+        ),
+        migrations.AddField(
+            model_name='outboundemail',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', help_text='Delivery status reported by Postmark', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='outboundemail',
+            name='template',
+            field=models.CharField(choices=[('onboarding', 'Onboarding Request'), ('follow_up', 'AI Follow-up')], default='onboarding', help_text='Kind of email that was sent', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='outboundemail',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.9 on 2026-10-18 12:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hoa_management', '0009_outboundemail_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Campaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Name of the campaign', max_length=200)),
+                ('filters', models.JSONField(blank=True, default=dict, help_text='HOA selection filters (hoa_ids, management_company, name_contains, not_contacted)')),
+                ('demo_email', models.EmailField(blank=True, help_text='Demo address all campaign emails are redirected to', max_length=254, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', help_text='Processing status of the campaign', max_length=20)),
+                ('total_messages', models.PositiveIntegerField(default=0, help_text='Number of emails attempted')),
+                ('sent_count', models.PositiveIntegerField(default=0, help_text='Number of emails accepted by Postmark')),
+                ('failed_count', models.PositiveIntegerField(default=0, help_text='Number of emails rejected or failed')),
+                ('error_message', models.TextField(blank=True, help_text='Error that stopped the campaign', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Campaign',
+                'verbose_name_plural': 'Campaigns',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='outboundemail',
+            name='error_code',
+            field=models.IntegerField(blank=True, help_text='Postmark error code when sending failed', null=True),
+        ),
+        migrations.AddField(
+            model_name='outboundemail',
+            name='campaign',
+            field=models.ForeignKey(blank=True, help_text='Campaign that sent this email', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='outbound_emails', to='hoa_management.campaign'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.9 on 2026-10-18 12:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hoa_management', '0010_campaign'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(help_text='Key that prevents the same email from being queued twice', max_length=255, unique=True)),
+                ('message', models.JSONField(help_text='Postmark message to send')),
+                ('destination_domain', models.CharField(db_index=True, help_text='Recipient domain, used to limit concurrent sends per destination', max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed'), ('dead', 'Dead Letter')], default='pending', help_text='Delivery status of the message', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Number of times a worker has claimed this message')),
+                ('max_attempts', models.PositiveIntegerField(default=8, help_text='Attempts allowed before the message is dead-lettered')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Message cannot be claimed before this time (visibility timeout or retry backoff)')),
+                ('claim_token', models.CharField(blank=True, db_index=True, help_text='Token identifying the current claim on this message', max_length=32, null=True)),
+                ('claimed_by', models.CharField(blank=True, help_text='Worker holding the claim', max_length=100, null=True)),
+                ('last_error', models.TextField(blank=True, help_text='Last delivery error', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('outbound_email', models.OneToOneField(help_text='Ledger entry updated once the email is delivered', on_delete=django.db.models.deletion.CASCADE, related_name='outbox_message', to='hoa_management.outboundemail')),
+            ],
+            options={
+                'verbose_name': 'Outbox Message',
+                'verbose_name_plural': 'Outbox Messages',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='hoa_managem_status_525ded_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.9 on 2026-10-18 12:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hoa_management', '0011_outbox_message'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Bucket name, e.g. postmark or gemini', max_length=50, unique=True)),
+                ('rate', models.FloatField(help_text='Tokens added per second')),
+                ('capacity', models.FloatField(help_text='Maximum tokens, i.e. the allowed burst')),
+                ('tokens', models.FloatField(help_text='Tokens available at refilled_at')),
+                ('refilled_at', models.FloatField(help_text='Unix time the token count was last brought up to date')),
+                ('version', models.PositiveBigIntegerField(default=0, help_text='Incremented on every update, used for compare-and-swap')),
+                ('acquired_count', models.PositiveBigIntegerField(default=0, help_text='Number of successful acquires')),
+                ('rejected_count', models.PositiveBigIntegerField(default=0, help_text='Number of acquires that gave up without a token')),
+                ('waited_count', models.PositiveBigIntegerField(default=0, help_text='Number of successful acquires that had to wait')),
+                ('total_wait_seconds', models.FloatField(default=0, help_text='Total time callers spent waiting for tokens')),
+                ('max_wait_seconds', models.FloatField(default=0, help_text='Longest time a caller waited for a token')),
+            ],
+            options={
+                'verbose_name': 'Rate Limit Bucket',
+                'verbose_name_plural': 'Rate Limit Buckets',
+                'ordering': ['name'],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.9 on 2026-10-18 13:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("hoa_management", "0012_rate_limit_bucket"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="emailresponse",
+            name="ai_call_count",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                help_text="Gemini calls made by the last AI processing",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="emailresponse",
+            name="ai_input_tokens",
+            field=models.PositiveIntegerField(
+                blank=True, help_text="Prompt tokens sent to Gemini", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="emailresponse",
+            name="ai_latency_ms",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Total Gemini call latency in milliseconds",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="emailresponse",
+            name="ai_output_tokens",
+            field=models.PositiveIntegerField(
+                blank=True, help_text="Tokens generated by Gemini", null=True
+            ),
+        ),
+    ]
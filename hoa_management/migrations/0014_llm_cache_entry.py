@@ -0,0 +1,97 @@
+# Generated by Django 5.0.9 on 2026-10-18 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("hoa_management", "0013_ai_call_metrics"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LLMCacheEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(
+                        help_text="SHA-256 of the cache key parts",
+                        max_length=64,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("analysis", "Analysis"),
+                            ("response", "Response Generation"),
+                            ("combined", "Analysis and Response"),
+                        ],
+                        help_text="Which Gemini call was cached",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "prompt_version",
+                    models.CharField(
+                        help_text="Prompt template version the result was produced with",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "model",
+                    models.CharField(help_text="Gemini model name", max_length=100),
+                ),
+                (
+                    "result",
+                    models.JSONField(
+                        help_text="Parsed result returned by the analyzer"
+                    ),
+                ),
+                (
+                    "hit_count",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Number of times the entry was served from the database",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "last_used_at",
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        help_text="When the entry was last written or served",
+                    ),
+                ),
+                (
+                    "expires_at",
+                    models.DateTimeField(
+                        help_text="Entry is ignored and pruned after this"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "LLM Cache Entry",
+                "verbose_name_plural": "LLM Cache Entries",
+                "ordering": ["-last_used_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["expires_at"], name="hoa_managem_expires_019e57_idx"
+                    ),
+                    models.Index(
+                        fields=["last_used_at"], name="hoa_managem_last_us_6f0e50_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.9 on 2026-10-18 13:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("hoa_management", "0014_llm_cache_entry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="emailresponse",
+            name="normalized_content",
+            field=models.TextField(
+                blank=True,
+                help_text="Reply text without HTML, quoted history, our template or signatures, as sent to Gemini",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,130 @@
+# Generated by Django 5.0.9 on 2026-10-18 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("hoa_management", "0015_normalized_content"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CircuitBreakerState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        help_text="Breaker name, e.g. gemini",
+                        max_length=50,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "state",
+                    models.CharField(
+                        choices=[
+                            ("closed", "Closed"),
+                            ("open", "Open"),
+                            ("half_open", "Half Open"),
+                        ],
+                        default="closed",
+                        help_text="Open breakers fail calls without making them",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "window_started_at",
+                    models.FloatField(
+                        default=0,
+                        help_text="Unix time the current counting window started",
+                    ),
+                ),
+                (
+                    "window_calls",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Calls completed in the current window"
+                    ),
+                ),
+                (
+                    "window_failures",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Failed calls in the current window"
+                    ),
+                ),
+                (
+                    "opened_at",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Unix time the breaker last opened",
+                        null=True,
+                    ),
+                ),
+                (
+                    "total_calls",
+                    models.PositiveBigIntegerField(
+                        default=0, help_text="Calls made through the breaker"
+                    ),
+                ),
+                (
+                    "total_failures",
+                    models.PositiveBigIntegerField(
+                        default=0,
+                        help_text="Calls that failed with a retryable error or timeout",
+                    ),
+                ),
+                (
+                    "timeouts",
+                    models.PositiveBigIntegerField(
+                        default=0, help_text="Calls that hit their deadline"
+                    ),
+                ),
+                (
+                    "retries",
+                    models.PositiveBigIntegerField(
+                        default=0, help_text="Attempts retried after a retryable error"
+                    ),
+                ),
+                (
+                    "hedges",
+                    models.PositiveBigIntegerField(
+                        default=0, help_text="Hedged second requests sent"
+                    ),
+                ),
+                (
+                    "hedge_wins",
+                    models.PositiveBigIntegerField(
+                        default=0, help_text="Hedged requests that answered first"
+                    ),
+                ),
+                (
+                    "short_circuits",
+                    models.PositiveBigIntegerField(
+                        default=0,
+                        help_text="Calls rejected because the breaker was open",
+                    ),
+                ),
+                (
+                    "trips",
+                    models.PositiveBigIntegerField(
+                        default=0, help_text="Number of times the breaker opened"
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Circuit Breaker",
+                "verbose_name_plural": "Circuit Breakers",
+                "ordering": ["name"],
+            },
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.0.9 on 2026-10-18 13:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("hoa_management", "0016_circuit_breaker"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LLMCall",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("analysis", "Analysis"),
+                            ("response", "Response Generation"),
+                            ("combined", "Analysis and Response"),
+                        ],
+                        help_text="Which Gemini call was made",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "model",
+                    models.CharField(help_text="Gemini model name", max_length=100),
+                ),
+                (
+                    "prompt_version",
+                    models.CharField(
+                        help_text="Prompt template version of the call", max_length=20
+                    ),
+                ),
+                ("success", models.BooleanField(default=True)),
+                (
+                    "error",
+                    models.TextField(
+                        blank=True, help_text="Error the call failed with"
+                    ),
+                ),
+                (
+                    "wall_ms",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Milliseconds from the call starting to it returning",
+                    ),
+                ),
+                (
+                    "ttfb_ms",
+                    models.PositiveIntegerField(
+                        blank=True,
+                        help_text="Milliseconds until the first chunk of the successful attempt arrived",
+                        null=True,
+                    ),
+                ),
+                ("input_tokens", models.PositiveIntegerField(default=0)),
+                ("output_tokens", models.PositiveIntegerField(default=0)),
+                (
+                    "cached_tokens",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Input tokens served from the provider's context cache",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "email_response",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="llm_calls",
+                        to="hoa_management.emailresponse",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "LLM Call",
+                "verbose_name_plural": "LLM Calls",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["created_at"], name="hoa_managem_created_3770ce_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.0.9 on 2026-10-18 13:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("hoa_management", "0017_llm_call"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="emailresponse",
+            name="minhash_signature",
+            field=models.JSONField(
+                blank=True,
+                help_text="MinHash signature of the normalized content, used to find near-duplicate replies",
+                null=True,
+            ),
+        ),
+        migrations.CreateModel(
+            name="NearDuplicateBand",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("band", models.PositiveSmallIntegerField(help_text="Band number")),
+                (
+                    "bucket",
+                    models.BigIntegerField(
+                        help_text="Hash of the band's signature rows"
+                    ),
+                ),
+                (
+                    "email_response",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="near_duplicate_bands",
+                        to="hoa_management.emailresponse",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Near-Duplicate Band",
+                "verbose_name_plural": "Near-Duplicate Bands",
+                "indexes": [
+                    models.Index(
+                        fields=["band", "bucket"], name="hoa_managem_band_beead0_idx"
+                    )
+                ],
+            },
+        ),
+    ]
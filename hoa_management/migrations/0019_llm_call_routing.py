@@ -0,0 +1,28 @@
+# Generated by Django 5.0.9 on 2026-10-18 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("hoa_management", "0018_near_duplicates"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="llmcall",
+            name="escalated",
+            field=models.BooleanField(
+                default=False,
+                help_text="Result was not confident enough or failed to parse, so the next model was called",
+            ),
+        ),
+        migrations.AddField(
+            model_name="llmcall",
+            name="tier",
+            field=models.PositiveSmallIntegerField(
+                default=0,
+                help_text="Position of the model in the route, 0 being the cheapest",
+            ),
+        ),
+    ]
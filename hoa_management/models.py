@@ -1,6 +1,10 @@
+import json
+import zlib
+
 from django.contrib.auth.models import User
 from django.core.validators import EmailValidator, RegexValidator
 from django.db import models
+from django.utils import timezone
 
 
 class HOA(models.Model):
@@ -123,6 +127,134 @@ class Property(models.Model):
         return f"{self.address} ({self.get_property_type_display()})"
 
 
+class Campaign(models.Model):
+    """
+    Model representing a bulk onboarding email campaign
+    Each email sent by the campaign is recorded as an OutboundEmail
+    """
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
+
+    name = models.CharField(max_length=200, help_text="Name of the campaign")
+    filters = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="HOA selection filters (hoa_ids, management_company, name_contains, not_contacted)",
+    )
+    demo_email = models.EmailField(
+        blank=True,
+        null=True,
+        help_text="Demo address all campaign emails are redirected to",
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default="pending",
+        help_text="Processing status of the campaign",
+    )
+    total_messages = models.PositiveIntegerField(
+        default=0, help_text="Number of emails attempted"
+    )
+    sent_count = models.PositiveIntegerField(
+        default=0, help_text="Number of emails accepted by Postmark"
+    )
+    failed_count = models.PositiveIntegerField(
+        default=0, help_text="Number of emails rejected or failed"
+    )
+    error_message = models.TextField(
+        blank=True, null=True, help_text="Error that stopped the campaign"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Campaign"
+        verbose_name_plural = "Campaigns"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return self.name
+
+
+class OutboundEmail(models.Model):
+    """
+    Model representing an email sent to an HOA
+    Its id is encoded in the reply-to mailbox hash so replies route back to it
+    """
+
+    hoa = models.ForeignKey(
+        HOA,
+        on_delete=models.CASCADE,
+        related_name="outbound_emails",
+        help_text="HOA this email was sent for",
+    )
+    TEMPLATE_CHOICES = [
+        ("onboarding", "Onboarding Request"),
+        ("follow_up", "AI Follow-up"),
+    ]
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    ]
+
+    to_email = models.EmailField(help_text="Address the email was delivered to")
+    subject = models.CharField(max_length=500, help_text="Email subject line")
+    template = models.CharField(
+        max_length=20,
+        choices=TEMPLATE_CHOICES,
+        default="onboarding",
+        help_text="Kind of email that was sent",
+    )
+    message_id = models.CharField(
+        max_length=255,
+        unique=True,
+        blank=True,
+        null=True,
+        help_text="Message ID returned by Postmark",
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default="pending",
+        help_text="Delivery status reported by Postmark",
+    )
+    error_code = models.IntegerField(
+        null=True, blank=True, help_text="Postmark error code when sending failed"
+    )
+    error_message = models.TextField(
+        blank=True, null=True, help_text="Error returned when sending failed"
+    )
+    campaign = models.ForeignKey(
+        Campaign,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="outbound_emails",
+        help_text="Campaign that sent this email",
+    )
+    sent_at = models.DateTimeField(
+        null=True, blank=True, help_text="When Postmark accepted the email"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Outbound Email"
+        verbose_name_plural = "Outbound Emails"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.subject} ({self.hoa.name})"
+
+
 class EmailResponse(models.Model):
     """
     Model representing an email response received from an HOA
@@ -145,15 +277,32 @@ class EmailResponse(models.Model):
     )
     from_email = models.EmailField(help_text="Email address of the sender")
     subject = models.CharField(max_length=500, help_text="Email subject line")
+    outbound_email = models.ForeignKey(
+        OutboundEmail,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="responses",
+        help_text="Outbound email this response replied to",
+    )
 
-    # Email content
-    raw_content = models.TextField(help_text="Full raw email content")
+    # Email content (the full Postmark payload lives in EmailRawPayload)
     html_content = models.TextField(
         blank=True, null=True, help_text="HTML version of email content"
     )
     text_content = models.TextField(
         blank=True, null=True, help_text="Plain text version of email content"
     )
+    normalized_content = models.TextField(
+        blank=True,
+        null=True,
+        help_text="Reply text without HTML, quoted history, our template or signatures, as sent to Gemini",
+    )
+    minhash_signature = models.JSONField(
+        blank=True,
+        null=True,
+        help_text="MinHash signature of the normalized content, used to find near-duplicate replies",
+    )
 
     # Parsed responses to our 7 questions
     manages_properties = models.BooleanField(
@@ -224,6 +373,18 @@ class EmailResponse(models.Model):
     ai_processed_at = models.DateTimeField(
         null=True, blank=True, help_text="When this response was processed by AI"
     )
+    ai_call_count = models.PositiveSmallIntegerField(
+        null=True, blank=True, help_text="Gemini calls made by the last AI processing"
+    )
+    ai_latency_ms = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Total Gemini call latency in milliseconds"
+    )
+    ai_input_tokens = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Prompt tokens sent to Gemini"
+    )
+    ai_output_tokens = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Tokens generated by Gemini"
+    )
     generated_response_sent = models.BooleanField(
         default=False, help_text="Whether the AI-generated response has been sent"
     )
@@ -253,3 +414,488 @@ class EmailResponse(models.Model):
         # For now, just return 0 - will be calculated by LLM processing
         self.response_completeness_score = 0
         return self.response_completeness_score
+
+
+class EmailRawPayload(models.Model):
+    """
+    Model holding the full Postmark payload of an email response as
+    compressed canonical JSON, kept out of the EmailResponse row so list and
+    detail queries never load it
+    """
+
+    CODEC_CHOICES = [
+        ("zlib", "zlib"),
+    ]
+
+    email_response = models.OneToOneField(
+        EmailResponse,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="raw_payload",
+        help_text="Email response this payload belongs to",
+    )
+    codec = models.CharField(
+        max_length=10,
+        choices=CODEC_CHOICES,
+        default="zlib",
+        help_text="Compression codec of the stored data",
+    )
+    data = models.BinaryField(help_text="Compressed canonical JSON payload")
+    original_size = models.PositiveIntegerField(
+        help_text="Size of the uncompressed JSON payload in bytes"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Email Raw Payload"
+        verbose_name_plural = "Email Raw Payloads"
+
+    def __str__(self):
+        return f"Raw payload for email response {self.email_response_id}"
+
+    @classmethod
+    def from_payload(cls, email_response_id: int, payload) -> "EmailRawPayload":
+        """Build an unsaved raw payload from a decoded Postmark payload"""
+        encoded = json.dumps(
+            payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+        ).encode("utf-8")
+        return cls(
+            email_response_id=email_response_id,
+            codec="zlib",
+            data=zlib.compress(encoded),
+            original_size=len(encoded),
+        )
+
+    def load(self):
+        """Decompress and decode the stored payload"""
+        return json.loads(zlib.decompress(self.data))
+
+    @property
+    def compressed_size(self):
+        """Return the stored size of the payload in bytes"""
+        return len(self.data)
+
+
+class EmailAttachment(models.Model):
+    """
+    Model representing an attachment received with an email response
+    The file itself lives in the content-addressed attachment store
+    """
+
+    email_response = models.ForeignKey(
+        EmailResponse,
+        on_delete=models.CASCADE,
+        related_name="attachments",
+        help_text="Email response this attachment was received with",
+    )
+    name = models.CharField(max_length=255, help_text="Original file name")
+    content_type = models.CharField(
+        max_length=100, blank=True, help_text="MIME type reported by Postmark"
+    )
+    size = models.PositiveBigIntegerField(help_text="File size in bytes")
+    sha256 = models.CharField(
+        max_length=64,
+        db_index=True,
+        help_text="SHA-256 of the file content, used as its storage key",
+    )
+    content_id = models.CharField(
+        max_length=255,
+        blank=True,
+        null=True,
+        help_text="Content-ID for inline attachments",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Email Attachment"
+        verbose_name_plural = "Email Attachments"
+        ordering = ["id"]
+
+    def __str__(self):
+        return self.name
+
+
+class InboundEmailJob(models.Model):
+    """
+    Model representing a queued Postmark inbound webhook payload waiting to be
+    processed by the inbound queue workers
+    """
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("processing", "Processing"),
+        ("done", "Done"),
+        ("rejected", "Rejected"),
+        ("dead", "Dead Letter"),
+    ]
+
+    payload = models.TextField(help_text="Raw webhook request body")
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default="pending",
+        help_text="Processing status of the job",
+    )
+    attempts = models.PositiveIntegerField(
+        default=0, help_text="Number of times a worker has claimed this job"
+    )
+    max_attempts = models.PositiveIntegerField(
+        default=5, help_text="Attempts allowed before the job is dead-lettered"
+    )
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Job cannot be claimed before this time (visibility timeout or retry backoff)",
+    )
+    claim_token = models.CharField(
+        max_length=32,
+        blank=True,
+        null=True,
+        db_index=True,
+        help_text="Token identifying the current claim on this job",
+    )
+    claimed_by = models.CharField(
+        max_length=100, blank=True, null=True, help_text="Worker holding the claim"
+    )
+    last_error = models.TextField(
+        blank=True, null=True, help_text="Last error or rejection reason"
+    )
+    email_response = models.ForeignKey(
+        EmailResponse,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="inbound_jobs",
+        help_text="Email response created from this payload",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Inbound Email Job"
+        verbose_name_plural = "Inbound Email Jobs"
+        ordering = ["created_at"]
+        indexes = [models.Index(fields=["status", "available_at"])]
+
+    def __str__(self):
+        return f"Inbound job {self.id} ({self.get_status_display()})"
+
+
+class OutboxMessage(models.Model):
+    """
+    Model representing an outbound email waiting in the transactional outbox
+    It is written in the same transaction as the OutboundEmail it delivers and
+    sent by the `drain_outbox` workers
+    """
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("sending", "Sending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+        ("dead", "Dead Letter"),
+    ]
+    # Settled without being delivered; only these may be queued again
+    UNDELIVERED_STATUSES = ["failed", "dead"]
+
+    outbound_email = models.OneToOneField(
+        OutboundEmail,
+        on_delete=models.CASCADE,
+        related_name="outbox_message",
+        help_text="Ledger entry updated once the email is delivered",
+    )
+    idempotency_key = models.CharField(
+        max_length=255,
+        unique=True,
+        help_text="Key that prevents the same email from being queued twice",
+    )
+    message = models.JSONField(help_text="Postmark message to send")
+    destination_domain = models.CharField(
+        max_length=255,
+        db_index=True,
+        help_text="Recipient domain, used to limit concurrent sends per destination",
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default="pending",
+        help_text="Delivery status of the message",
+    )
+    attempts = models.PositiveIntegerField(
+        default=0, help_text="Number of times a worker has claimed this message"
+    )
+    max_attempts = models.PositiveIntegerField(
+        default=8, help_text="Attempts allowed before the message is dead-lettered"
+    )
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Message cannot be claimed before this time (visibility timeout or retry backoff)",
+    )
+    claim_token = models.CharField(
+        max_length=32,
+        blank=True,
+        null=True,
+        db_index=True,
+        help_text="Token identifying the current claim on this message",
+    )
+    claimed_by = models.CharField(
+        max_length=100, blank=True, null=True, help_text="Worker holding the claim"
+    )
+    last_error = models.TextField(
+        blank=True, null=True, help_text="Last delivery error"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Outbox Message"
+        verbose_name_plural = "Outbox Messages"
+        ordering = ["created_at"]
+        indexes = [models.Index(fields=["status", "available_at"])]
+
+    def __str__(self):
+        return f"Outbox message {self.id} ({self.get_status_display()})"
+
+
+class RateLimitBucket(models.Model):
+    """
+    Model representing a token bucket shared by every worker process
+    Tokens are taken with compare-and-swap updates on the version column
+    """
+
+    name = models.CharField(
+        max_length=50, unique=True, help_text="Bucket name, e.g. postmark or gemini"
+    )
+    rate = models.FloatField(help_text="Tokens added per second")
+    capacity = models.FloatField(help_text="Maximum tokens, i.e. the allowed burst")
+    tokens = models.FloatField(help_text="Tokens available at refilled_at")
+    refilled_at = models.FloatField(
+        help_text="Unix time the token count was last brought up to date"
+    )
+    version = models.PositiveBigIntegerField(
+        default=0, help_text="Incremented on every update, used for compare-and-swap"
+    )
+    acquired_count = models.PositiveBigIntegerField(
+        default=0, help_text="Number of successful acquires"
+    )
+    rejected_count = models.PositiveBigIntegerField(
+        default=0, help_text="Number of acquires that gave up without a token"
+    )
+    waited_count = models.PositiveBigIntegerField(
+        default=0, help_text="Number of successful acquires that had to wait"
+    )
+    total_wait_seconds = models.FloatField(
+        default=0, help_text="Total time callers spent waiting for tokens"
+    )
+    max_wait_seconds = models.FloatField(
+        default=0, help_text="Longest time a caller waited for a token"
+    )
+
+    class Meta:
+        verbose_name = "Rate Limit Bucket"
+        verbose_name_plural = "Rate Limit Buckets"
+        ordering = ["name"]
+
+    def __str__(self):
+        return f"{self.name} ({self.rate:g}/s, burst {self.capacity:g})"
+
+    @property
+    def average_wait_ms(self) -> float:
+        """Average wait per successful acquire in milliseconds"""
+        if not self.acquired_count:
+            return 0.0
+        return self.total_wait_seconds / self.acquired_count * 1000
+
+
+class LLMCacheEntry(models.Model):
+    """
+    Model representing a cached Gemini analysis or generation result
+    Keys hash the normalized email content, HOA context, prompt version and
+    model, so changing any of them misses the cache
+    """
+
+    KIND_CHOICES = [
+        ("analysis", "Analysis"),
+        ("response", "Response Generation"),
+        ("combined", "Analysis and Response"),
+    ]
+
+    key = models.CharField(
+        max_length=64, unique=True, help_text="SHA-256 of the cache key parts"
+    )
+    kind = models.CharField(
+        max_length=20, choices=KIND_CHOICES, help_text="Which Gemini call was cached"
+    )
+    prompt_version = models.CharField(
+        max_length=20, help_text="Prompt template version the result was produced with"
+    )
+    model = models.CharField(max_length=100, help_text="Gemini model name")
+    result = models.JSONField(help_text="Parsed result returned by the analyzer")
+    hit_count = models.PositiveIntegerField(
+        default=0, help_text="Number of times the entry was served from the database"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(
+        auto_now_add=True, help_text="When the entry was last written or served"
+    )
+    expires_at = models.DateTimeField(
+        help_text="Entry is ignored and pruned after this"
+    )
+
+    class Meta:
+        verbose_name = "LLM Cache Entry"
+        verbose_name_plural = "LLM Cache Entries"
+        ordering = ["-last_used_at"]
+        indexes = [
+            models.Index(fields=["expires_at"]),
+            models.Index(fields=["last_used_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.key[:12]} ({self.prompt_version}, {self.model})"
+
+
+class CircuitBreakerState(models.Model):
+    """
+    Model representing a circuit breaker shared by every worker process
+    Calls are counted in fixed windows; the breaker opens when the failure
+    rate of a window crosses the threshold
+    """
+
+    STATE_CHOICES = [
+        ("closed", "Closed"),
+        ("open", "Open"),
+        ("half_open", "Half Open"),
+    ]
+
+    name = models.CharField(
+        max_length=50, unique=True, help_text="Breaker name, e.g. gemini"
+    )
+    state = models.CharField(
+        max_length=20,
+        choices=STATE_CHOICES,
+        default="closed",
+        help_text="Open breakers fail calls without making them",
+    )
+    window_started_at = models.FloatField(
+        default=0, help_text="Unix time the current counting window started"
+    )
+    window_calls = models.PositiveIntegerField(
+        default=0, help_text="Calls completed in the current window"
+    )
+    window_failures = models.PositiveIntegerField(
+        default=0, help_text="Failed calls in the current window"
+    )
+    opened_at = models.FloatField(
+        null=True, blank=True, help_text="Unix time the breaker last opened"
+    )
+    total_calls = models.PositiveBigIntegerField(
+        default=0, help_text="Calls made through the breaker"
+    )
+    total_failures = models.PositiveBigIntegerField(
+        default=0, help_text="Calls that failed with a retryable error or timeout"
+    )
+    timeouts = models.PositiveBigIntegerField(
+        default=0, help_text="Calls that hit their deadline"
+    )
+    retries = models.PositiveBigIntegerField(
+        default=0, help_text="Attempts retried after a retryable error"
+    )
+    hedges = models.PositiveBigIntegerField(
+        default=0, help_text="Hedged second requests sent"
+    )
+    hedge_wins = models.PositiveBigIntegerField(
+        default=0, help_text="Hedged requests that answered first"
+    )
+    short_circuits = models.PositiveBigIntegerField(
+        default=0, help_text="Calls rejected because the breaker was open"
+    )
+    trips = models.PositiveBigIntegerField(
+        default=0, help_text="Number of times the breaker opened"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Circuit Breaker"
+        verbose_name_plural = "Circuit Breakers"
+        ordering = ["name"]
+
+    def __str__(self):
+        return f"{self.name} ({self.get_state_display()})"
+
+
+class LLMCall(models.Model):
+    """
+    Model representing one Gemini call made while processing an email response
+    Wall time covers retries and rate-limit waits; time to first byte is when
+    the first streamed chunk arrived
+    """
+
+    email_response = models.ForeignKey(
+        EmailResponse,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="llm_calls",
+    )
+    kind = models.CharField(
+        max_length=20,
+        choices=LLMCacheEntry.KIND_CHOICES,
+        help_text="Which Gemini call was made",
+    )
+    model = models.CharField(max_length=100, help_text="Gemini model name")
+    prompt_version = models.CharField(
+        max_length=20, help_text="Prompt template version of the call"
+    )
+    tier = models.PositiveSmallIntegerField(
+        default=0, help_text="Position of the model in the route, 0 being the cheapest"
+    )
+    escalated = models.BooleanField(
+        default=False,
+        help_text="Result was not confident enough or failed to parse, so the next model was called",
+    )
+    success = models.BooleanField(default=True)
+    error = models.TextField(blank=True, help_text="Error the call failed with")
+    wall_ms = models.PositiveIntegerField(
+        default=0, help_text="Milliseconds from the call starting to it returning"
+    )
+    ttfb_ms = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Milliseconds until the first chunk of the successful attempt arrived",
+    )
+    input_tokens = models.PositiveIntegerField(default=0)
+    output_tokens = models.PositiveIntegerField(default=0)
+    cached_tokens = models.PositiveIntegerField(
+        default=0, help_text="Input tokens served from the provider's context cache"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "LLM Call"
+        verbose_name_plural = "LLM Calls"
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["created_at"])]
+
+    def __str__(self):
+        return f"{self.kind} call for {self.email_response_id} ({self.wall_ms} ms)"
+
+
+class NearDuplicateBand(models.Model):
+    """
+    Model representing one LSH band of an email response's MinHash signature
+    Responses sharing a bucket in any band are candidate near-duplicates
+    """
+
+    email_response = models.ForeignKey(
+        EmailResponse, on_delete=models.CASCADE, related_name="near_duplicate_bands"
+    )
+    band = models.PositiveSmallIntegerField(help_text="Band number")
+    bucket = models.BigIntegerField(help_text="Hash of the band's signature rows")
+
+    class Meta:
+        verbose_name = "Near-Duplicate Band"
+        verbose_name_plural = "Near-Duplicate Bands"
+        indexes = [models.Index(fields=["band", "bucket"])]
+
+    def __str__(self):
+        return f"Band {self.band} of {self.email_response_id}"
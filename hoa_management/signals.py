@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from services.hoa_router import hoa_routing_index
+
+from .models import HOA
+
+
+@receiver(post_save, sender=HOA)
+def update_hoa_routing_index(sender, instance, **kwargs):
+    """Keep the in-process HOA routing index in sync with saved HOAs"""
+    hoa_routing_index.update(instance)
+
+
+@receiver(post_delete, sender=HOA)
+def remove_from_hoa_routing_index(sender, instance, **kwargs):
+    """Drop deleted HOAs from the in-process HOA routing index"""
+    hoa_routing_index.remove(instance.pk)
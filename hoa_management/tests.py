@@ -1 +1,1789 @@
-# Create your tests here.
+import io
+import json
+import random
+import tempfile
+import threading
+import time
+import zlib
+from unittest import mock
+
+import httpx
+import requests
+from asgiref.sync import async_to_sync
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from google.genai import errors
+from postmarker.exceptions import ClientError
+
+from hoa_management.management.commands.replay_inbound import (
+    Command as ReplayCommand,
+)
+from hoa_management.models import (
+    HOA,
+    Campaign,
+    EmailRawPayload,
+    EmailResponse,
+    InboundEmailJob,
+    LLMCacheEntry,
+    LLMCall,
+    OutboundEmail,
+    OutboxMessage,
+    Property,
+)
+from services.campaign_service import CampaignRunner
+from services.clients import (
+    ClientRegistry,
+    build_postmark_client,
+    get_postmark_client,
+    postmark_connection_stats,
+)
+from services.email_normalizer import estimate_tokens, normalize_email_body
+from services.email_processor import EmailResponseProcessor, recent_message_ids
+from services.email_service import EmailService, rendered_email_cache
+from services.gemini_service import PROMPT_PREFIXES, GeminiEmailAnalyzer
+from services.hoa_router import HOARoutingIndex
+from services.inbound_queue import InboundEmailQueue
+from services.latency import parse_latency, percentiles
+from services.llm_backends import GeminiBackend, OfflineBackend, get_llm_backend
+from services.llm_cache import LLMResultCache, llm_result_cache
+from services.llm_metrics import summarize_calls
+from services.local_extractor import extract_manages_properties
+from services.lru_cache import LRUCache
+from services.mailbox_hash import (
+    make_mailbox_hash,
+    parse_mailbox_hash,
+    reply_to_address,
+)
+from services.near_duplicates import NearDuplicateIndex, near_duplicate_index
+from services.outbox import EmailOutbox
+from services.postmark_standin import PostmarkStandIn
+from services.prompt_cache import prompt_prefix_cache
+from services.rate_limiter import RateLimitExceeded, TokenBucketRateLimiter
+from services.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ResilientCaller,
+    is_retryable,
+)
+
+
+class SimulatedEmailService(EmailService):
+    """EmailService that always simulates sends, whatever the environment"""
+
+    def __init__(self):
+        self.client = None
+
+
+def create_hoa(name: str, **kwargs) -> HOA:
+    return HOA.objects.create(
+        name=name,
+        address="1 Main St",
+        contact_email=f"{name.lower().replace(' ', '')}@example.com",
+        **kwargs,
+    )
+
+
+class CampaignSelectionTests(TestCase):
+    def setUp(self):
+        self.hoa = create_hoa("Oak Ridge HOA")
+        self.campaign = Campaign.objects.create(name="Resume")
+        # Failed in this campaign, sent by another one
+        OutboundEmail.objects.create(
+            hoa=self.hoa,
+            campaign=self.campaign,
+            to_email="demo@example.com",
+            subject="Onboarding",
+            status="failed",
+        )
+        OutboundEmail.objects.create(
+            hoa=self.hoa,
+            to_email="demo@example.com",
+            subject="Follow-up",
+            template="follow_up",
+            status="sent",
+        )
+
+    def test_not_contacted_requires_a_sent_onboarding_email(self):
+        hoas = CampaignRunner.select_hoas({"not_contacted": True})
+        self.assertEqual(list(hoas), [self.hoa])
+
+    def test_resume_retries_hoas_whose_send_failed(self):
+        campaign = CampaignRunner(SimulatedEmailService()).run(self.campaign)
+        self.assertEqual(campaign.status, "completed")
+        self.assertEqual(campaign.sent_count, 1)
+        self.assertTrue(
+            OutboundEmail.objects.filter(
+                hoa=self.hoa, campaign=campaign, status="sent"
+            ).exists()
+        )
+
+
+class CampaignResultTests(TestCase):
+    def test_failure_while_recording_does_not_record_the_batch_again(self):
+        hoa = create_hoa("Pine Hills HOA")
+        campaign = Campaign.objects.create(name="Record", filters={"hoa_ids": [hoa.id]})
+        runner = CampaignRunner(SimulatedEmailService())
+        calls = []
+
+        def record_results(*args):
+            calls.append(args)
+            raise RuntimeError("database went away")
+
+        runner._record_results = record_results
+        campaign = runner.run(campaign)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(campaign.status, "failed")
+
+
+class NearDuplicateTests(TestCase):
+    REPLY = (
+        "Hello,\n\nThanks for reaching out about {hoa}.\n\n"
+        "1. Yes, we manage all properties of {hoa}\n"
+        "2. Total units: 120\n"
+        "3. Monthly dues: $250 per unit\n"
+        "4. Contact: Jane Smith\n"
+        "5. Phone: 555-123-4567\n"
+        "6. Office: 100 Main St, Springfield, IL 62701\n"
+        "7. Email: jane@example.com\n\n"
+        "Best regards,\nJane"
+    )
+
+    def reply(self, hoa: HOA, text: str) -> EmailResponse:
+        return EmailResponse.objects.create(
+            hoa=hoa,
+            from_email="jane@example.com",
+            subject="Re: Property Management Information Request",
+            text_content=text,
+            normalized_content=text,
+            message_id=f"<{hoa.name}@example.com>",
+        )
+
+    def setUp(self):
+        source_hoa = create_hoa("Oak Ridge HOA")
+        self.source = self.reply(source_hoa, self.REPLY.format(hoa=source_hoa.name))
+        self.source.ai_analysis_result = {
+            "category": "complete_response",
+            "confidence": 95,
+            "extracted_data": {},
+        }
+        self.source.ai_generated_response = (
+            f"<p>Dear {source_hoa.name} team,</p><p>Thank you.</p>"
+        )
+        self.source.ai_processed_at = timezone.now()
+        self.source.save()
+        near_duplicate_index.index(self.source, self.source.normalized_content)
+        self.hoa = create_hoa("Pine Hills HOA")
+
+    def test_reply_differing_only_in_hoa_name_reuses_analysis(self):
+        text = self.REPLY.format(hoa=self.hoa.name)
+        adapted = near_duplicate_index.adapt(self.reply(self.hoa, text), text)
+        self.assertIsNotNone(adapted)
+        analysis_result, follow_up = adapted
+        self.assertEqual(analysis_result["near_duplicate_of"], self.source.id)
+        self.assertIn(self.hoa.name, follow_up[1])
+
+    def test_text_outside_the_answers_is_left_to_the_model(self):
+        text = self.REPLY.format(hoa=self.hoa.name) + "\n\nP.S. We dropped 14 Elm Ct."
+        email_response = self.reply(self.hoa, text)
+        # The P.S. is a larger share of this short reply than of real ones
+        index = NearDuplicateIndex(threshold=0.7)
+        self.assertIsNotNone(index.find(email_response, text))
+        self.assertIsNone(index.adapt(email_response, text))
+
+
+class InboundQueueTests(TestCase):
+    def setUp(self):
+        recent_message_ids.clear()
+        self.queue = InboundEmailQueue(
+            visibility_timeout=60, max_attempts=2, retry_backoff=30
+        )
+        hoa = create_hoa("Harbor View HOA")
+        outbound_email = OutboundEmail.objects.create(
+            hoa=hoa, to_email="demo@example.com", subject="Onboarding", status="sent"
+        )
+        self.payload = {
+            "MessageID": "queued",
+            "From": "board@example.com",
+            "Subject": "Re: Property Management Information Request",
+            "TextBody": "1. Yes",
+            "MailboxHash": make_mailbox_hash(outbound_email.id),
+        }
+
+    def test_claimed_job_is_hidden_until_its_claim_expires(self):
+        self.queue.enqueue(json.dumps(self.payload))
+        [job] = self.queue.claim_batch("worker-1", 10)
+        self.assertEqual(self.queue.claim_batch("worker-2", 10), [])
+
+        InboundEmailJob.objects.update(available_at=timezone.now())
+        [reclaimed] = self.queue.claim_batch("worker-2", 10)
+        self.assertNotEqual(reclaimed.claim_token, job.claim_token)
+        self.assertEqual(reclaimed.attempts, 2)
+        # The first worker's claim is gone, so it cannot settle the job
+        self.assertFalse(self.queue._finish(job, status="done"))
+
+    def test_failures_are_retried_with_backoff_then_dead_lettered(self):
+        self.queue.enqueue(json.dumps(self.payload))
+        with mock.patch.object(
+            self.queue.processor,
+            "process_inbound_email",
+            side_effect=RuntimeError("database is locked"),
+        ):
+            self.queue.run_worker(once=True)
+            job = InboundEmailJob.objects.get()
+            self.assertEqual(job.status, "pending")
+            self.assertGreater(job.available_at, timezone.now())
+
+            InboundEmailJob.objects.update(available_at=timezone.now())
+            self.queue.run_worker(once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "dead")
+        self.assertEqual(job.last_error, "database is locked")
+
+    def test_email_is_not_stored_unless_the_job_is_settled(self):
+        self.queue.enqueue(json.dumps(self.payload))
+        with mock.patch.object(
+            self.queue, "_finish", side_effect=[RuntimeError("crashed"), True]
+        ):
+            self.queue.run_worker(once=True)
+        self.assertFalse(EmailResponse.objects.exists())
+
+        InboundEmailJob.objects.update(available_at=timezone.now())
+        self.queue.run_worker(once=True)
+        job = InboundEmailJob.objects.get()
+        self.assertEqual(job.status, "done")
+        self.assertEqual(job.email_response.message_id, "queued")
+
+    def test_lost_claim_rolls_the_email_back(self):
+        self.queue.enqueue(json.dumps(self.payload))
+        [job] = self.queue.claim_batch("worker-1", 10)
+        InboundEmailJob.objects.update(claim_token="taken-over")
+        self.queue.process_job(job)
+        self.assertFalse(EmailResponse.objects.exists())
+        self.assertEqual(InboundEmailJob.objects.get().claim_token, "taken-over")
+
+    def test_settled_jobs_do_not_keep_attachments(self):
+        queue = InboundEmailQueue()
+        queue.enqueue(
+            json.dumps(
+                {
+                    "MessageID": "unroutable",
+                    "From": "someone@example.com",
+                    "To": "nobody@example.com",
+                    "Subject": "Hello",
+                    "TextBody": "Hi",
+                    "Attachments": [
+                        {
+                            "Name": "a.pdf",
+                            "Content": "JVBERi0=",
+                            "ContentType": "application/pdf",
+                        }
+                    ],
+                }
+            )
+        )
+        queue.run_worker(once=True)
+        job = InboundEmailJob.objects.get()
+        self.assertEqual(job.status, "rejected")
+        self.assertNotIn("Attachments", json.loads(job.payload))
+
+
+class MessageIdDedupTests(TestCase):
+    def setUp(self):
+        recent_message_ids.clear()
+        hoa = create_hoa("Maple Grove HOA")
+        self.payload = {
+            "MessageID": "dedup",
+            "From": hoa.contact_email,
+            "Subject": "Re: Property Management Information Request",
+            "TextBody": "1. Yes",
+        }
+
+    def test_redelivery_is_rejected_by_the_unique_constraint(self):
+        processor = EmailResponseProcessor()
+        success, _, email_response = processor.process_inbound_email(self.payload)
+        self.assertTrue(success)
+
+        # Another process stored it, so this one's recent IDs never saw it
+        recent_message_ids.clear()
+        success, message, duplicate = processor.process_inbound_email(self.payload)
+        self.assertFalse(success)
+        self.assertIn("already processed", message)
+        self.assertIsNone(duplicate)
+        self.assertEqual(EmailResponse.objects.get().id, email_response.id)
+        self.assertEqual(EmailRawPayload.objects.count(), 1)
+
+    def test_recently_stored_message_ids_skip_the_database(self):
+        recent_message_ids.set("dedup", True)
+        with self.assertNumQueries(0):
+            success, message, _ = EmailResponseProcessor().process_inbound_email(
+                self.payload
+            )
+        self.assertFalse(success)
+        self.assertIn("already processed", message)
+
+    def test_other_integrity_errors_are_not_reported_as_duplicates(self):
+        processor = EmailResponseProcessor()
+        with mock.patch.object(
+            EmailRawPayload, "save", side_effect=IntegrityError("NOT NULL failed")
+        ):
+            success, message, _ = processor.process_inbound_email(self.payload)
+        self.assertFalse(success)
+        self.assertIn("NOT NULL failed", message)
+        self.assertFalse(EmailResponse.objects.exists())
+
+
+class RawPayloadTests(TestCase):
+    PAYLOAD = {
+        "MessageID": "raw",
+        "Subject": "Re: Property Management Information Request – Café",
+        "TextBody": "1. Yes\n" * 200,
+    }
+
+    def test_payload_round_trips_through_compression(self):
+        hoa = create_hoa("Aspen Glen HOA")
+        email_response = EmailResponse.objects.create(
+            hoa=hoa,
+            from_email="board@example.com",
+            subject="Re: Property Management Information Request",
+            message_id="raw",
+        )
+        EmailRawPayload.from_payload(email_response.id, self.PAYLOAD).save()
+
+        raw_payload = EmailRawPayload.objects.get()
+        self.assertEqual(raw_payload.load(), self.PAYLOAD)
+        self.assertLess(raw_payload.compressed_size, raw_payload.original_size)
+        response = self.client.get(
+            reverse("email_response_raw", args=[email_response.id])
+        )
+        self.assertEqual(response.json(), self.PAYLOAD)
+
+
+class RawPayloadMigrationTests(TransactionTestCase):
+    before = [("hoa_management", "0005_inboundemailjob")]
+    after = [("hoa_management", "0006_emailrawpayload")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_raw_content_moves_out_of_the_row_and_back(self):
+        apps = self.migrate(self.before)
+        hoa = apps.get_model("hoa_management", "HOA").objects.create(
+            name="Sage Hill HOA", address="1 Main St", contact_email="a@example.com"
+        )
+        EmailResponse = apps.get_model("hoa_management", "EmailResponse")
+        rows = {
+            # Written as str(payload) before payloads were stored as JSON
+            "repr": (
+                str({"MessageID": "repr", "Spam": None}),
+                {"MessageID": "repr", "Spam": None},
+            ),
+            "json": ('{"MessageID": "json"}', {"MessageID": "json"}),
+            "text": ("not a payload", "not a payload"),
+        }
+        for message_id, (raw_content, _) in rows.items():
+            EmailResponse.objects.create(
+                hoa=hoa,
+                message_id=message_id,
+                from_email="board@example.com",
+                subject="Re: Property Management Information Request",
+                raw_content=raw_content,
+            )
+
+        apps = self.migrate(self.after)
+        EmailRawPayload = apps.get_model("hoa_management", "EmailRawPayload")
+        for raw_payload in EmailRawPayload.objects.select_related("email_response"):
+            _, payload = rows[raw_payload.email_response.message_id]
+            self.assertEqual(json.loads(zlib.decompress(raw_payload.data)), payload)
+
+        apps = self.migrate(self.before)
+        EmailResponse = apps.get_model("hoa_management", "EmailResponse")
+        for message_id, raw_content in EmailResponse.objects.values_list(
+            "message_id", "raw_content"
+        ):
+            self.assertEqual(json.loads(raw_content), rows[message_id][1])
+
+
+@override_settings(POSTMARK_INBOUND_EMAIL="inbound@example.com")
+class MailboxHashTests(TestCase):
+    def setUp(self):
+        self.hoa = create_hoa("Fox Run HOA")
+        create_hoa("Fox Run Estates HOA")
+        self.outbound_email = OutboundEmail.objects.create(
+            hoa=self.hoa, to_email="demo@example.com", subject="Onboarding"
+        )
+
+    def test_only_signed_hashes_parse(self):
+        mailbox_hash = make_mailbox_hash(self.outbound_email.id)
+        self.assertEqual(parse_mailbox_hash(mailbox_hash), self.outbound_email.id)
+        forged = f"{self.outbound_email.id + 1}-{mailbox_hash.partition('-')[2]}"
+        for invalid in (forged, "", None, "abc-123", str(self.outbound_email.id)):
+            self.assertIsNone(parse_mailbox_hash(invalid))
+
+    def test_reply_to_address_is_plus_addressed(self):
+        self.assertEqual(
+            reply_to_address(self.outbound_email.id),
+            f"inbound+{make_mailbox_hash(self.outbound_email.id)}@example.com",
+        )
+
+    def test_sends_carry_the_hash_of_their_ledger_row(self):
+        email_service = SimulatedEmailService()
+        with mock.patch.object(
+            email_service, "send_email", wraps=email_service.send_email
+        ) as send_email:
+            result = email_service.send_hoa_email(
+                self.hoa, "demo@example.com", "Onboarding", "<p>Hi</p>"
+            )
+        self.assertEqual(
+            send_email.call_args.kwargs["reply_to"],
+            reply_to_address(result["outbound_email_id"]),
+        )
+
+    def test_replies_are_routed_by_hash_before_sender_and_subject(self):
+        payloads = [
+            {
+                # Forwarded from an address and subject naming another HOA
+                "From": "foxrunestateshoa@example.com",
+                "Subject": "Fwd: Fox Run Estates HOA",
+                "MailboxHash": make_mailbox_hash(self.outbound_email.id),
+            },
+            {
+                "From": "foxrunestateshoa@example.com",
+                "Subject": "Fwd: Fox Run Estates HOA",
+                "MailboxHash": f"{self.outbound_email.id}-forged",
+            },
+        ]
+        processor = EmailResponseProcessor()
+        processor.resolve_routes(payloads)  # Load the routing index
+        with self.assertNumQueries(2):
+            routes = processor.resolve_routes(payloads)
+        self.assertEqual(routes[0], (self.hoa, self.outbound_email))
+        self.assertEqual(routes[1][0].name, "Fox Run Estates HOA")
+        self.assertIsNone(routes[1][1])
+
+
+class ThreadMatchingTests(TestCase):
+    def setUp(self):
+        self.hoa = create_hoa("Elm Court HOA")
+        self.onboarding = OutboundEmail.objects.create(
+            hoa=self.hoa,
+            to_email="demo@example.com",
+            subject="Onboarding",
+            message_id="onboarding-id",
+            status="sent",
+        )
+        self.follow_up = OutboundEmail.objects.create(
+            hoa=self.hoa,
+            to_email="demo@example.com",
+            subject="Follow-up",
+            message_id="follow-up-id",
+            status="sent",
+        )
+
+    def payload(self, **headers):
+        return {
+            "From": "someone@example.com",
+            "Subject": "Re: Hello",
+            "Headers": [
+                {"Name": name, "Value": value} for name, value in headers.items()
+            ],
+        }
+
+    def test_in_reply_to_matches_the_local_part_of_postmark_ids(self):
+        payload = self.payload(**{"In-Reply-To": "<follow-up-id@mtasv.net>"})
+        self.assertEqual(
+            EmailResponseProcessor().find_outbound_email(payload), self.follow_up
+        )
+
+    def test_most_recent_reference_wins(self):
+        payload = self.payload(
+            References="<onboarding-id@mtasv.net> <unknown@example.com> "
+            "<follow-up-id@mtasv.net>"
+        )
+        self.assertEqual(
+            EmailResponseProcessor().find_outbound_email(payload), self.follow_up
+        )
+
+    def test_unknown_thread_falls_back_to_heuristic_matching(self):
+        payload = self.payload(**{"In-Reply-To": "<unknown@example.com>"})
+        self.assertIsNone(EmailResponseProcessor().find_outbound_email(payload))
+
+    def test_batches_are_matched_with_one_query(self):
+        processor = EmailResponseProcessor()
+        with self.assertNumQueries(1):
+            matches = processor._match_outbound_by_thread(
+                [
+                    processor._thread_message_ids(
+                        self.payload(**{"In-Reply-To": "<onboarding-id@mtasv.net>"})
+                    ),
+                    processor._thread_message_ids(
+                        self.payload(References="<follow-up-id@mtasv.net>")
+                    ),
+                    [],
+                ]
+            )
+        self.assertEqual(matches, [self.onboarding, self.follow_up, None])
+
+    def test_sends_record_their_message_id(self):
+        result = SimulatedEmailService().send_hoa_email(
+            self.hoa, "demo@example.com", "Onboarding", "<p>Hi</p>"
+        )
+        outbound_email = OutboundEmail.objects.get(pk=result["outbound_email_id"])
+        self.assertEqual(outbound_email.status, "sent")
+        self.assertEqual(outbound_email.message_id, result["message_id"])
+        self.assertIsNotNone(outbound_email.sent_at)
+
+
+class OnboardingRenderCacheTests(TestCase):
+    def setUp(self):
+        rendered_email_cache.clear()
+        self.hoa = create_hoa("Linden Park HOA")
+        self.property = Property.objects.create(hoa=self.hoa, address="12 Linden Ave")
+        Property.objects.create(hoa=self.hoa, address="14 Linden Ave")
+        self.email_service = SimulatedEmailService()
+
+    def render(self):
+        return self.email_service.generate_hoa_onboarding_email(self.hoa)["body"]
+
+    def test_cache_hit_costs_only_the_freshness_query(self):
+        body = self.render()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.render(), body)
+
+    def test_property_edits_invalidate_the_rendered_email(self):
+        self.render()
+        self.property.address = "16 Linden Ave"
+        self.property.save()
+        self.assertIn("16 Linden Ave", self.render())
+
+    def test_removed_properties_invalidate_the_rendered_email(self):
+        self.render()
+        self.property.delete()
+        self.assertNotIn("12 Linden Ave", self.render())
+
+    def test_hoa_edits_invalidate_the_rendered_email(self):
+        self.render()
+        self.hoa.name = "Linden Park Association"
+        self.hoa.save()
+        self.assertEqual(
+            self.email_service.generate_hoa_onboarding_email(self.hoa)["subject"],
+            "Property Management Information Request - Linden Park Association",
+        )
+
+
+class ClientRegistryTests(TestCase):
+    def test_concurrent_first_use_creates_one_client(self):
+        registry = ClientRegistry()
+        created = []
+
+        def factory():
+            time.sleep(0.01)
+            created.append(object())
+            return created[-1]
+
+        clients = []
+        threads = [
+            threading.Thread(
+                target=lambda: clients.append(registry.get("api", factory))
+            )
+            for _i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(created), 1)
+        self.assertEqual(clients, created * 8)
+        self.assertEqual(registry.stats()["api"], {"hits": 7, "misses": 1})
+
+    def test_forked_processes_build_their_own_clients(self):
+        registry = ClientRegistry()
+        parent_client = registry.get("api", object)
+        with mock.patch("os.getpid", return_value=registry._pid + 1):
+            self.assertIsNot(registry.get("api", object), parent_client)
+
+    @override_settings(POSTMARK_API_TOKEN="your_postmark_api_token_here")
+    def test_postmark_is_simulated_without_a_token(self):
+        self.assertIsNone(get_postmark_client())
+
+    def test_postmark_sends_reuse_pooled_connections(self):
+        standin = PostmarkStandIn(port=0).start()
+        try:
+            client = build_postmark_client("test-token", standin.url)
+            for _i in range(3):
+                client.emails.send(
+                    From="test@example.com",
+                    To="hoa@example.com",
+                    Subject="Pooled",
+                    HtmlBody="<p>Pooled</p>",
+                )
+        finally:
+            standin.stop()
+        stats = postmark_connection_stats(client)
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["connections_opened"], 1)
+
+
+class ReplayInboundTests(TestCase):
+    def test_rows_stored_during_the_replay_are_not_counted_or_reattached(self):
+        hoa = create_hoa("Cedar Point HOA")
+        outbound_email = OutboundEmail.objects.create(
+            hoa=hoa, to_email="demo@example.com", subject="Onboarding", status="sent"
+        )
+        payload = {
+            "MessageID": "replayed",
+            "From": "board@example.com",
+            "Subject": "Re: Property Management Information Request",
+            "TextBody": "1. Yes",
+            "MailboxHash": make_mailbox_hash(outbound_email.id),
+        }
+        extract_attachments = EmailResponseProcessor.extract_attachments
+
+        def stored_by_webhook_meanwhile(processor, postmark_data):
+            EmailResponse.objects.create(
+                hoa=hoa,
+                from_email="board@example.com",
+                subject=postmark_data["Subject"],
+                text_content=postmark_data["TextBody"],
+                message_id=postmark_data["MessageID"],
+            )
+            return extract_attachments(processor, postmark_data)
+
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson") as archive:
+            archive.write(json.dumps(payload) + "\n")
+            archive.flush()
+            with mock.patch.object(
+                EmailResponseProcessor,
+                "extract_attachments",
+                autospec=True,
+                side_effect=stored_by_webhook_meanwhile,
+            ):
+                output = io.StringIO()
+                call_command("replay_inbound", archive.name, stdout=output)
+
+        self.assertIn("0 inserted, 1 duplicates", output.getvalue())
+        self.assertFalse(EmailRawPayload.objects.exists())
+
+    def test_insert_returns_only_the_rows_it_created(self):
+        hoa = create_hoa("Willow Creek HOA")
+
+        def email_response(message_id):
+            return EmailResponse(
+                hoa=hoa,
+                from_email="board@example.com",
+                subject="Re: Property Management Information Request",
+                text_content="1. Yes",
+                message_id=message_id,
+            )
+
+        # Stored by the webhook after the replay checked for existing rows
+        webhook_response = email_response("raced")
+        webhook_response.save()
+        inserted = ReplayCommand.insert(
+            [email_response("raced"), email_response("replayed")]
+        )
+        self.assertEqual([row.message_id for row in inserted], ["replayed"])
+        self.assertEqual(
+            EmailResponse.objects.get(message_id="replayed").id, inserted[0].id
+        )
+        self.assertEqual(
+            EmailResponse.objects.get(message_id="raced").id, webhook_response.id
+        )
+
+
+class UnavailableStrongModelBackend(OfflineBackend):
+    """Offline backend whose cheap model is unsure and whose strong model fails"""
+
+    def generate(self, model, prompt, json_output, timeout, prefix=""):
+        if model != "cheap":
+            raise errors.ClientError(
+                400,
+                {"error": {"code": 400, "message": "Bad", "status": "INVALID"}},
+            )
+        response = super().generate(model, prompt, json_output, timeout, prefix)
+        analysis_result = json.loads(response["text"])
+        analysis_result["confidence"] = 10
+        response["text"] = json.dumps(analysis_result)
+        return response
+
+    async def agenerate(self, model, prompt, json_output, timeout, prefix=""):
+        return self.generate(model, prompt, json_output, timeout, prefix)
+
+
+class EscalationTests(TestCase):
+    def setUp(self):
+        hoa = create_hoa("Maple Grove HOA")
+        self.email_response = EmailResponse.objects.create(
+            hoa=hoa,
+            from_email="board@example.com",
+            subject="Re: Property Management Information Request",
+            text_content="1. Yes\n2. 80 units",
+            message_id="<escalation@example.com>",
+        )
+        self.analyzer = GeminiEmailAnalyzer(
+            UnavailableStrongModelBackend(), models=["cheap", "strong"]
+        )
+
+    def assert_kept_cheap_result(self, analysis_result):
+        self.assertNotEqual(analysis_result["category"], "error")
+        self.assertEqual(analysis_result["model"], "cheap")
+        self.assertEqual(analysis_result["escalations"], 0)
+        self.assertFalse(LLMCacheEntry.objects.exists())
+
+    def test_failed_escalation_keeps_the_cheaper_result(self):
+        self.assert_kept_cheap_result(
+            self.analyzer.analyze_email_response(self.email_response)
+        )
+
+    def test_failed_async_escalation_keeps_the_cheaper_result(self):
+        self.assert_kept_cheap_result(
+            async_to_sync(self.analyzer._arun)("analysis", self.email_response, None)
+        )
+
+
+class LocalExtractorTests(TestCase):
+    def test_qualified_yes_is_left_to_the_model(self):
+        for answer in (
+            "Yes but we stopped managing 12 Oak St",
+            "Yes, however we sold 4 Elm Ct last year",
+            "Yes, except 9 Pine Rd",
+        ):
+            with self.subTest(answer=answer):
+                self.assertEqual(extract_manages_properties(answer), (None, 0.0))
+
+    def test_plain_yes_is_confident(self):
+        self.assertEqual(
+            extract_manages_properties("Yes, we manage all of them"), (True, 0.95)
+        )
+
+
+class NormalizerTests(TestCase):
+    ANSWERS = (
+        "1. Yes, we manage all of them\n"
+        "2. $200 monthly\n"
+        "3. 120 units\n"
+        "4. Jane Smith\n"
+        "5. 555-123-4567\n"
+        "6. 100 Main St, Springfield, IL 62701\n"
+        "7. Acme Management"
+    )
+
+    def test_sign_off_at_the_top_keeps_the_answers(self):
+        text = f"Hello,\nThank you.\n{self.ANSWERS}"
+        self.assertEqual(normalize_email_body(text), text)
+
+    def test_sign_off_in_the_middle_keeps_the_answers(self):
+        text = "1. Yes, we manage all of them\nThanks,\n2. $200 monthly\n3. 120 units"
+        self.assertEqual(normalize_email_body(text), text)
+
+    def test_sign_off_at_the_bottom_is_stripped_with_its_signature(self):
+        text = (
+            f"Hello,\n{self.ANSWERS}\n\nBest regards,\nJane Smith\n"
+            "Community Manager\nAcme Management\n555-123-4567"
+        )
+        self.assertEqual(normalize_email_body(text), f"Hello,\n{self.ANSWERS}")
+
+    def test_bare_thanks_is_kept(self):
+        self.assertEqual(normalize_email_body("Thanks!"), "Thanks!")
+
+    def test_quoted_history_is_dropped(self):
+        text = (
+            "1. Yes\n\nOn Mon, Jan 1, 2024 at 9:00 AM Bob <bob@example.com> wrote:\n"
+            "> Please answer the questions below"
+        )
+        self.assertEqual(normalize_email_body(text), "1. Yes")
+
+    def test_html_body_without_quoted_containers(self):
+        html = (
+            "<div><p>1. Yes</p><div class='gmail_quote'>Earlier message</div>"
+            "<p>2. No</p></div>"
+        )
+        self.assertEqual(normalize_email_body("", html), "1. Yes\n\n2. No")
+
+    def test_pasted_copy_of_our_email_is_dropped(self):
+        template = "<p>Could you please confirm the following details for us?</p>"
+        text = "Could you please confirm the following details for us?\n1. Yes"
+        self.assertEqual(normalize_email_body(text, template_html=template), "1. Yes")
+
+
+class FlakyRenderEmailService(SimulatedEmailService):
+    """Records sends; rendering fails for one HOA until fixed"""
+
+    def __init__(self, broken_hoa_id: int):
+        super().__init__()
+        self.broken_hoa_id = broken_hoa_id
+        self.sent_subjects = []
+
+    def generate_hoa_onboarding_email(self, hoa):
+        if hoa.id == self.broken_hoa_id:
+            raise RuntimeError("template error")
+        return {"subject": hoa.name, "body": f"<p>Hello {hoa.name}</p>"}
+
+    def send_batch(self, messages):
+        # Still in flight when the next chunk fails to render
+        time.sleep(0.05)
+        self.sent_subjects.extend(message["Subject"] for message in messages)
+        return super().send_batch(messages)
+
+
+class CampaignFailureTests(TestCase):
+    def test_resume_after_a_failure_emails_no_hoa_twice(self):
+        hoas = [create_hoa(f"Lakeside {number} HOA") for number in range(3)]
+        campaign = Campaign.objects.create(
+            name="Failing", filters={"hoa_ids": [hoa.id for hoa in hoas]}
+        )
+        email_service = FlakyRenderEmailService(broken_hoa_id=hoas[1].id)
+        runner = CampaignRunner(
+            email_service, batch_size=1, max_in_flight=2, render_workers=1
+        )
+
+        campaign = runner.run(campaign)
+        self.assertEqual(campaign.status, "failed")
+        self.assertFalse(
+            OutboundEmail.objects.filter(campaign=campaign, status="pending").exists()
+        )
+
+        email_service.broken_hoa_id = None
+        campaign = runner.run(campaign)
+        self.assertEqual(campaign.status, "completed")
+        self.assertCountEqual(email_service.sent_subjects, [hoa.name for hoa in hoas])
+        for hoa in hoas:
+            self.assertEqual(
+                OutboundEmail.objects.filter(
+                    hoa=hoa, campaign=campaign, status="sent"
+                ).count(),
+                1,
+            )
+
+
+class HOARoutingIndexTests(TestCase):
+    def setUp(self):
+        self.oak = create_hoa("Oak Ridge HOA")
+        self.oak_east = create_hoa("Oak Ridge East HOA")
+        self.index = HOARoutingIndex(ttl=3600)
+
+    def test_matches_email_name_and_longest_name_in_subject(self):
+        self.assertEqual(self.index.match_email("OAKRIDGEHOA@example.com"), self.oak.id)
+        self.assertEqual(self.index.match_name(" oak ridge hoa "), self.oak.id)
+        self.assertEqual(
+            self.index.match_subject("Re: Oak Ridge East HOA details"),
+            self.oak_east.id,
+        )
+        self.assertIsNone(self.index.match_subject("Re: Pine Hills"))
+
+    def test_updates_and_removals_apply_without_a_reload(self):
+        self.index.reload()
+        self.oak.name = "Oak Valley HOA"
+        self.index.update(self.oak)
+        self.assertIsNone(self.index.match_name("Oak Ridge HOA"))
+        self.assertEqual(self.index.match_subject("Oak Valley HOA"), self.oak.id)
+        self.index.remove(self.oak.id)
+        self.assertIsNone(self.index.match_email("oakridgehoa@example.com"))
+
+    def test_lookups_during_a_reload_see_the_previous_index(self):
+        self.index.reload()
+        rows = list(HOA.objects.values_list("id", "name", "contact_email"))
+        reloading, looked_up = threading.Event(), threading.Event()
+        found = []
+
+        def slow_rows():
+            yield rows[0]
+            reloading.set()
+            looked_up.wait(5)
+            yield from rows[1:]
+
+        def look_up():
+            reloading.wait(5)
+            found.append(self.index.match_email(rows[-1][2]))
+            looked_up.set()
+
+        reader = threading.Thread(target=look_up)
+        reader.start()
+        with mock.patch.object(HOA.objects, "values_list") as values_list:
+            values_list.return_value.iterator.side_effect = slow_rows
+            self.index.reload()
+        reader.join()
+        self.assertEqual(found, [rows[-1][0]])
+
+    def test_concurrent_lookups_on_a_stale_index_reload_it_once(self):
+        rows = list(HOA.objects.values_list("id", "name", "contact_email"))
+
+        def slow_rows():
+            # Long enough for every thread to find the index stale
+            time.sleep(0.05)
+            yield from rows
+
+        with mock.patch.object(HOA.objects, "values_list") as values_list:
+            values_list.return_value.iterator.side_effect = lambda: slow_rows()
+            threads = [
+                threading.Thread(
+                    target=self.index.match_email, args=("oakridgehoa@example.com",)
+                )
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(values_list.call_count, 1)
+
+
+@override_settings(OUTBOX_ENABLED=True)
+class FollowUpResendTests(TestCase):
+    def setUp(self):
+        hoa = create_hoa("Birch Bay HOA")
+        self.email_response = EmailResponse.objects.create(
+            hoa=hoa,
+            from_email="board@example.com",
+            subject="Property Management Information Request",
+            text_content="1. Yes",
+            message_id="<resend@example.com>",
+            ai_generated_response="<p>Thanks</p>",
+        )
+        self.url = reverse("send_generated_response", args=[self.email_response.id])
+
+    def test_dead_follow_up_is_requeued_instead_of_reported_as_queued(self):
+        self.client.post(self.url)
+        outbox_message = OutboxMessage.objects.get()
+        OutboxMessage.objects.filter(pk=outbox_message.pk).update(
+            status="dead", attempts=8, last_error="503"
+        )
+        OutboundEmail.objects.filter(pk=outbox_message.outbound_email_id).update(
+            status="failed"
+        )
+
+        self.client.post(self.url)
+        outbox_message.refresh_from_db()
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        self.assertEqual(outbox_message.status, "pending")
+        self.assertEqual(outbox_message.attempts, 0)
+        self.assertEqual(outbox_message.outbound_email.status, "pending")
+
+    def test_queued_follow_up_is_not_queued_again(self):
+        self.client.post(self.url)
+        self.client.post(self.url)
+        outbox_message = OutboxMessage.objects.get()
+        self.assertEqual(outbox_message.status, "pending")
+
+
+class LRUCacheTests(TestCase):
+    def test_membership_test_leaves_stats_and_order_alone(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertIn("a", cache)
+        self.assertNotIn("c", cache)
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+        # "a" is still the least recently used entry
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.hoa = create_hoa("Spruce Hollow HOA")
+        self.email_service = SimulatedEmailService()
+        self.outbox = EmailOutbox(
+            self.email_service,
+            concurrency=2,
+            domain_concurrency=1,
+            visibility_timeout=60,
+            retry_backoff=30,
+        )
+
+    def queue(self, to_email="board@example.com", idempotency_key=None):
+        return self.email_service.queue_hoa_email(
+            self.hoa,
+            to_email,
+            "Follow-up",
+            "<p>Thanks</p>",
+            template="follow_up",
+            idempotency_key=idempotency_key,
+        )
+
+    def test_same_idempotency_key_is_queued_once(self):
+        first = self.queue(idempotency_key="follow-up:1")
+        second = self.queue(idempotency_key="follow-up:1")
+        self.assertEqual(second["outbox_message_id"], first["outbox_message_id"])
+        self.assertEqual(second["message"], "Email already queued")
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+    def test_sends_to_one_domain_are_limited(self):
+        self.queue("a@example.com")
+        self.queue("b@example.com")
+        self.queue("c@example.org")
+        claimed = self.outbox.claim_batch("worker-1", 10)
+        self.assertEqual(
+            sorted(message.destination_domain for message in claimed),
+            ["example.com", "example.org"],
+        )
+        self.assertEqual(self.outbox.claim_batch("worker-2", 10), [])
+
+    def test_transient_failures_are_retried_then_dead_lettered(self):
+        self.queue()
+        OutboxMessage.objects.update(max_attempts=2)
+        with mock.patch.object(
+            self.email_service, "deliver", side_effect=ConnectionError("reset")
+        ):
+            self.outbox.run_worker(once=True)
+            outbox_message = OutboxMessage.objects.get()
+            self.assertEqual(outbox_message.status, "pending")
+            self.assertEqual(outbox_message.last_error, "reset")
+
+            OutboxMessage.objects.update(available_at=timezone.now())
+            self.outbox.run_worker(once=True)
+        outbox_message.refresh_from_db()
+        self.assertEqual(outbox_message.status, "dead")
+        self.assertEqual(outbox_message.outbound_email.status, "failed")
+
+    def test_rejections_are_not_retried(self):
+        self.queue()
+        error = ClientError("Inactive recipient", error_code=406)
+        response = requests.Response()
+        response.status_code = 422
+        error.__cause__ = requests.HTTPError(response=response)
+        with mock.patch.object(self.email_service, "deliver", side_effect=error):
+            self.outbox.run_worker(once=True)
+        outbox_message = OutboxMessage.objects.get()
+        self.assertEqual(outbox_message.status, "failed")
+        self.assertEqual(outbox_message.attempts, 1)
+        self.assertEqual(outbox_message.outbound_email.error_code, 406)
+
+    def test_delivered_message_is_not_resent_after_a_crash(self):
+        self.queue()
+        [outbox_message] = self.outbox.claim_batch("worker-1", 10)
+        # Delivered and recorded in the ledger, but the worker died before
+        # settling the outbox row
+        OutboundEmail.objects.update(status="sent")
+        OutboxMessage.objects.update(available_at=timezone.now())
+        with mock.patch.object(self.email_service, "deliver") as deliver:
+            self.outbox.run_worker(once=True)
+        deliver.assert_not_called()
+        self.assertEqual(OutboxMessage.objects.get().status, "sent")
+
+
+class RateLimiterTests(TestCase):
+    def setUp(self):
+        # Refills a token every 1000 seconds, so no test sees a refill
+        self.limiter = TokenBucketRateLimiter("test", rate=0.001, capacity=2)
+
+    def test_burst_is_limited_to_the_capacity(self):
+        self.assertTrue(self.limiter.try_acquire())
+        self.assertTrue(self.limiter.try_acquire())
+        self.assertFalse(self.limiter.try_acquire())
+        with self.assertRaises(RateLimitExceeded):
+            self.limiter.acquire(timeout=1)
+        stats = self.limiter.stats()
+        self.assertEqual((stats["acquired"], stats["rejected"]), (2, 2))
+
+    def test_lost_race_rereads_the_bucket_instead_of_overdrawing_it(self):
+        self.limiter.try_acquire()
+        other_worker = TokenBucketRateLimiter("test", rate=0.001, capacity=2)
+        get_bucket = self.limiter._get_bucket
+        reads = []
+
+        def read_then_lose_the_race():
+            bucket = get_bucket()
+            if not reads:
+                # Another worker takes the last token after this read
+                self.assertTrue(other_worker.try_acquire())
+            reads.append(bucket.tokens)
+            return bucket
+
+        with mock.patch.object(
+            self.limiter, "_get_bucket", side_effect=read_then_lose_the_race
+        ):
+            self.assertFalse(self.limiter.try_acquire())
+        self.assertEqual(len(reads), 2)
+        self.assertAlmostEqual(reads[0], 1, places=2)
+        self.assertAlmostEqual(reads[1], 0, places=2)
+        self.assertEqual(self.limiter.stats()["acquired"], 2)
+
+    def test_waits_for_a_refill(self):
+        limiter = TokenBucketRateLimiter("fast", rate=50, capacity=1)
+        limiter.acquire()
+        waited = limiter.acquire(timeout=1)
+        self.assertGreater(waited, 0)
+        self.assertEqual(limiter.stats()["waited"], 1)
+
+
+class PostmarkStandInTests(TestCase):
+    def setUp(self):
+        self.standin = PostmarkStandIn(port=0, server_token="test-token")
+        self.addCleanup(self.standin.stop)
+        self.standin.start()
+
+    def post(self, path, data, token="test-token"):
+        return requests.post(
+            self.standin.url + path,
+            json=data,
+            headers={"X-Postmark-Server-Token": token},
+            timeout=5,
+        )
+
+    def test_batch_results_report_each_message(self):
+        self.standin.reject_rate = 1.0
+        response = self.post(
+            "email/batch", [{"To": "a@example.com"}, {"To": "b@example.com"}]
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(result["To"], result["ErrorCode"]) for result in response.json()],
+            [("a@example.com", 406), ("b@example.com", 406)],
+        )
+        self.assertEqual(self.standin.stats()["rejected"], 2)
+
+    def test_failures_and_bad_tokens(self):
+        self.assertEqual(self.post("email", {}, token="wrong").status_code, 401)
+        self.standin.error_rate = 1.0
+        self.assertEqual(self.post("email", {"To": "a@example.com"}).status_code, 500)
+        self.standin.error_rate = 0.0
+        self.standin.max_rps = 0.001
+        self.assertEqual(self.post("email", {"To": "a@example.com"}).status_code, 429)
+        stats = self.standin.stats()
+        self.assertEqual(
+            (stats["unauthorized"], stats["errors"], stats["throttled"]), (1, 1, 1)
+        )
+
+    def test_simulated_replies_route_back_to_their_send(self):
+        hoa = create_hoa("Poplar Ridge HOA")
+        outbound_email = OutboundEmail.objects.create(
+            hoa=hoa, to_email="demo@example.com", subject="Onboarding"
+        )
+        reply = PostmarkStandIn.build_reply(
+            {"To": "demo@example.com", "ReplyTo": reply_to_address(outbound_email.id)},
+            "postmark-id",
+        )
+        self.assertEqual(
+            EmailResponseProcessor().find_outbound_email(reply), outbound_email
+        )
+        reply["MailboxHash"] = ""
+        OutboundEmail.objects.update(message_id="postmark-id")
+        self.assertEqual(
+            EmailResponseProcessor().find_outbound_email(reply), outbound_email
+        )
+
+
+class LatencyTests(TestCase):
+    def test_seeded_samples_are_reproducible(self):
+        samples = [
+            [parse_latency("lognormal:50,0.5", random.Random(7))() for _i in range(5)]
+            for _run in range(2)
+        ]
+        self.assertEqual(samples[0], samples[1])
+
+    def test_samples_are_seconds_and_never_negative(self):
+        self.assertEqual(parse_latency("fixed:250")(), 0.25)
+        self.assertEqual(parse_latency("normal:-50,1", random.Random(1))(), 0.0)
+
+    def test_invalid_specs_are_rejected(self):
+        for spec in ("fixed", "uniform:10", "gamma:1", "fixed:fast"):
+            with self.assertRaises(ValueError):
+                parse_latency(spec)
+
+    def test_percentiles_are_reported_in_milliseconds(self):
+        values = [index / 1000 for index in range(1, 101)]
+        self.assertEqual(percentiles(values), {"p50": 51, "p95": 96, "p99": 100})
+        self.assertEqual(percentiles([]), {})
+
+
+@override_settings(
+    LOCAL_EXTRACTOR_ENABLED=False,
+    NEAR_DUPLICATE_ENABLED=False,
+    LLM_CACHE_ENABLED=False,
+)
+class SingleCallTests(TestCase):
+    def setUp(self):
+        hoa = create_hoa("Cypress Bend HOA")
+        self.email_response = EmailResponse.objects.create(
+            hoa=hoa,
+            from_email="board@example.com",
+            subject="Re: Property Management Information Request",
+            text_content="1. Yes\n2. Dues are $250 monthly\n3. Check",
+            message_id="<single-call@example.com>",
+        )
+        self.analyzer = GeminiEmailAnalyzer(OfflineBackend(), models=["flash"])
+
+    def process(self, single_call):
+        self.assertTrue(
+            self.analyzer.process_email_response(
+                self.email_response, single_call=single_call
+            )
+        )
+        self.email_response.refresh_from_db()
+        return self.email_response
+
+    def test_one_call_analyzes_and_drafts_the_follow_up(self):
+        email_response = self.process(single_call=True)
+        self.assertEqual(
+            list(LLMCall.objects.values_list("kind", flat=True)), ["combined"]
+        )
+        self.assertEqual(email_response.ai_call_count, 1)
+        self.assertNotIn("follow_up", email_response.ai_analysis_result)
+        self.assertIn("Cypress Bend HOA", email_response.ai_generated_response)
+
+    def test_single_call_matches_the_two_call_result(self):
+        two_calls = self.process(single_call=False)
+        self.assertEqual(
+            sorted(LLMCall.objects.values_list("kind", flat=True)),
+            ["analysis", "response"],
+        )
+        self.assertEqual(two_calls.ai_call_count, 2)
+        expected = (two_calls.ai_analysis_result, two_calls.ai_generated_response)
+
+        one_call = self.process(single_call=True)
+        self.assertEqual(
+            (one_call.ai_analysis_result, one_call.ai_generated_response), expected
+        )
+
+    def test_unparseable_combined_response_falls_back_for_both_parts(self):
+        analysis_result, (subject, body, reasoning) = (
+            self.analyzer._parse_combined_response("not json")
+        )
+        self.assertEqual(analysis_result["category"], "error")
+        self.assertEqual(subject, "Re: Property Management Information Request")
+        self.assertIn("We will review it", body)
+        self.assertEqual(reasoning, analysis_result["reasoning"])
+
+
+class LLMResultCacheTests(TestCase):
+    def setUp(self):
+        self.cache = LLMResultCache(ttl=60, max_entries=2, memory_size=10)
+        self.key = LLMResultCache.make_key(
+            "analysis", "1. Yes", {"name": "Oak Ridge HOA"}, "3", "flash"
+        )
+
+    def test_whitespace_only_changes_share_a_key(self):
+        self.assertEqual(
+            LLMResultCache.make_key(
+                "analysis", " 1.  Yes\n", {"name": "Oak Ridge HOA"}, "3", "flash"
+            ),
+            self.key,
+        )
+        for changed in (
+            ("analysis", "1. No", {"name": "Oak Ridge HOA"}, "3", "flash"),
+            ("analysis", "1. Yes", {"name": "Pine Hills HOA"}, "3", "flash"),
+            ("analysis", "1. Yes", {"name": "Oak Ridge HOA"}, "4", "flash"),
+            ("analysis", "1. Yes", {"name": "Oak Ridge HOA"}, "3", "pro"),
+            ("response", "1. Yes", {"name": "Oak Ridge HOA"}, "3", "flash"),
+        ):
+            self.assertNotEqual(LLMResultCache.make_key(*changed), self.key)
+
+    def test_memory_tier_then_database_tier(self):
+        self.cache.set(self.key, "analysis", "3", "flash", {"category": "complete"})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cache.get(self.key), {"category": "complete"})
+
+        # Another worker has only the shared database tier
+        other_worker = LLMResultCache(ttl=60, memory_size=10)
+        self.assertEqual(other_worker.get(self.key), {"category": "complete"})
+        with self.assertNumQueries(0):
+            other_worker.get(self.key)
+        self.assertEqual(
+            (other_worker.db_hits, other_worker.memory_hits, other_worker.misses),
+            (1, 1, 0),
+        )
+        self.assertEqual(LLMCacheEntry.objects.get().hit_count, 1)
+
+    def test_results_are_copies(self):
+        self.cache.set(self.key, "analysis", "3", "flash", {"category": "complete"})
+        self.cache.get(self.key)["category"] = "changed"
+        self.assertEqual(self.cache.get(self.key), {"category": "complete"})
+
+    def test_expired_entries_are_misses_in_both_tiers(self):
+        self.cache.set(self.key, "analysis", "3", "flash", {"category": "complete"})
+        with mock.patch("time.time", return_value=time.time() + 120):
+            LLMCacheEntry.objects.update(expires_at=timezone.now())
+            self.assertIsNone(self.cache.get(self.key))
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_prune_keeps_the_most_recently_used_entries(self):
+        for index in range(3):
+            self.cache.set(str(index), "analysis", "3", "flash", index)
+        LLMCacheEntry.objects.filter(key="0").update(last_used_at=timezone.now())
+        self.assertEqual(self.cache.prune(), 1)
+        self.assertEqual(
+            sorted(LLMCacheEntry.objects.values_list("key", flat=True)), ["0", "2"]
+        )
+
+    @override_settings(LLM_CACHE_ENABLED=True)
+    def test_analyzer_serves_repeated_replies_from_the_cache(self):
+        llm_result_cache.clear()
+        self.addCleanup(llm_result_cache.clear)
+        hoa = create_hoa("Oak Ridge HOA")
+        analyzer = GeminiEmailAnalyzer(OfflineBackend(), models=["flash"])
+        for message_id in ("<first@example.com>", "<second@example.com>"):
+            email_response = EmailResponse.objects.create(
+                hoa=hoa,
+                from_email="board@example.com",
+                subject="Re: Property Management Information Request",
+                text_content="1. Yes\n2. Dues are $250 monthly",
+                message_id=message_id,
+            )
+            analysis_result = analyzer.analyze_email_response(email_response)
+        self.assertNotEqual(analysis_result["category"], "error")
+        self.assertEqual(LLMCall.objects.count(), 1)
+
+
+# The command queries from sync_to_async threads, outside a TestCase transaction
+@override_settings(LLM_CACHE_ENABLED=False, GEMINI_MODELS=["flash"])
+class AnalyzeResponsesCommandTests(TransactionTestCase):
+    def setUp(self):
+        self.hoa = create_hoa("Hawthorn HOA")
+        self.other_hoa = create_hoa("Juniper HOA")
+        self.responses = [
+            EmailResponse.objects.create(
+                hoa=hoa,
+                from_email="board@example.com",
+                subject="Re: Property Management Information Request",
+                text_content=text,
+                message_id=f"<analyze-{index}@example.com>",
+            )
+            for index, (hoa, text) in enumerate(
+                [
+                    (self.hoa, "1. Yes\n2. Dues are $250 monthly"),
+                    (self.hoa, "We only manage some of these, call me."),
+                    (self.other_hoa, "1. No"),
+                ]
+            )
+        ]
+
+    def analyze(self, *args):
+        output = io.StringIO()
+        call_command("analyze_responses", "--backend", "offline", *args, stdout=output)
+        return output.getvalue()
+
+    def test_analyzes_only_the_selected_unprocessed_responses(self):
+        output = self.analyze("--hoa-ids", str(self.hoa.id), "--concurrency", "2")
+        self.assertIn("Analyzed 2 responses (0 failed", output)
+        processed = EmailResponse.objects.filter(ai_processed_at__isnull=False)
+        self.assertEqual(
+            sorted(processed.values_list("id", flat=True)),
+            [self.responses[0].id, self.responses[1].id],
+        )
+        self.assertTrue(all(er.ai_generated_response for er in processed))
+
+        self.assertIn(
+            "No unprocessed email responses found.",
+            self.analyze("--hoa-ids", str(self.hoa.id)),
+        )
+
+    def test_limit_and_batches(self):
+        output = self.analyze("--limit", "2", "--batch-size", "1")
+        self.assertIn("  1/2 done", output)
+        self.assertIn("Analyzed 2 responses", output)
+        self.assertEqual(
+            EmailResponse.objects.filter(ai_processed_at__isnull=True).get(),
+            self.responses[2],
+        )
+
+    def test_failed_responses_stay_unprocessed(self):
+        with mock.patch.object(
+            GeminiEmailAnalyzer,
+            "aprocess_email_response",
+            autospec=True,
+            return_value=({"category": "error"}, None, None),
+        ):
+            output = self.analyze()
+        self.assertIn("Analyzed 0 responses (3 failed", output)
+        self.assertFalse(
+            EmailResponse.objects.filter(ai_processed_at__isnull=False).exists()
+        )
+
+    def test_invalid_dates_are_rejected(self):
+        with self.assertRaises(CommandError):
+            self.analyze("--since", "yesterday")
+
+
+def gemini_error(code: int) -> errors.APIError:
+    error_class = errors.ServerError if code >= 500 else errors.ClientError
+    return error_class(
+        code, {"error": {"code": code, "message": "Injected", "status": "ERROR"}}
+    )
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        self.now = 1_000_000.0
+        patcher = mock.patch("services.resilience.time.time", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(
+            "test", failure_rate=0.5, min_calls=4, window=60, reset_timeout=30
+        )
+
+    def trip(self):
+        for success in (True, False, False, False):
+            self.breaker.record(success)
+
+    def test_opens_once_enough_calls_in_a_window_fail(self):
+        for success in (True, False, False):
+            self.breaker.record(success)
+        self.assertEqual(self.breaker.stats()["state"], "closed")
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.stats()["state"], "open")
+        self.assertFalse(self.breaker.allow())
+        stats = self.breaker.stats()
+        self.assertEqual((stats["trips"], stats["short_circuits"]), (1, 1))
+
+    def test_failures_in_earlier_windows_do_not_count(self):
+        for success in (True, False, False):
+            self.breaker.record(success)
+        self.now += 60
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.stats()["state"], "closed")
+
+    def test_one_probe_after_the_reset_timeout_closes_it(self):
+        self.trip()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.stats()["state"], "half_open")
+        # Only the probe goes through
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record(True)
+        self.assertEqual(self.breaker.stats()["state"], "closed")
+        # The failures that tripped it are forgotten
+        self.breaker.record(False)
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_opens_it_again(self):
+        self.trip()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.stats()["state"], "open")
+        self.now += 29
+        self.assertFalse(self.breaker.allow())
+
+    def test_lost_probe_is_replaced_after_the_reset_timeout(self):
+        self.trip()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+
+
+@mock.patch("services.resilience.time.sleep")
+class ResilientCallerTests(TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(
+            "caller", failure_rate=0.5, min_calls=2, window=60, reset_timeout=30
+        )
+        self.caller = ResilientCaller(
+            self.breaker, deadline=10, max_retries=2, backoff=0.01, hedge=False
+        )
+
+    def test_retryable_errors_are_retried(self, sleep):
+        fn = mock.Mock(side_effect=[gemini_error(503), "ok"])
+        self.assertEqual(self.caller.call(fn), "ok")
+        self.assertEqual(fn.call_count, 2)
+        stats = self.breaker.stats()
+        self.assertEqual(
+            (stats["calls"], stats["failures"], stats["retries"]), (2, 1, 1)
+        )
+
+    def test_invalid_requests_are_not_retried_or_counted(self, sleep):
+        fn = mock.Mock(side_effect=gemini_error(400))
+        with self.assertRaises(errors.ClientError):
+            self.caller.call(fn)
+        self.assertEqual(fn.call_count, 1)
+        self.assertEqual(self.breaker.stats()["failures"], 0)
+
+    def test_open_breaker_fails_fast(self, sleep):
+        fn = mock.Mock(side_effect=gemini_error(503))
+        # The second failure opens the breaker, so the last retry is not made
+        with self.assertRaises(CircuitOpenError):
+            self.caller.call(fn)
+        self.assertEqual(fn.call_count, 2)
+        fn.reset_mock()
+        with self.assertRaises(CircuitOpenError):
+            self.caller.call(fn)
+        fn.assert_not_called()
+
+    def test_hedged_request_wins_over_a_slow_one(self, sleep):
+        caller = ResilientCaller(
+            self.breaker, deadline=10, hedge=True, hedge_delay=0.05
+        )
+        release = threading.Event()
+        self.addCleanup(release.set)
+        calls = []
+
+        def fn(timeout):
+            calls.append(timeout)
+            if len(calls) == 1:
+                release.wait(5)
+                return "slow"
+            return "hedged"
+
+        self.assertEqual(caller.call(fn), "hedged")
+        stats = self.breaker.stats()
+        self.assertEqual((stats["hedges"], stats["hedge_wins"]), (1, 1))
+
+
+class InvalidRequestBackend(OfflineBackend):
+    """Offline backend that rejects every request"""
+
+    def generate(self, model, prompt, json_output, timeout, prefix=""):
+        raise gemini_error(400)
+
+
+@override_settings(
+    LOCAL_EXTRACTOR_ENABLED=False,
+    NEAR_DUPLICATE_ENABLED=False,
+    LLM_CACHE_ENABLED=False,
+)
+class LLMCallMetricsTests(TestCase):
+    def setUp(self):
+        hoa = create_hoa("Sycamore HOA")
+        self.email_response = EmailResponse.objects.create(
+            hoa=hoa,
+            from_email="board@example.com",
+            subject="Re: Property Management Information Request",
+            text_content="1. Yes\n2. Dues are $250 monthly",
+            message_id="<metrics@example.com>",
+        )
+
+    def test_each_call_is_recorded_with_the_analysis(self):
+        analyzer = GeminiEmailAnalyzer(OfflineBackend(), models=["flash"])
+        analyzer.process_email_response(self.email_response, single_call=False)
+        calls = LLMCall.objects.filter(email_response=self.email_response)
+        self.assertEqual(calls.count(), 2)
+        for call in calls:
+            self.assertTrue(call.success)
+            self.assertEqual(call.model, "offline/flash")
+            self.assertEqual(call.prompt_version, GeminiEmailAnalyzer.PROMPT_VERSION)
+            self.assertGreater(call.input_tokens, 0)
+            self.assertGreater(call.output_tokens, 0)
+
+        self.email_response.refresh_from_db()
+        self.assertEqual(self.email_response.ai_call_count, 2)
+        self.assertEqual(
+            self.email_response.ai_input_tokens,
+            sum(calls.values_list("input_tokens", flat=True)),
+        )
+
+    def test_failed_calls_are_recorded(self):
+        analyzer = GeminiEmailAnalyzer(InvalidRequestBackend(), models=["flash"])
+        analysis_result = analyzer.analyze_email_response(self.email_response)
+        self.assertEqual(analysis_result["category"], "error")
+        call = LLMCall.objects.get()
+        self.assertFalse(call.success)
+        self.assertIn("400", call.error)
+
+    def test_summary_and_report(self):
+        self.email_response.ai_analysis_result = {"category": "complete_response"}
+        self.email_response.save()
+        for wall_ms, cached_tokens, escalated, success in (
+            (100, 0, True, True),
+            (200, 50, False, True),
+            (900, 0, False, False),
+        ):
+            LLMCall.objects.create(
+                email_response=self.email_response,
+                kind="analysis",
+                model="flash",
+                prompt_version="3",
+                escalated=escalated,
+                success=success,
+                wall_ms=wall_ms,
+                ttfb_ms=wall_ms // 2,
+                input_tokens=100,
+                output_tokens=10,
+                cached_tokens=cached_tokens,
+            )
+
+        summary = summarize_calls()
+        self.assertEqual((summary["calls"], summary["failures"]), (3, 1))
+        self.assertEqual(summary["input_tokens"], 300)
+        self.assertAlmostEqual(summary["cached_ratio"], 50 / 300)
+        # Failed calls are left out of the latency percentiles
+        self.assertEqual(summary["wall_ms"]["p99"], 200)
+        [row] = summary["by_kind"]
+        self.assertAlmostEqual(row["escalation_rate"], 1 / 3)
+        self.assertEqual(
+            (row["avg_wall_cached_ms"], row["avg_wall_uncached_ms"]), (200, 100)
+        )
+        self.assertEqual(summary["by_category"][0]["category"], "complete_response")
+
+        output = io.StringIO()
+        call_command("llm_report", "--kind", "analysis", stdout=output)
+        self.assertIn("Gemini calls: 3 (1 failed)", output.getvalue())
+
+
+class OfflineBackendTests(TestCase):
+    PROMPT = (
+        "\nHOA Information:\n- Name: Oak Ridge HOA\n\n"
+        "Here is their email response:\n---\n1. Yes\n2. Dues are $250 monthly\n---\n"
+    )
+
+    def test_same_seed_gives_the_same_run(self):
+        def run():
+            backend = OfflineBackend(latency="uniform:0,2", failure_rate=0.5, seed=3)
+            outcomes = []
+            for _i in range(10):
+                try:
+                    result = backend.generate("flash", self.PROMPT, True, 5)
+                except errors.ServerError:
+                    outcomes.append("failed")
+                else:
+                    outcomes.append((result["text"], result["ttfb_ms"]))
+            return outcomes
+
+        first = run()
+        self.assertEqual(run(), first)
+        self.assertIn("failed", first)
+        # Latencies vary, but the answer to a prompt never does
+        self.assertEqual(
+            len({outcome[0] for outcome in first if outcome != "failed"}), 1
+        )
+
+    def test_answers_follow_the_prompt(self):
+        analysis = json.loads(OfflineBackend().respond(self.PROMPT))
+        self.assertEqual(analysis["extracted_data"]["manages_properties"], True)
+        self.assertNotIn("follow_up", analysis)
+
+        follow_up = json.loads(
+            OfflineBackend().respond(
+                "- Name: Oak Ridge HOA\nOriginal HOA Response:\n"
+                "- Category: complete_response\n"
+            )
+        )
+        self.assertIn("all of the requested information", follow_up["body"])
+
+    def test_injected_failures_are_retryable(self):
+        backend = OfflineBackend(failure_rate=1.0)
+        with self.assertRaises(errors.ServerError) as raised:
+            backend.generate("flash", self.PROMPT, True, 5)
+        self.assertTrue(is_retryable(raised.exception))
+
+    def test_attempts_slower_than_the_timeout_time_out(self):
+        backend = OfflineBackend(latency="fixed:50")
+        with self.assertRaises(httpx.ReadTimeout):
+            backend.generate("flash", self.PROMPT, True, 0.01)
+
+    def test_backends_are_looked_up_by_name(self):
+        backend = get_llm_backend("offline")
+        self.assertIs(get_llm_backend("offline"), backend)
+        self.assertEqual(backend.model_name("flash"), "offline/flash")
+        with self.assertRaises(ValueError):
+            get_llm_backend("unknown")
+
+
+class RecordingBackend(OfflineBackend):
+    """Offline backend that records the prefix and prompt of each call"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def generate(self, model, prompt, json_output, timeout, prefix=""):
+        self.calls.append((prefix, prompt))
+        return super().generate(model, prompt, json_output, timeout, prefix)
+
+
+@override_settings(
+    LOCAL_EXTRACTOR_ENABLED=False,
+    NEAR_DUPLICATE_ENABLED=False,
+    LLM_CACHE_ENABLED=False,
+    GEMINI_PROMPT_CACHE_ENABLED=True,
+)
+class PromptPrefixTests(TestCase):
+    def setUp(self):
+        for prefix in PROMPT_PREFIXES.values():
+            for backend in ("offline", "gemini"):
+                prompt_prefix_cache.invalidate(
+                    prompt_prefix_cache.make_key(backend, "flash", prefix)
+                )
+
+    def email_response(self, hoa_name: str) -> EmailResponse:
+        return EmailResponse.objects.create(
+            hoa=create_hoa(hoa_name),
+            from_email="board@example.com",
+            subject="Re: Property Management Information Request",
+            text_content="1. Yes\n2. Dues are $250 monthly",
+            message_id=f"<{hoa_name}@example.com>",
+        )
+
+    def test_prefixes_hold_nothing_specific_to_the_email(self):
+        backend = RecordingBackend()
+        analyzer = GeminiEmailAnalyzer(backend, models=["flash"])
+        for hoa_name in ("Redwood HOA", "Chestnut HOA"):
+            analyzer.process_email_response(
+                self.email_response(hoa_name), single_call=False
+            )
+        prefixes = [prefix for prefix, _prompt in backend.calls]
+        self.assertEqual(
+            prefixes,
+            [PROMPT_PREFIXES["analysis"], PROMPT_PREFIXES["response"]] * 2,
+        )
+        for (prefix, prompt), hoa_name in zip(
+            backend.calls, ["Redwood HOA"] * 2 + ["Chestnut HOA"] * 2, strict=True
+        ):
+            self.assertNotIn(hoa_name, prefix)
+            self.assertNotIn("Dues are", prefix)
+            self.assertIn(hoa_name, prompt)
+
+    def test_repeated_prefixes_are_served_from_the_cache(self):
+        analyzer = GeminiEmailAnalyzer(OfflineBackend(), models=["flash"])
+        for hoa_name in ("Redwood HOA", "Chestnut HOA"):
+            analyzer.analyze_email_response(self.email_response(hoa_name))
+        first, second = LLMCall.objects.order_by("id")
+        self.assertEqual(first.cached_tokens, 0)
+        self.assertEqual(
+            second.cached_tokens, estimate_tokens(PROMPT_PREFIXES["analysis"])
+        )
+
+    @override_settings(GEMINI_API_KEY="test-key", GEMINI_PROMPT_CACHE_MIN_TOKENS=1)
+    def test_gemini_registers_each_prefix_once_and_recovers_if_it_expires(self):
+        client = mock.Mock()
+        client.caches.create.return_value.name = "cachedContents/prefix"
+        chunk = mock.Mock(text='{"ok": true}', usage_metadata=None)
+        client.models.generate_content_stream.side_effect = [
+            [chunk],
+            gemini_error(404),
+            [chunk],
+        ]
+        backend = GeminiBackend()
+        prefix = PROMPT_PREFIXES["analysis"]
+        with mock.patch("services.llm_backends.get_gemini_client", return_value=client):
+            backend.generate("flash", "per-email part", True, 5, prefix)
+            backend.generate("flash", "per-email part", True, 5, prefix)
+
+        client.caches.create.assert_called_once()
+        first, expired, inline = client.models.generate_content_stream.call_args_list
+        self.assertEqual(first.kwargs["contents"], "per-email part")
+        self.assertEqual(first.kwargs["config"].cached_content, "cachedContents/prefix")
+        # The cached prefix expired early, so it is sent inline instead
+        self.assertEqual(inline.kwargs["contents"], prefix + "per-email part")
+        self.assertIsNone(inline.kwargs["config"].cached_content)
+        self.assertFalse(
+            prompt_prefix_cache.get(
+                prompt_prefix_cache.make_key("gemini", "flash", prefix)
+            )[0]
+        )
+
+    @override_settings(GEMINI_API_KEY="test-key")
+    def test_gemini_sends_short_prefixes_inline(self):
+        client = mock.Mock()
+        client.models.generate_content_stream.return_value = [
+            mock.Mock(text="{}", usage_metadata=None)
+        ]
+        with mock.patch("services.llm_backends.get_gemini_client", return_value=client):
+            GeminiBackend().generate("flash", "per-email part", True, 5, "Short. ")
+        client.caches.create.assert_not_called()
+        self.assertEqual(
+            client.models.generate_content_stream.call_args.kwargs["contents"],
+            "Short. per-email part",
+        )
@@ -24,6 +24,16 @@ urlpatterns = [
         views.email_response_detail,
         name="email_response_detail",
     ),
+    path(
+        "responses/<int:response_id>/raw/",
+        views.email_response_raw,
+        name="email_response_raw",
+    ),
+    path(
+        "attachments/<int:attachment_id>/",
+        views.email_attachment_download,
+        name="email_attachment_download",
+    ),
     path(
         "responses/<int:response_id>/parse-and-generate/",
         views.parse_and_generate_response,
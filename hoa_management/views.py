@@ -1,20 +1,53 @@
 import json
 import logging
 import random
+from contextlib import nullcontext
 
+from django.conf import settings
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.http import JsonResponse
+from django.db import transaction
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
+from django.utils.http import content_disposition_header
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
+from services.attachment_store import (
+    AttachmentStore,
+    iter_file_range,
+    parse_byte_range,
+)
 from services.email_processor import EmailResponseProcessor
 from services.email_service import EmailService
 from services.gemini_service import GeminiEmailAnalyzer
+from services.inbound_queue import InboundEmailQueue
 
-from .models import HOA, EmailResponse, Property
+from .models import (
+    HOA,
+    EmailAttachment,
+    EmailRawPayload,
+    EmailResponse,
+    OutboxMessage,
+    Property,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def outbox_transaction():
+    """
+    Transaction wrapping a state change and the email it queues in the outbox
+    Inline sends (OUTBOX_ENABLED=False) must not hold it open during the Postmark call
+    """
+    return transaction.atomic() if settings.OUTBOX_ENABLED else nullcontext()
 
 
 def hoa_list(request):
@@ -86,14 +119,19 @@ def send_email(request, hoa_id):
     demo_email = request.POST.get("demo_email", "").strip() or None
 
     try:
-        result = email_service.send_hoa_onboarding_email(hoa, demo_email=demo_email)
+        with outbox_transaction():
+            result = email_service.send_hoa_onboarding_email(
+                hoa, demo_email=demo_email, queue=settings.OUTBOX_ENABLED
+            )
 
-        if result["success"]:
-            # Store the demo email used for this HOA
-            hoa.demo_email_used = result["demo_email"]
-            hoa.save()
+            if result["success"]:
+                # Store the demo email used for this HOA
+                hoa.demo_email_used = result["demo_email"]
+                hoa.save()
 
-            demo_info = f"Demo email sent to: {result['demo_email']}"
+        if result["success"]:
+            verb = "queued" if result.get("queued") else "sent"
+            demo_info = f"Demo email {verb} to: {result['demo_email']}"
             if result["is_custom_demo_email"]:
                 demo_info += " (custom address)"
             else:
@@ -101,7 +139,7 @@ def send_email(request, hoa_id):
 
             messages.success(
                 request,
-                f"✅ Email sent successfully! {demo_info}. "
+                f"✅ Email {verb} successfully! {demo_info}. "
                 f"📧 Check your inbox (and spam folder) for the demo email. "
                 f"🤖 Reply to the email to test our inbound processing and see the future AI response feature!",
             )
@@ -131,16 +169,20 @@ def send_email_ajax(request, hoa_id):
     demo_email = request.POST.get("demo_email", "").strip() or None
 
     try:
-        result = email_service.send_hoa_onboarding_email(hoa, demo_email=demo_email)
+        with outbox_transaction():
+            result = email_service.send_hoa_onboarding_email(
+                hoa, demo_email=demo_email, queue=settings.OUTBOX_ENABLED
+            )
 
-        if result["success"]:
-            # Store the demo email used for this HOA
-            hoa.demo_email_used = result["demo_email"]
-            hoa.save()
+            if result["success"]:
+                # Store the demo email used for this HOA
+                hoa.demo_email_used = result["demo_email"]
+                hoa.save()
 
         return JsonResponse(
             {
                 "success": result["success"],
+                "queued": result.get("queued", False),
                 "message": result["message"],
                 "hoa_name": hoa.name,
                 "demo_email": result.get("demo_email"),
@@ -185,7 +227,18 @@ def dashboard(request):
 def postmark_webhook(request):
     """
     Handle inbound email webhooks from Postmark
+    By default the payload is queued for the inbound workers and 202 is returned
     """
+    if settings.INBOUND_WEBHOOK_ASYNC:
+        try:
+            job = InboundEmailQueue().enqueue(request.body.decode("utf-8"))
+        except UnicodeDecodeError:
+            logger.error("Invalid encoding in webhook payload")
+            return JsonResponse(
+                {"status": "error", "message": "Invalid payload encoding"}, status=400
+            )
+        return JsonResponse({"status": "accepted", "job_id": job.id}, status=202)
+
     try:
         # Parse the JSON payload
         payload = json.loads(request.body.decode("utf-8"))
@@ -195,7 +248,7 @@ def postmark_webhook(request):
         success, message, email_response = processor.process_inbound_email(payload)
 
         if success:
-            logging.info(f"Webhook processed successfully: {message}")
+            logger.info(f"Webhook processed successfully: {message}")
             return JsonResponse(
                 {
                     "status": "success",
@@ -204,16 +257,16 @@ def postmark_webhook(request):
                 }
             )
         else:
-            logging.warning(f"Webhook processing failed: {message}")
+            logger.warning(f"Webhook processing failed: {message}")
             return JsonResponse({"status": "error", "message": message}, status=400)
 
     except json.JSONDecodeError:
-        logging.error("Invalid JSON in webhook payload")
+        logger.error("Invalid JSON in webhook payload")
         return JsonResponse(
             {"status": "error", "message": "Invalid JSON payload"}, status=400
         )
     except Exception as e:
-        logging.error(f"Webhook processing error: {str(e)}")
+        logger.error(f"Webhook processing error: {str(e)}")
         return JsonResponse(
             {"status": "error", "message": f"Processing error: {str(e)}"}, status=500
         )
@@ -253,11 +306,68 @@ def email_response_detail(request, response_id):
     context = {
         "email_response": email_response,
         "hoa": email_response.hoa,
+        "gemini_single_call": settings.GEMINI_SINGLE_CALL,
     }
 
     return render(request, "hoa_management/email_response_detail.html", context)
 
 
+def email_response_raw(request, response_id):
+    """
+    Return the raw Postmark payload of an email response as JSON
+    Payloads are stored compressed outside the EmailResponse row and only
+    loaded here
+    """
+    raw_payload = get_object_or_404(EmailRawPayload, email_response_id=response_id)
+    return JsonResponse(raw_payload.load(), safe=False, json_dumps_params={"indent": 2})
+
+
+def email_attachment_download(request, attachment_id):
+    """
+    Serve an inbound email attachment from the attachment store
+    Single-range Range requests are answered with 206 partial content
+    """
+    attachment = get_object_or_404(EmailAttachment, id=attachment_id)
+
+    try:
+        attachment_file = AttachmentStore().open(attachment.sha256)
+    except FileNotFoundError:
+        raise Http404("Attachment file is missing") from None
+
+    try:
+        byte_range = parse_byte_range(request.headers.get("Range"), attachment.size)
+    except ValueError:
+        attachment_file.close()
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{attachment.size}"
+        return response
+
+    content_type = attachment.content_type or "application/octet-stream"
+    if byte_range is None:
+        response = FileResponse(
+            attachment_file,
+            as_attachment=True,
+            filename=attachment.name,
+            content_type=content_type,
+        )
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            iter_file_range(attachment_file, start, length),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Length"] = str(length)
+        response["Content-Range"] = f"bytes {start}-{end}/{attachment.size}"
+        response["Content-Disposition"] = content_disposition_header(
+            True, attachment.name
+        )
+
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
 @require_http_methods(["POST"])
 def parse_and_generate_response(request, response_id):
     """
@@ -269,8 +379,15 @@ def parse_and_generate_response(request, response_id):
         # Initialize Gemini analyzer
         analyzer = GeminiEmailAnalyzer()
 
+        # The checkbox posts "1" when ticked after a hidden "0" fallback
+        single_call = request.POST.get("single_call")
+        if single_call is not None:
+            single_call = single_call == "1"
+
         # Process the email response
-        success = analyzer.process_email_response(email_response)
+        success = analyzer.process_email_response(
+            email_response, single_call=single_call
+        )
 
         if success:
             # Get the analysis result for display
@@ -283,7 +400,9 @@ def parse_and_generate_response(request, response_id):
                 f"✅ AI Analysis Complete! "
                 f"Category: {category.replace('_', ' ').title()} "
                 f"(Confidence: {confidence}%). "
-                f"Generated response is ready for review.",
+                f"Generated response is ready for review "
+                f"({email_response.ai_call_count} AI call(s), "
+                f"{email_response.ai_latency_ms} ms).",
             )
         else:
             messages.error(
@@ -325,8 +444,14 @@ def send_generated_response(request, response_id):
         )
         return redirect("email_response_detail", response_id=response_id)
 
-    # Check if already sent
-    if email_response.generated_response_sent:
+    # Check if already sent; a queued follow-up that could not be delivered
+    # may be sent again
+    idempotency_key = f"follow-up:{email_response.id}"
+    undelivered = OutboxMessage.objects.filter(
+        idempotency_key=idempotency_key,
+        status__in=OutboxMessage.UNDELIVERED_STATUSES,
+    ).exists()
+    if email_response.generated_response_sent and not undelivered:
         messages.warning(
             request,
             f"Generated response was already sent on {email_response.generated_response_sent_at.strftime('%Y-%m-%d %H:%M')}.",
@@ -344,27 +469,33 @@ def send_generated_response(request, response_id):
         default_demo_email = "raghv@mainstay.io"
         demo_email = email_response.hoa.demo_email_used or default_demo_email
 
-        # Send the email with proper threading headers
-        result = email_service.send_email(
-            to_email=demo_email,
-            subject=subject,
-            body=body,
-            is_html=True,
-            reply_to="4c17207b2cb109e33fb619e01b59252c@inbound.postmarkapp.com",
-            in_reply_to=email_response.message_id,
-            references=email_response.message_id,
-        )
+        # Send the email with proper threading headers; when queued, the
+        # outbox row is committed together with the "sent" flag
+        with outbox_transaction():
+            result = email_service.send_hoa_email(
+                hoa=email_response.hoa,
+                to_email=demo_email,
+                subject=subject,
+                body=body,
+                in_reply_to=email_response.message_id,
+                references=email_response.message_id,
+                template="follow_up",
+                queue=settings.OUTBOX_ENABLED,
+                idempotency_key=idempotency_key,
+            )
 
-        if result["success"]:
-            # Mark as sent
-            email_response.generated_response_sent = True
-            email_response.generated_response_sent_at = timezone.now()
-            email_response.save()
+            if result["success"]:
+                # Mark as sent
+                email_response.generated_response_sent = True
+                email_response.generated_response_sent_at = timezone.now()
+                email_response.save()
 
+        if result["success"]:
+            verb = "queued" if result.get("queued") else "sent"
             messages.success(
                 request,
-                f"✅ AI-generated response sent successfully! "
-                f"📧 Demo email sent to: {demo_email} "
+                f"✅ AI-generated response {verb} successfully! "
+                f"📧 Demo email {verb} to: {demo_email} "
                 f"(Original HOA: {email_response.hoa.contact_email})",
             )
         else:
@@ -0,0 +1,135 @@
+import base64
+import hashlib
+import logging
+import os
+import tempfile
+from collections.abc import Iterator
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AttachmentStore:
+    """
+    Content-addressed file store for inbound email attachments
+
+    Files are named by the SHA-256 of their content, so the same PDF sent by
+    a management company for many HOAs is stored once.
+    """
+
+    # Base64 characters decoded per step; a multiple of 4 keeps chunks aligned
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, root: str | Path | None = None):
+        self.root = Path(root or settings.ATTACHMENT_STORE_ROOT)
+
+    def path_for(self, sha256: str) -> Path:
+        """Return the on-disk location of a stored file"""
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+
+    def _decode_chunks(self, content: str) -> Iterator[bytes]:
+        """Decode base64 text a chunk at a time, ignoring embedded whitespace"""
+        remainder = ""
+        for start in range(0, len(content), self.CHUNK_SIZE):
+            chunk = remainder + "".join(
+                content[start : start + self.CHUNK_SIZE].split()
+            )
+            aligned = len(chunk) - len(chunk) % 4
+            remainder = chunk[aligned:]
+            if aligned:
+                yield base64.b64decode(chunk[:aligned])
+        if remainder:
+            raise ValueError("Attachment content is not valid base64")
+
+    def store_base64(self, content: str) -> tuple[str, int]:
+        """
+        Decode a base64 attachment into the store
+
+        Args:
+            content: Base64 encoded file content
+
+        Returns:
+            Tuple of (sha256 hex digest, size in bytes)
+        """
+        tmp_dir = self.root / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                for data in self._decode_chunks(content):
+                    digest.update(data)
+                    size += len(data)
+                    tmp_file.write(data)
+
+            sha256 = digest.hexdigest()
+            path = self.path_for(sha256)
+            if path.exists():
+                os.unlink(tmp_path)
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        return sha256, size
+
+    def open(self, sha256: str):
+        """Open a stored file for binary reading"""
+        return open(self.path_for(sha256), "rb")
+
+
+def parse_byte_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single-range HTTP Range header
+
+    Args:
+        header: Value of the Range header, e.g. "bytes=0-1023"
+        size: Total size of the resource in bytes
+
+    Returns:
+        Inclusive (start, end) byte positions, or None when the header is
+        absent, malformed or asks for multiple ranges (serve the whole file)
+
+    Raises:
+        ValueError: If the range cannot be satisfied
+    """
+    unit, _, ranges = (header or "").partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        return None
+
+    start_text, _, end_text = ranges.strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(size - int(end_text), 0)
+            end = size - 1
+    except ValueError:
+        return None
+
+    if start > end or start >= size:
+        raise ValueError(f"Range {header} not satisfiable for {size} bytes")
+    return start, min(end, size - 1)
+
+
+def iter_file_range(file, start: int, length: int, chunk_size: int = 64 * 1024):
+    """Yield length bytes of file starting at start, closing the file afterwards"""
+    try:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        file.close()
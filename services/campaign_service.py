@@ -0,0 +1,285 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, QuerySet
+from django.utils import timezone
+
+from hoa_management.models import HOA, Campaign, OutboundEmail
+from services.email_service import EmailService
+from services.mailbox_hash import reply_to_address
+
+logger = logging.getLogger(__name__)
+
+
+class CampaignRunner:
+    """
+    Service class for sending a Campaign's onboarding emails in bulk
+
+    HOAs are processed in chunks of up to 500 (Postmark's batch limit). Each
+    chunk is rendered on a thread pool, recorded as pending OutboundEmail
+    rows and handed to a bounded pool of batch sends; results are written
+    back per message once each batch call returns.
+    """
+
+    # Postmark accepts at most 500 messages per batch call
+    MAX_BATCH_SIZE = 500
+
+    def __init__(
+        self,
+        email_service: EmailService | None = None,
+        batch_size: int | None = None,
+        max_in_flight: int | None = None,
+        render_workers: int | None = None,
+    ):
+        self.email_service = email_service or EmailService()
+        self.batch_size = min(
+            batch_size or settings.CAMPAIGN_BATCH_SIZE, self.MAX_BATCH_SIZE
+        )
+        self.max_in_flight = max_in_flight or settings.CAMPAIGN_MAX_IN_FLIGHT
+        self.render_workers = render_workers or settings.CAMPAIGN_RENDER_WORKERS
+
+    @staticmethod
+    def select_hoas(filters: dict) -> QuerySet:
+        """
+        Build the HOA queryset for a campaign's filters
+
+        Args:
+            filters: Supports hoa_ids, management_company, name_contains and
+                not_contacted (no onboarding email sent yet)
+
+        Returns:
+            QuerySet of matching HOAs ordered by id
+        """
+        hoas = HOA.objects.all()
+        if filters.get("hoa_ids"):
+            hoas = hoas.filter(id__in=filters["hoa_ids"])
+        if filters.get("management_company"):
+            hoas = hoas.filter(management_company__iexact=filters["management_company"])
+        if filters.get("name_contains"):
+            hoas = hoas.filter(name__icontains=filters["name_contains"])
+        if filters.get("not_contacted"):
+            # A subquery, so that both conditions apply to the same email
+            hoas = hoas.exclude(
+                id__in=OutboundEmail.objects.filter(
+                    template="onboarding", status="sent"
+                ).values("hoa_id")
+            )
+        return hoas.order_by("id")
+
+    def _render_slice(self, hoas: list[HOA]) -> list[dict[str, str]]:
+        """Render onboarding emails for a slice of HOAs on a worker thread"""
+        try:
+            return [
+                self.email_service.generate_hoa_onboarding_email(hoa) for hoa in hoas
+            ]
+        finally:
+            # Worker threads get their own connection; don't leak it
+            connection.close()
+
+    def render_chunk(
+        self, executor: ThreadPoolExecutor, hoas: list[HOA]
+    ) -> list[dict[str, str]]:
+        """Render a chunk of HOAs in parallel, preserving order"""
+        slice_size = -(-len(hoas) // self.render_workers)
+        slices = [
+            hoas[start : start + slice_size]
+            for start in range(0, len(hoas), slice_size)
+        ]
+        rendered = []
+        for result in executor.map(self._render_slice, slices):
+            rendered.extend(result)
+        return rendered
+
+    def _record_results(
+        self,
+        campaign: Campaign,
+        outbound_emails: list[OutboundEmail],
+        results: list[dict] | None,
+        error: str | None = None,
+    ) -> None:
+        """Write per-message batch results back to the OutboundEmail ledger"""
+        now = timezone.now()
+        sent_hoa_ids = []
+        for index, outbound_email in enumerate(outbound_emails):
+            result = results[index] if results and index < len(results) else None
+            outbound_email.updated_at = now
+            if result and result.get("ErrorCode") == 0:
+                outbound_email.status = "sent"
+                outbound_email.message_id = result.get("MessageID") or None
+                outbound_email.sent_at = now
+                sent_hoa_ids.append(outbound_email.hoa_id)
+            else:
+                outbound_email.status = "failed"
+                outbound_email.error_code = result.get("ErrorCode") if result else None
+                outbound_email.error_message = (
+                    result.get("Message") if result else error
+                ) or "No result returned for message"
+
+        OutboundEmail.objects.bulk_update(
+            outbound_emails,
+            [
+                "status",
+                "message_id",
+                "sent_at",
+                "error_code",
+                "error_message",
+                "updated_at",
+            ],
+        )
+        # Follow-ups go to the same demo address as the onboarding email
+        HOA.objects.filter(id__in=sent_hoa_ids).update(
+            demo_email_used=campaign.demo_email or EmailService.DEFAULT_DEMO_EMAIL
+        )
+        Campaign.objects.filter(pk=campaign.pk).update(
+            sent_count=F("sent_count") + len(sent_hoa_ids),
+            failed_count=F("failed_count") + len(outbound_emails) - len(sent_hoa_ids),
+        )
+
+    def _collect(self, campaign: Campaign, in_flight: dict, return_when) -> None:
+        """Wait for in-flight batches and record their results"""
+        done, _ = wait(in_flight, return_when=return_when)
+        for future in done:
+            outbound_emails = in_flight.pop(future)
+            results, error = None, None
+            try:
+                results = future.result()
+            except Exception as e:
+                logger.error(f"Batch send for campaign {campaign.id} failed: {str(e)}")
+                error = str(e)
+            # Outside the try so that a batch is never recorded twice
+            self._record_results(campaign, outbound_emails, results, error)
+
+    def _settle_after_failure(
+        self, campaign: Campaign, in_flight: dict, submitted: set[int]
+    ) -> None:
+        """
+        Record batches still in flight when a campaign failed
+
+        Postmark may already have accepted them, so they are recorded like any
+        other batch; rows of batches that were never handed over are marked
+        failed so that a resume sends them.
+        """
+        while in_flight:
+            try:
+                self._collect(campaign, in_flight, FIRST_COMPLETED)
+            except Exception as e:
+                logger.error(
+                    f"Recording a batch for campaign {campaign.id} failed: {str(e)}"
+                )
+        never_sent = [
+            outbound_email_id
+            for outbound_email_id in OutboundEmail.objects.filter(
+                campaign=campaign, status="pending"
+            ).values_list("id", flat=True)
+            if outbound_email_id not in submitted
+        ]
+        not_sent = OutboundEmail.objects.filter(id__in=never_sent).update(
+            status="failed",
+            error_message="Campaign failed before the email was sent",
+            updated_at=timezone.now(),
+        )
+        Campaign.objects.filter(pk=campaign.pk).update(
+            failed_count=F("failed_count") + not_sent
+        )
+
+    def run(self, campaign: Campaign) -> Campaign:
+        """
+        Send all remaining emails of a campaign
+
+        HOAs that already received a successful email from this campaign are
+        skipped, so an interrupted campaign can simply be run again. HOAs
+        whose email is still pending (the run was killed mid-send) are also
+        skipped, as Postmark may have delivered it.
+
+        Args:
+            campaign: Campaign to run
+
+        Returns:
+            The refreshed Campaign
+        """
+        target_email = campaign.demo_email or EmailService.DEFAULT_DEMO_EMAIL
+        campaign.status = "running"
+        campaign.started_at = campaign.started_at or timezone.now()
+        campaign.save(update_fields=["status", "started_at"])
+
+        hoa_ids = list(
+            self.select_hoas(campaign.filters)
+            .exclude(
+                # Pending rows left by a killed run may have been delivered
+                id__in=OutboundEmail.objects.filter(
+                    campaign=campaign, status__in=["sent", "pending"]
+                ).values("hoa_id")
+            )
+            .values_list("id", flat=True)
+        )
+        logger.info(f"Campaign {campaign.id} sending to {len(hoa_ids)} HOAs")
+
+        in_flight: dict[Future, list[OutboundEmail]] = {}
+        submitted: set[int] = set()
+        try:
+            with (
+                ThreadPoolExecutor(self.render_workers) as render_pool,
+                ThreadPoolExecutor(self.max_in_flight) as send_pool,
+            ):
+                for start in range(0, len(hoa_ids), self.batch_size):
+                    chunk_ids = hoa_ids[start : start + self.batch_size]
+                    hoas = list(HOA.objects.filter(id__in=chunk_ids).order_by("id"))
+                    rendered = self.render_chunk(render_pool, hoas)
+
+                    outbound_emails = OutboundEmail.objects.bulk_create(
+                        [
+                            OutboundEmail(
+                                hoa=hoa,
+                                campaign=campaign,
+                                to_email=target_email,
+                                subject=content["subject"],
+                                template="onboarding",
+                            )
+                            for hoa, content in zip(hoas, rendered, strict=True)
+                        ]
+                    )
+                    messages = [
+                        {
+                            "To": target_email,
+                            "Subject": content["subject"],
+                            "HtmlBody": content["body"],
+                            "ReplyTo": reply_to_address(outbound_email.id),
+                            "Tag": "onboarding",
+                        }
+                        for outbound_email, content in zip(
+                            outbound_emails, rendered, strict=True
+                        )
+                    ]
+                    Campaign.objects.filter(pk=campaign.pk).update(
+                        total_messages=F("total_messages") + len(messages)
+                    )
+
+                    # Bound the number of batch calls waiting on Postmark
+                    if len(in_flight) >= self.max_in_flight:
+                        self._collect(campaign, in_flight, FIRST_COMPLETED)
+                    future = send_pool.submit(self.email_service.send_batch, messages)
+                    in_flight[future] = outbound_emails
+                    submitted.update(email.id for email in outbound_emails)
+
+                while in_flight:
+                    self._collect(campaign, in_flight, FIRST_COMPLETED)
+        except Exception as e:
+            logger.error(f"Campaign {campaign.id} failed: {str(e)}")
+            self._settle_after_failure(campaign, in_flight, submitted)
+            Campaign.objects.filter(pk=campaign.pk).update(
+                status="failed", error_message=str(e), finished_at=timezone.now()
+            )
+            campaign.refresh_from_db()
+            return campaign
+
+        Campaign.objects.filter(pk=campaign.pk).update(
+            status="completed", finished_at=timezone.now()
+        )
+        campaign.refresh_from_db()
+        logger.info(
+            f"Campaign {campaign.id} completed: {campaign.sent_count} sent, "
+            f"{campaign.failed_count} failed"
+        )
+        return campaign
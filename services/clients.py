@@ -0,0 +1,162 @@
+import logging
+import os
+import threading
+from collections.abc import Callable
+from typing import Any
+
+import httpx
+import requests
+from django.conf import settings
+from google import genai
+from google.genai import types
+from postmarker.core import PostmarkClient
+
+logger = logging.getLogger(__name__)
+
+
+def postmark_configured() -> bool:
+    """Return True when a real Postmark server token is configured"""
+    return bool(
+        settings.POSTMARK_API_TOKEN
+        and settings.POSTMARK_API_TOKEN != "your_postmark_api_token_here"
+    )
+
+
+def build_postmark_client(
+    server_token: str | None = None, root_api_url: str | None = None
+) -> PostmarkClient:
+    """
+    Create a Postmark client whose session keeps a pool of keep-alive
+    connections sized by POSTMARK_POOL_CONNECTIONS/POSTMARK_POOL_MAXSIZE
+
+    Args:
+        server_token: Defaults to POSTMARK_API_TOKEN
+        root_api_url: Defaults to POSTMARK_API_URL
+
+    Returns:
+        Configured PostmarkClient
+    """
+    client = PostmarkClient(
+        server_token=server_token or settings.POSTMARK_API_TOKEN,
+        timeout=settings.POSTMARK_TIMEOUT,
+        root_api_url=root_api_url or settings.POSTMARK_API_URL,
+    )
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=settings.POSTMARK_POOL_CONNECTIONS,
+        pool_maxsize=settings.POSTMARK_POOL_MAXSIZE,
+    )
+    client.session.mount("http://", adapter)
+    client.session.mount("https://", adapter)
+    return client
+
+
+def build_gemini_client() -> genai.Client:
+    """Create a Gemini client backed by a pooled httpx client"""
+    limits = httpx.Limits(
+        max_connections=settings.GEMINI_POOL_MAXSIZE,
+        max_keepalive_connections=settings.GEMINI_POOL_MAXSIZE,
+    )
+    http_options = types.HttpOptions(
+        # The SDK takes the timeout in milliseconds
+        timeout=int(settings.GEMINI_TIMEOUT * 1000),
+        # Separate pools back client.models and client.aio.models
+        client_args={"limits": limits},
+        async_client_args={"limits": limits},
+    )
+    if settings.GEMINI_API_URL:
+        http_options.base_url = settings.GEMINI_API_URL
+    return genai.Client(api_key=settings.GEMINI_API_KEY, http_options=http_options)
+
+
+class ClientRegistry:
+    """
+    Lazily created API clients shared by every request in a worker process
+
+    Clients are rebuilt after a fork so that child processes never share
+    sockets with their parent.
+    """
+
+    def __init__(self):
+        self._clients: dict[str, Any] = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self.hits: dict[str, int] = {}
+        self.misses: dict[str, int] = {}
+
+    def get(self, name: str, factory: Callable[[], Any]) -> Any:
+        """Return the shared client called name, creating it on first use"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._clients.clear()
+                self._pid = os.getpid()
+
+            client = self._clients.get(name)
+            if client is None:
+                self.misses[name] = self.misses.get(name, 0) + 1
+                logger.info(f"Creating shared {name} client for process {self._pid}")
+                client = self._clients[name] = factory()
+            else:
+                self.hits[name] = self.hits.get(name, 0) + 1
+            return client
+
+    def reset(self) -> None:
+        """Drop all clients, e.g. after changing their settings"""
+        with self._lock:
+            self._clients.clear()
+
+    def stats(self) -> dict[str, dict]:
+        """
+        Return registry hit/miss counters and, for Postmark, connection reuse
+
+        A registry hit is a request that reused an existing client; a
+        connection reuse is a request served on an already open socket.
+        """
+        with self._lock:
+            names = set(self.hits) | set(self.misses)
+            stats = {
+                name: {
+                    "hits": self.hits.get(name, 0),
+                    "misses": self.misses.get(name, 0),
+                }
+                for name in names
+            }
+            postmark = self._clients.get("postmark")
+
+        if postmark is not None:
+            stats["postmark"].update(postmark_connection_stats(postmark))
+        return stats
+
+
+def postmark_connection_stats(client: PostmarkClient) -> dict[str, int]:
+    """Count requests and newly opened connections across a client's pools"""
+    connections = 0
+    requests_made = 0
+    # The same adapter is mounted for http:// and https://
+    adapters = {id(adapter): adapter for adapter in client.session.adapters.values()}
+    for adapter in adapters.values():
+        pools = adapter.poolmanager.pools
+        # urllib3's RecentlyUsedContainer does not support iteration
+        for key in pools.keys():  # noqa: SIM118
+            pool = pools[key]
+            connections += pool.num_connections
+            requests_made += pool.num_requests
+    return {
+        "connections_opened": connections,
+        "requests": requests_made,
+        "connections_reused": max(requests_made - connections, 0),
+    }
+
+
+client_registry = ClientRegistry()
+
+
+def get_postmark_client() -> PostmarkClient | None:
+    """Return the shared Postmark client, or None when sending is simulated"""
+    if not postmark_configured():
+        return None
+    return client_registry.get("postmark", build_postmark_client)
+
+
+def get_gemini_client() -> genai.Client:
+    """Return the shared Gemini client"""
+    return client_registry.get("gemini", build_gemini_client)
@@ -0,0 +1,237 @@
+import functools
+import math
+import re
+from html.parser import HTMLParser
+
+from hoa_management.models import EmailResponse
+from services.email_service import EmailService
+
+# Tags whose text is never part of the reply
+SKIPPED_TAGS = {"head", "script", "style", "title", "blockquote"}
+# Containers mail clients wrap quoted history in
+QUOTE_CONTAINER_RE = re.compile(
+    r"gmail_quote|yahoo_quoted|moz-cite-prefix|divRplyFwdMsg|appendonsend|"
+    r"OutlookMessageHeader",
+    re.IGNORECASE,
+)
+BLOCK_TAGS = {
+    "p",
+    "div",
+    "br",
+    "tr",
+    "li",
+    "ul",
+    "ol",
+    "table",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "hr",
+    "section",
+    "article",
+}
+VOID_TAGS = {"br", "hr", "img", "meta", "input", "link", "col", "wbr", "source"}
+
+# Everything from the first of these lines on is quoted history
+QUOTE_HEADER_RE = re.compile(
+    r"^\s*(?:"
+    r"On\b[^\n]*(?:\n[^\n]*)?\bwrote:"
+    r"|-{2,}\s*Original Message\s*-{2,}"
+    r"|-{2,}\s*Forwarded message\s*-{2,}"
+    r"|_{10,}"
+    r"|From:\s[^\n]+\n(?:[^\n]+\n){0,3}?(?:Sent|Date):\s"
+    r")",
+    re.MULTILINE | re.IGNORECASE,
+)
+# Signature delimiters and mobile footers end the reply outright
+SIGNATURE_DELIMITER_RE = re.compile(
+    r"^(?:-- ?|Sent from my \w+.*|Get Outlook for \w+.*)$", re.MULTILINE
+)
+SIGN_OFF_RE = re.compile(
+    r"^(?:best|best regards|kind regards|warm regards|regards|sincerely|"
+    r"thanks|thank you|many thanks|cheers|respectfully)[,.!]?$",
+    re.IGNORECASE,
+)
+DISCLAIMER_RE = re.compile(
+    r"^\s*(?:confidentiality notice|disclaimer|this (?:e-?mail|message) and any "
+    r"attachments|this (?:e-?mail|message) is intended only)",
+    re.MULTILINE | re.IGNORECASE,
+)
+# A sign-off ends the reply only when followed by no more than this many
+# short lines (name, title, company, phone); anything else below it, such as
+# numbered answers, means it was part of the message
+MAX_SIGNATURE_LINES = 4
+MAX_SIGNATURE_LINE = 60
+ANSWER_LINE_RE = re.compile(r"^(?:Q\s*)?\d{1,2}\s*[.):]\s")
+# Template lines shorter than this (labels, names) may legitimately appear
+# in an answer and are never stripped
+MIN_TEMPLATE_LINE = 25
+
+
+class _TextExtractor(HTMLParser):
+    """HTML to plain text, dropping markup, hidden parts and quoted history"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self._skip_depth = 0
+        self._depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in VOID_TAGS:
+            self._depth += 1
+        if self._skip_depth:
+            return
+        marker = " ".join(
+            value or "" for name, value in attrs if name in ("class", "id")
+        )
+        if tag in SKIPPED_TAGS or QUOTE_CONTAINER_RE.search(marker):
+            self._skip_depth = self._depth
+            return
+        if tag in BLOCK_TAGS:
+            self.parts.append("\n")
+        if tag == "li":
+            self.parts.append("- ")
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+        if self._skip_depth:
+            if self._depth == self._skip_depth:
+                self._skip_depth = 0
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+        self._depth = max(self._depth - 1, 0)
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+def html_to_text(html: str) -> str:
+    """Convert an HTML email body to plain text"""
+    parser = _TextExtractor()
+    parser.feed(html or "")
+    parser.close()
+    return parser.text()
+
+
+def collapse_whitespace(text: str) -> str:
+    """Collapse runs of spaces and blank lines, keeping paragraph breaks"""
+    lines = [" ".join(line.split()) for line in text.replace("\r", "").split("\n")]
+    text = "\n".join(lines)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def strip_quoted_history(text: str) -> str:
+    """Drop everything from the first reply or forward header, and quoted lines"""
+    match = QUOTE_HEADER_RE.search(text)
+    if match:
+        text = text[: match.start()]
+    return "\n".join(line for line in text.split("\n") if not line.startswith(">"))
+
+
+def strip_signature(text: str) -> str:
+    """Drop disclaimers, signature blocks and the closing sign-off"""
+    for pattern in (DISCLAIMER_RE, SIGNATURE_DELIMITER_RE):
+        match = pattern.search(text)
+        if match:
+            text = text[: match.start()]
+
+    lines = text.rstrip().split("\n")
+    content_lines = [i for i, line in enumerate(lines) if line.strip()]
+    # Walk up from the bottom through the signature lines to the sign-off
+    for below, index in enumerate(reversed(content_lines)):
+        line = lines[index].strip()
+        if SIGN_OFF_RE.match(line):
+            # Keep a reply that consists of nothing but "Thanks!"
+            if index > content_lines[0]:
+                return "\n".join(lines[:index])
+            break
+        if (
+            below >= MAX_SIGNATURE_LINES
+            or len(line) > MAX_SIGNATURE_LINE
+            or ANSWER_LINE_RE.match(line)
+        ):
+            break
+    return text
+
+
+def _line_key(line: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", line.lower())
+
+
+def template_lines(template_html: str) -> set[str]:
+    """Normalized lines of our own email, used to drop pasted copies of it"""
+    return {
+        _line_key(line)
+        for line in collapse_whitespace(html_to_text(template_html)).split("\n")
+        if len(line) >= MIN_TEMPLATE_LINE
+    }
+
+
+def strip_template(text: str, lines_to_strip: set[str]) -> str:
+    """Drop reply lines that repeat a line of our own email verbatim"""
+    if not lines_to_strip:
+        return text
+    return "\n".join(
+        line for line in text.split("\n") if _line_key(line) not in lines_to_strip
+    )
+
+
+def normalize_email_body(
+    text: str, html: str = "", template_html: str | None = None
+) -> str:
+    """
+    Reduce an inbound email to the text the HOA actually wrote
+
+    Args:
+        text: Plain-text body; used when present
+        html: HTML body; converted to text when there is no plain-text body
+        template_html: Our outbound email, lines of which are removed
+
+    Returns:
+        Normalized plain text
+    """
+    original = collapse_whitespace(text if (text or "").strip() else html_to_text(html))
+    body = strip_quoted_history(original)
+    if template_html:
+        body = strip_template(body, template_lines(template_html))
+    body = collapse_whitespace(strip_signature(body))
+    # Never hand the model an empty reply, e.g. a bare forward of our email
+    return body or original
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count of English text (about four characters a token)"""
+    return math.ceil(len(text or "") / 4)
+
+
+@functools.cache
+def _email_service() -> EmailService:
+    # Created on first use, only to render the onboarding template
+    return EmailService()
+
+
+def normalize_email_response(email_response: EmailResponse) -> str:
+    """
+    Normalize an EmailResponse body, stripping the onboarding email sent to its HOA
+
+    Args:
+        email_response: EmailResponse with its HOA
+
+    Returns:
+        Normalized plain text
+    """
+    template = _email_service().generate_hoa_onboarding_email(email_response.hoa)
+    return normalize_email_body(
+        email_response.text_content or "",
+        email_response.html_content or "",
+        template["body"],
+    )
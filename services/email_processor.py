@@ -1,9 +1,29 @@
 import logging
+import re
 
-from hoa_management.models import HOA, EmailResponse
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from hoa_management.models import (
+    HOA,
+    EmailAttachment,
+    EmailRawPayload,
+    EmailResponse,
+    OutboundEmail,
+)
+from services.attachment_store import AttachmentStore
+from services.hoa_router import hoa_routing_index
+from services.lru_cache import LRUCache
+from services.mailbox_hash import parse_mailbox_hash
 
 logger = logging.getLogger(__name__)
 
+# Message IDs inside angle brackets in In-Reply-To/References headers
+MESSAGE_ID_RE = re.compile(r"<([^<>\s]+)>")
+
+# Message IDs stored recently by this process
+recent_message_ids = LRUCache(maxsize=settings.INBOUND_RECENT_MESSAGE_IDS)
+
 
 class EmailResponseProcessor:
     """
@@ -11,32 +31,39 @@ class EmailResponseProcessor:
     Stores raw email content for later processing with LLM
     """
 
-    def find_hoa_from_email(self, from_email: str, subject: str) -> HOA | None:
-        """
-        Try to identify which HOA sent the email response
-        """
+    def __init__(self):
+        self.attachment_store = AttachmentStore()
+
+    def _match_hoa_id(self, from_email: str, subject: str) -> int | None:
+        """Resolve an HOA id from the sender and subject via the routing index"""
         # First, try to match by email address
-        try:
-            hoa = HOA.objects.get(contact_email__iexact=from_email)
-            return hoa
-        except HOA.DoesNotExist:
-            pass
+        hoa_id = hoa_routing_index.match_email(from_email)
 
         # Try to extract HOA name from subject line if it contains our standard format
-        if "Property Management Information Request" in subject and " - " in subject:
+        if (
+            hoa_id is None
+            and "Property Management Information Request" in subject
+            and " - " in subject
+        ):
             # Simple string split to get HOA name
-            parts = subject.split(" - ")
-            if len(parts) > 1:
-                hoa_name = parts[-1].strip()
-                try:
-                    hoa = HOA.objects.get(name__iexact=hoa_name)
-                    return hoa
-                except HOA.DoesNotExist:
-                    pass
+            hoa_id = hoa_routing_index.match_name(subject.split(" - ")[-1])
 
         # Try partial name matching in subject
-        for hoa in HOA.objects.all():
-            if hoa.name.lower() in subject.lower():
+        if hoa_id is None:
+            hoa_id = hoa_routing_index.match_subject(subject)
+
+        return hoa_id
+
+    def find_hoa_from_email(self, from_email: str, subject: str) -> HOA | None:
+        """
+        Try to identify which HOA sent the email response
+        Lookups go through the in-process routing index, so only the final
+        primary key fetch touches the database
+        """
+        hoa_id = self._match_hoa_id(from_email, subject)
+        if hoa_id is not None:
+            hoa = HOA.objects.filter(pk=hoa_id).first()
+            if hoa:
                 return hoa
 
         logger.warning(
@@ -44,8 +71,223 @@ class EmailResponseProcessor:
         )
         return None
 
-    def process_inbound_email(
+    def _thread_message_ids(self, postmark_data: dict) -> list[str]:
+        """
+        Collect candidate outbound message IDs from the In-Reply-To and
+        References headers, most recent first
+
+        Postmark sends with Message-ID headers of the form <MessageID@domain>,
+        so both the full ID and its local part are candidates.
+        """
+        headers = {
+            header.get("Name", "").lower(): header.get("Value", "")
+            for header in postmark_data.get("Headers") or []
+        }
+        references = MESSAGE_ID_RE.findall(headers.get("references", ""))
+        thread_ids = MESSAGE_ID_RE.findall(headers.get("in-reply-to", ""))
+        thread_ids += reversed(references)
+
+        candidates = []
+        for thread_id in thread_ids:
+            for candidate in (thread_id, thread_id.split("@")[0]):
+                if candidate not in candidates:
+                    candidates.append(candidate)
+        return candidates
+
+    def _match_outbound_by_thread(
+        self, candidates_by_payload: list[list[str]]
+    ) -> list[OutboundEmail | None]:
+        """Resolve thread message IDs for several payloads with one indexed query"""
+        all_candidates = {
+            candidate
+            for candidates in candidates_by_payload
+            for candidate in candidates
+        }
+        if not all_candidates:
+            return [None] * len(candidates_by_payload)
+
+        outbound_emails = {
+            outbound_email.message_id: outbound_email
+            for outbound_email in OutboundEmail.objects.select_related("hoa").filter(
+                message_id__in=all_candidates
+            )
+        }
+        return [
+            next((outbound_emails[c] for c in candidates if c in outbound_emails), None)
+            for candidates in candidates_by_payload
+        ]
+
+    def find_outbound_email(self, postmark_data: dict) -> OutboundEmail | None:
+        """
+        Find the outbound email a reply answers
+
+        Tries the Postmark MailboxHash (primary key lookup) and then the
+        In-Reply-To/References headers (unique message_id lookup), so at most
+        two indexed queries are made before heuristic matching is needed
+        """
+        outbound_email_id = parse_mailbox_hash(postmark_data.get("MailboxHash"))
+        if outbound_email_id is not None:
+            outbound_email = (
+                OutboundEmail.objects.select_related("hoa")
+                .filter(pk=outbound_email_id)
+                .first()
+            )
+            if outbound_email:
+                return outbound_email
+
+        candidates = self._thread_message_ids(postmark_data)
+        if not candidates:
+            return None
+        return self._match_outbound_by_thread([candidates])[0]
+
+    def resolve_routes(
+        self, payloads: list[dict]
+    ) -> list[tuple[HOA | None, OutboundEmail | None]]:
+        """
+        Identify the HOA and originating outbound email for a batch of Postmark
+        payloads with at most three queries
+
+        Args:
+            payloads: Postmark inbound payloads
+
+        Returns:
+            List of (HOA or None when unroutable, OutboundEmail or None) in the
+            same order as payloads
+        """
+        outbound_ids = [
+            parse_mailbox_hash(payload.get("MailboxHash")) for payload in payloads
+        ]
+        by_mailbox_hash = OutboundEmail.objects.select_related("hoa").in_bulk(
+            {outbound_id for outbound_id in outbound_ids if outbound_id}
+        )
+        outbound_emails = [
+            by_mailbox_hash.get(outbound_id) for outbound_id in outbound_ids
+        ]
+
+        # Fall back to thread headers for payloads without a usable hash
+        unmatched = [
+            index
+            for index, outbound_email in enumerate(outbound_emails)
+            if outbound_email is None
+        ]
+        by_thread = self._match_outbound_by_thread(
+            [self._thread_message_ids(payloads[index]) for index in unmatched]
+        )
+        for index, outbound_email in zip(unmatched, by_thread, strict=True):
+            outbound_emails[index] = outbound_email
+
+        hoa_ids = [
+            None
+            if outbound_email
+            else self._match_hoa_id(payload.get("From", ""), payload.get("Subject", ""))
+            for payload, outbound_email in zip(payloads, outbound_emails, strict=True)
+        ]
+        hoas = HOA.objects.in_bulk({hoa_id for hoa_id in hoa_ids if hoa_id})
+        return [
+            (outbound_email.hoa, outbound_email)
+            if outbound_email
+            else (hoas.get(hoa_id), None)
+            for outbound_email, hoa_id in zip(outbound_emails, hoa_ids, strict=True)
+        ]
+
+    def build_email_response(
+        self,
+        postmark_data: dict,
+        hoa: HOA,
+        outbound_email: OutboundEmail | None = None,
+    ) -> EmailResponse:
+        """
+        Build an unsaved EmailResponse from a Postmark payload
+
+        Args:
+            postmark_data: The webhook payload from Postmark
+            hoa: The HOA the email was routed to
+            outbound_email: The outbound email this replies to, if known
+
+        Returns:
+            Unsaved EmailResponse instance
+        """
+        # No parsing for now - will be processed later with LLM
+        return EmailResponse(
+            hoa=hoa,
+            outbound_email=outbound_email,
+            message_id=postmark_data.get("MessageID", ""),
+            from_email=postmark_data.get("From", ""),
+            subject=postmark_data.get("Subject", ""),
+            html_content=postmark_data.get("HtmlBody", ""),
+            text_content=postmark_data.get("TextBody", ""),
+            response_completeness_score=0,  # Will be calculated by LLM later
+            status="new",
+        )
+
+    def extract_attachments(
         self, postmark_data: dict
+    ) -> tuple[dict, list[EmailAttachment]]:
+        """
+        Move attachment content out of a Postmark payload into the attachment store
+
+        Args:
+            postmark_data: The webhook payload from Postmark
+
+        Returns:
+            Tuple of (payload with attachment content replaced by its SHA-256,
+            unsaved EmailAttachment rows without an email_response)
+        """
+        if not postmark_data.get("Attachments"):
+            return postmark_data, []
+
+        stored_payload = dict(postmark_data)
+        stored_payload["Attachments"] = []
+        attachments = []
+        for item in postmark_data["Attachments"]:
+            sha256, size = self.attachment_store.store_base64(item.get("Content", ""))
+            metadata = {key: value for key, value in item.items() if key != "Content"}
+            metadata["SHA256"] = sha256
+            stored_payload["Attachments"].append(metadata)
+            attachments.append(
+                EmailAttachment(
+                    name=item.get("Name", "")[:255] or sha256,
+                    content_type=item.get("ContentType", "")[:100],
+                    size=size,
+                    sha256=sha256,
+                    content_id=item.get("ContentID") or None,
+                )
+            )
+        return stored_payload, attachments
+
+    def _insert_if_new(
+        self,
+        email_response: EmailResponse,
+        stored_payload: dict,
+        attachments: list[EmailAttachment],
+    ) -> bool:
+        """
+        Insert an EmailResponse with its raw payload and attachment rows unless
+        the message_id is already stored
+
+        Returns:
+            True if the row was inserted, False if it was a duplicate
+        """
+        try:
+            with transaction.atomic():
+                email_response.save(force_insert=True)
+                EmailRawPayload.from_payload(email_response.id, stored_payload).save(
+                    force_insert=True
+                )
+                for attachment in attachments:
+                    attachment.email_response = email_response
+                EmailAttachment.objects.bulk_create(attachments)
+        except IntegrityError:
+            # Only swallow the error when it was the message_id constraint
+            if EmailResponse.objects.filter(
+                message_id=email_response.message_id
+            ).exists():
+                return False
+            raise
+        return True
+
+    def process_inbound_email(
+        self, postmark_data: dict, raise_errors: bool = False
     ) -> tuple[bool, str, EmailResponse | None]:
         """
         Process an inbound email from Postmark webhook
@@ -53,6 +295,8 @@ class EmailResponseProcessor:
 
         Args:
             postmark_data: The webhook payload from Postmark
+            raise_errors: Re-raise unexpected errors instead of returning them,
+                so queue workers can tell retryable failures from rejections
 
         Returns:
             Tuple of (success, message, email_response_object)
@@ -61,12 +305,23 @@ class EmailResponseProcessor:
             # Extract email data from Postmark payload
             from_email = postmark_data.get("From", "")
             subject = postmark_data.get("Subject", "")
-            text_body = postmark_data.get("TextBody", "")
-            html_body = postmark_data.get("HtmlBody", "")
             message_id = postmark_data.get("MessageID", "")
 
-            # Find the HOA
-            hoa = self.find_hoa_from_email(from_email, subject)
+            # Retry storms for recently stored messages never reach the database
+            if message_id and message_id in recent_message_ids:
+                return (
+                    False,
+                    f"Email with message ID {message_id} already processed",
+                    None,
+                )
+
+            # Replies to a recorded send identify it through the mailbox hash or
+            # thread headers; otherwise fall back to matching sender and subject
+            outbound_email = self.find_outbound_email(postmark_data)
+            if outbound_email:
+                hoa = outbound_email.hoa
+            else:
+                hoa = self.find_hoa_from_email(from_email, subject)
             if not hoa:
                 return (
                     False,
@@ -74,28 +329,22 @@ class EmailResponseProcessor:
                     None,
                 )
 
-            # Check if we already processed this email
-            if EmailResponse.objects.filter(message_id=message_id).exists():
+            # Store the email and its raw payload, relying on the unique
+            # message_id constraint to reject emails already processed
+            email_response = self.build_email_response(
+                postmark_data, hoa, outbound_email
+            )
+            stored_payload, attachments = self.extract_attachments(postmark_data)
+            inserted = self._insert_if_new(email_response, stored_payload, attachments)
+            # Only once committed: a queue worker may still roll the insert back
+            transaction.on_commit(lambda: recent_message_ids.set(message_id, True))
+            if not inserted:
                 return (
                     False,
                     f"Email with message ID {message_id} already processed",
                     None,
                 )
 
-            # Create EmailResponse object with just the raw content
-            # No parsing for now - will be processed later with LLM
-            email_response = EmailResponse.objects.create(
-                hoa=hoa,
-                message_id=message_id,
-                from_email=from_email,
-                subject=subject,
-                raw_content=str(postmark_data),
-                html_content=html_body,
-                text_content=text_body,
-                response_completeness_score=0,  # Will be calculated by LLM later
-                status="new",
-            )
-
             logger.info(
                 f"Successfully stored email response from {hoa.name} (ID: {email_response.id})"
             )
@@ -103,5 +352,7 @@ class EmailResponseProcessor:
             return True, f"Successfully received email from {hoa.name}", email_response
 
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"Error processing inbound email: {str(e)}")
             return False, f"Error processing email: {str(e)}", None
@@ -1,26 +1,36 @@
 import logging
+import math
+import uuid
 
 from django.conf import settings
-from postmarker.core import PostmarkClient
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
 
-from hoa_management.models import HOA
+from hoa_management.models import HOA, OutboundEmail, OutboxMessage
+from services.clients import get_postmark_client
+from services.lru_cache import LRUCache
+from services.mailbox_hash import reply_to_address
+from services.rate_limiter import postmark_rate_limiter
 
 logger = logging.getLogger(__name__)
 
+# Rendered onboarding emails keyed by HOA and the freshness of its data
+rendered_email_cache = LRUCache(maxsize=settings.ONBOARDING_EMAIL_CACHE_SIZE)
+
 
 class EmailService:
     """
     Service class for handling email operations using Postmark
     """
 
+    # All demo sends are redirected here unless a custom address is given
+    DEFAULT_DEMO_EMAIL = "raghv@mainstay.io"
+
     def __init__(self):
-        self.client = None
-        if (
-            settings.POSTMARK_API_TOKEN
-            and settings.POSTMARK_API_TOKEN != "your_postmark_api_token_here"
-        ):
-            self.client = PostmarkClient(server_token=settings.POSTMARK_API_TOKEN)
-        else:
+        # Shared per process so sends reuse keep-alive connections
+        self.client = get_postmark_client()
+        if not self.client:
             logger.warning(
                 "Postmark API token not configured. Email sending will be simulated."
             )
@@ -35,16 +45,26 @@ class EmailService:
         Returns:
             Dictionary containing email subject and body
         """
-        properties = hoa.properties.filter(is_active=True)
-        property_list = "\n".join(
-            [
-                f"• {prop.address} ({prop.get_property_type_display()})"
-                for prop in properties[:10]
-            ]
-        )  # Limit to first 10
+        # Any change to the HOA or its properties moves updated_at or the count
+        freshness = hoa.properties.aggregate(
+            last_updated=Max("updated_at"), total=Count("id")
+        )
+        cache_key = (
+            hoa.pk,
+            hoa.updated_at,
+            freshness["last_updated"],
+            freshness["total"],
+        )
+        cached = rendered_email_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
 
-        if properties.count() > 10:
-            property_list += f"\n... and {properties.count() - 10} more properties"
+        properties = list(
+            hoa.properties.filter(is_active=True).only(
+                "hoa", "address", "property_type", "unit_count"
+            )
+        )
+        property_count = len(properties)
 
         subject = f"Property Management Information Request - {hoa.name}"
 
@@ -59,10 +79,10 @@ class EmailService:
                 </li>
             """
 
-        if properties.count() > 15:
+        if property_count > 15:
             property_list_html += f"""
                 <li style="margin-bottom: 8px; font-style: italic; color: #666;">
-                    ... and {properties.count() - 15} additional properties
+                    ... and {property_count - 15} additional properties
                 </li>
             """
 
@@ -95,7 +115,7 @@ class EmailService:
     </div>
 
     <div style="background-color: #fff3cd; padding: 15px; border-radius: 6px; margin: 20px 0;">
-        <h3 style="color: #2c3e50; margin-top: 0;">Properties in Our Records ({properties.count()} total)</h3>
+        <h3 style="color: #2c3e50; margin-top: 0;">Properties in Our Records ({property_count} total)</h3>
         <ul style="padding-left: 20px;">
             {property_list_html}
         </ul>
@@ -171,8 +191,92 @@ class EmailService:
 </body>
 </html>"""
 
+        rendered_email_cache.set(cache_key, {"subject": subject, "body": body})
         return {"subject": subject, "body": body}
 
+    def build_message(
+        self,
+        to_email: str,
+        subject: str,
+        body: str,
+        from_email: str | None = None,
+        is_html: bool = False,
+        reply_to: str | None = None,
+        in_reply_to: str | None = None,
+        references: str | None = None,
+    ) -> dict:
+        """
+        Build the Postmark message dictionary for an email
+
+        Args:
+            to_email: Recipient email address
+            subject: Email subject
+            body: Email body (plain text or HTML)
+            from_email: Sender email (optional, uses default if not provided)
+            is_html: Whether the body is HTML format
+            reply_to: Reply-to email address (optional)
+            in_reply_to: Message ID this email is replying to (for threading)
+            references: References header for email threading
+
+        Returns:
+            Message dictionary accepted by PostmarkClient.emails.send
+        """
+        email_data = {
+            "From": from_email or settings.POSTMARK_FROM_EMAIL,
+            "To": to_email,
+            "Subject": subject,
+        }
+
+        if reply_to:
+            email_data["ReplyTo"] = reply_to
+
+        # Add threading headers for email conversation
+        headers = {}
+        if in_reply_to:
+            headers["In-Reply-To"] = in_reply_to
+        if references:
+            headers["References"] = references
+
+        if headers:
+            email_data["Headers"] = headers
+
+        if is_html:
+            email_data["HtmlBody"] = body
+        else:
+            email_data["TextBody"] = body
+
+        return email_data
+
+    def deliver(self, email_data: dict) -> str:
+        """
+        Send a prepared Postmark message
+
+        Args:
+            email_data: Message dictionary from build_message
+
+        Returns:
+            The Postmark message ID
+
+        Raises:
+            RateLimitExceeded: If no Postmark rate limit token became available
+            Exception: If Postmark rejects the message or cannot be reached
+        """
+        if not self.client:
+            # Simulate email sending for development/testing
+            logger.info(
+                f"SIMULATED EMAIL SEND to {email_data['To']}: {email_data['Subject']}"
+            )
+            return f"simulated-{uuid.uuid4()}"
+
+        postmark_rate_limiter.acquire()
+        response = self.client.emails.send(**email_data)
+
+        # Handle both dict and list responses from Postmark
+        if isinstance(response, list) and len(response) > 0:
+            response = response[0]
+
+        return response.get("MessageID", "") if isinstance(response, dict) else ""
+
     def send_email(
         self,
         to_email: str,
@@ -214,43 +318,21 @@ class EmailService:
             return {
                 "success": True,
                 "message": "Email simulated successfully (Postmark not configured)",
-                "message_id": "simulated-" + str(hash(f"{to_email}{subject}")),
+                "message_id": f"simulated-{uuid.uuid4()}",
             }
 
         try:
-            email_data = {
-                "From": from_email,
-                "To": to_email,
-                "Subject": subject,
-            }
-
-            if reply_to:
-                email_data["ReplyTo"] = reply_to
-
-            # Add threading headers for email conversation
-            headers = {}
-            if in_reply_to:
-                headers["In-Reply-To"] = in_reply_to
-            if references:
-                headers["References"] = references
-
-            if headers:
-                email_data["Headers"] = headers
-
-            if is_html:
-                email_data["HtmlBody"] = body
-            else:
-                email_data["TextBody"] = body
-
-            response = self.client.emails.send(**email_data)
-
-            # Handle both dict and list responses from Postmark
-            if isinstance(response, list) and len(response) > 0:
-                response = response[0]
-
-            message_id = (
-                response.get("MessageID", "") if isinstance(response, dict) else ""
+            email_data = self.build_message(
+                to_email=to_email,
+                subject=subject,
+                body=body,
+                from_email=from_email,
+                is_html=is_html,
+                reply_to=reply_to,
+                in_reply_to=in_reply_to,
+                references=references,
             )
+            message_id = self.deliver(email_data)
 
             logger.info(
                 f"Email sent successfully to {to_email}. Message ID: {message_id}"
@@ -271,8 +353,260 @@ class EmailService:
                 "message_id": None,
             }
 
+    def send_batch(self, messages: list[dict]) -> list[dict]:
+        """
+        Send emails through Postmark's batch API
+
+        Args:
+            messages: Postmark message dictionaries (To, Subject, HtmlBody,
+                ReplyTo, ...); From defaults to POSTMARK_FROM_EMAIL
+
+        Returns:
+            One result per message, in order, with ErrorCode, Message and MessageID
+
+        Raises:
+            Exception: If the batch request itself fails
+        """
+        messages = [
+            {"From": settings.POSTMARK_FROM_EMAIL, **message} for message in messages
+        ]
+
+        if not self.client:
+            # Simulate batch sending for development/testing
+            logger.info(f"SIMULATED BATCH SEND of {len(messages)} emails")
+            return [
+                {
+                    "ErrorCode": 0,
+                    "Message": "OK",
+                    "MessageID": f"simulated-{uuid.uuid4()}",
+                    "To": message["To"],
+                }
+                for message in messages
+            ]
+
+        # postmarker splits the messages into calls of at most 500
+        postmark_rate_limiter.acquire(tokens=math.ceil(len(messages) / 500))
+        return self.client.emails.send_batch(*messages)
+
+    def send_hoa_email(
+        self,
+        hoa: HOA,
+        to_email: str,
+        subject: str,
+        body: str,
+        is_html: bool = True,
+        in_reply_to: str | None = None,
+        references: str | None = None,
+        template: str = "onboarding",
+        queue: bool = False,
+        idempotency_key: str | None = None,
+    ) -> dict[str, any]:
+        """
+        Send an email on behalf of an HOA conversation and record it in the
+        OutboundEmail ledger
+
+        The reply-to address carries a signed mailbox hash of the recorded
+        OutboundEmail, so replies are routed back to it with a primary key lookup.
+        With queue=True the email is written to the outbox instead of being
+        sent; call it inside the caller's transaction so the send is only
+        committed together with the state change it belongs to.
+
+        Args:
+            hoa: HOA the email is about
+            to_email: Recipient email address
+            subject: Email subject
+            body: Email body (plain text or HTML)
+            is_html: Whether the body is HTML format
+            in_reply_to: Message ID this email is replying to (for threading)
+            references: References header for email threading
+            template: Kind of email being sent (see OutboundEmail.TEMPLATE_CHOICES)
+            queue: Hand the email to the outbox worker instead of sending it now
+            idempotency_key: Key identifying a queued email; queueing the same
+                key again returns the existing outbox message
+
+        Returns:
+            Dictionary with success status, message and outbound_email_id
+        """
+        if queue:
+            return self.queue_hoa_email(
+                hoa=hoa,
+                to_email=to_email,
+                subject=subject,
+                body=body,
+                is_html=is_html,
+                in_reply_to=in_reply_to,
+                references=references,
+                template=template,
+                idempotency_key=idempotency_key,
+            )
+
+        outbound_email = OutboundEmail.objects.create(
+            hoa=hoa, to_email=to_email, subject=subject, template=template
+        )
+
+        result = self.send_email(
+            to_email=to_email,
+            subject=subject,
+            body=body,
+            is_html=is_html,
+            reply_to=reply_to_address(outbound_email.id),
+            in_reply_to=in_reply_to,
+            references=references,
+        )
+        result["outbound_email_id"] = outbound_email.id
+
+        # Record the Postmark message ID so replies can be threaded back
+        if result["success"]:
+            OutboundEmail.objects.filter(pk=outbound_email.pk).update(
+                status="sent",
+                message_id=result["message_id"] or None,
+                sent_at=timezone.now(),
+                updated_at=timezone.now(),
+            )
+        else:
+            OutboundEmail.objects.filter(pk=outbound_email.pk).update(
+                status="failed",
+                error_message=result["message"],
+                updated_at=timezone.now(),
+            )
+
+        return result
+
+    def queue_hoa_email(
+        self,
+        hoa: HOA,
+        to_email: str,
+        subject: str,
+        body: str,
+        is_html: bool = True,
+        in_reply_to: str | None = None,
+        references: str | None = None,
+        template: str = "onboarding",
+        idempotency_key: str | None = None,
+    ) -> dict[str, any]:
+        """
+        Record an HOA email in the OutboundEmail ledger and the outbox
+
+        Both rows are written in one transaction; `manage.py drain_outbox`
+        delivers the message. An idempotency key that was already queued is
+        not queued again, unless its message failed or was dead-lettered, in
+        which case that message is requeued.
+
+        Returns:
+            Dictionary with success status, message, outbound_email_id and
+            outbox_message_id
+        """
+        if idempotency_key:
+            existing = (
+                OutboxMessage.objects.filter(idempotency_key=idempotency_key)
+                .only("id", "outbound_email_id", "status")
+                .first()
+            )
+            if existing and existing.status in OutboxMessage.UNDELIVERED_STATUSES:
+                return self._requeue(
+                    existing,
+                    to_email=to_email,
+                    subject=subject,
+                    body=body,
+                    is_html=is_html,
+                    in_reply_to=in_reply_to,
+                    references=references,
+                )
+            if existing:
+                return self._queued_result(existing, duplicate=True)
+
+        try:
+            with transaction.atomic():
+                outbound_email = OutboundEmail.objects.create(
+                    hoa=hoa, to_email=to_email, subject=subject, template=template
+                )
+                outbox_message = OutboxMessage.objects.create(
+                    outbound_email=outbound_email,
+                    idempotency_key=idempotency_key
+                    or f"outbound-email:{outbound_email.id}",
+                    message=self.build_message(
+                        to_email=to_email,
+                        subject=subject,
+                        body=body,
+                        is_html=is_html,
+                        reply_to=reply_to_address(outbound_email.id),
+                        in_reply_to=in_reply_to,
+                        references=references,
+                    ),
+                    destination_domain=to_email.rpartition("@")[2].lower(),
+                    max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+                )
+        except IntegrityError:
+            if not idempotency_key:
+                raise
+            # Another request queued the same key concurrently
+            return self._queued_result(
+                OutboxMessage.objects.get(idempotency_key=idempotency_key),
+                duplicate=True,
+            )
+
+        logger.info(
+            f"Queued {template} email to {to_email} as outbox message {outbox_message.id}"
+        )
+        return self._queued_result(outbox_message)
+
+    def _requeue(
+        self, outbox_message: OutboxMessage, to_email: str, subject: str, **fields
+    ) -> dict[str, any]:
+        """Queue an undelivered outbox message again, with its message rebuilt"""
+        now = timezone.now()
+        message = self.build_message(
+            to_email=to_email,
+            subject=subject,
+            reply_to=reply_to_address(outbox_message.outbound_email_id),
+            **fields,
+        )
+        with transaction.atomic():
+            # Conditional, so that concurrent requests requeue it only once
+            requeued = OutboxMessage.objects.filter(
+                pk=outbox_message.pk, status__in=OutboxMessage.UNDELIVERED_STATUSES
+            ).update(
+                status="pending",
+                message=message,
+                destination_domain=to_email.rpartition("@")[2].lower(),
+                attempts=0,
+                available_at=now,
+                claim_token=None,
+                last_error=None,
+                updated_at=now,
+            )
+            if requeued:
+                OutboundEmail.objects.filter(
+                    pk=outbox_message.outbound_email_id
+                ).update(
+                    to_email=to_email,
+                    subject=subject,
+                    status="pending",
+                    error_code=None,
+                    error_message=None,
+                    updated_at=now,
+                )
+        if not requeued:
+            return self._queued_result(outbox_message, duplicate=True)
+        logger.info(f"Requeued undelivered outbox message {outbox_message.id}")
+        return self._queued_result(outbox_message)
+
+    @staticmethod
+    def _queued_result(outbox_message, duplicate: bool = False) -> dict[str, any]:
+        """Build the send_hoa_email style result for a queued email"""
+        return {
+            "success": True,
+            "queued": True,
+            "message": "Email already queued"
+            if duplicate
+            else "Email queued for delivery",
+            "message_id": None,
+            "outbound_email_id": outbox_message.outbound_email_id,
+            "outbox_message_id": outbox_message.id,
+        }
+
     def send_hoa_onboarding_email(
-        self, hoa: HOA, demo_email: str | None = None
+        self, hoa: HOA, demo_email: str | None = None, queue: bool = False
     ) -> dict[str, any]:
         """
         Generate and send onboarding email to an HOA
@@ -281,6 +615,7 @@ class EmailService:
         Args:
             hoa: HOA instance to send email to
             demo_email: Optional custom demo email address (defaults to raghv@mainstay.io)
+            queue: Hand the email to the outbox worker instead of sending it now
 
         Returns:
             Dictionary with success status and message
@@ -288,20 +623,19 @@ class EmailService:
         email_content = self.generate_hoa_onboarding_email(hoa)
 
         # Demo email redirection
-        default_demo_email = "raghv@mainstay.io"
-        target_email = demo_email or default_demo_email
+        target_email = demo_email or self.DEFAULT_DEMO_EMAIL
         original_email = hoa.contact_email
 
         logger.info(
             f"DEMO MODE: Redirecting email from {original_email} to {target_email}"
         )
 
-        result = self.send_email(
+        result = self.send_hoa_email(
+            hoa=hoa,
             to_email=target_email,
             subject=email_content["subject"],
             body=email_content["body"],
-            is_html=True,
-            reply_to="4c17207b2cb109e33fb619e01b59252c@inbound.postmarkapp.com",
+            queue=queue,
         )
 
         # Add demo information to the result
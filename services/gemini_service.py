@@ -1,14 +1,195 @@
 import json
 import logging
+import random
+import time
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.utils import timezone
-from google import genai
 
-from hoa_management.models import HOA, EmailResponse
+from hoa_management.models import HOA, EmailResponse, LLMCall
+from services.email_normalizer import normalize_email_response
+from services.llm_backends import LLMBackend, get_llm_backend
+from services.llm_cache import llm_result_cache
+from services.local_extractor import local_extractor
+from services.near_duplicates import near_duplicate_index
 
 logger = logging.getLogger(__name__)
 
+# Reasoning prefix of results whose Gemini output could not be parsed
+PARSE_ERROR = "Failed to parse AI response"
+
+# Information requested by the onboarding email
+REQUIRED_QUESTIONS = [
+    "Property management confirmation (Do you manage the listed properties?)",
+    "Regular dues amount",
+    "Payment method preference",
+    "Payment address (mailing address for payments)",
+    "Master HOA name (if applicable)",
+    "Phone number for HOA business",
+    "Management company name (if applicable)",
+]
+
+CATEGORY_DEFINITIONS = """1. "complete_response": HOA has answered ALL required questions clearly
+2. "requesting_clarification": HOA is asking for more details/clarification before answering
+3. "incomplete_response": HOA answered SOME but not all required questions
+4. "no_property_management": HOA states they don't manage any properties
+5. "partial_property_management": HOA manages some but not all properties in our database"""
+
+EXTRACTED_DATA_FORMAT = """{
+        "manages_properties": true/false/null,
+        "properties_confirmation": "extracted text or null",
+        "regular_dues_amount": "extracted amount or null",
+        "payment_method": "extracted method or null",
+        "payment_address": "extracted address or null",
+        "master_hoa_name": "extracted name or null",
+        "phone_number": "extracted phone or null",
+        "management_company": "extracted company or null"
+    }"""
+
+RESPONSE_INSTRUCTIONS = """CATEGORY-SPECIFIC INSTRUCTIONS:
+
+If "complete_response":
+- Thank them for providing all the information
+- Ask them to add our contact for future communications regarding this property
+- Use "Property Management Team (raghv@mainstay.io)" as the contact to add
+- Confirm we have all needed details
+
+If "requesting_clarification":
+- Address their specific questions/concerns
+- Provide the clarification they requested
+- Re-ask for the original information we need
+
+If "incomplete_response":
+- Thank them for the partial information
+- Politely ask for the missing information with specific explanations
+- Example: "Please share the payment address - this helps us make timely payments"
+
+If "no_property_management":
+- Thank them for clarifying
+- Ask them to ignore our email
+- Apologize for any confusion
+
+If "partial_property_management":
+- Confirm which properties they don't manage
+- Ask for verification of this detail
+- Request information only for properties they do manage
+
+RESPONSE REQUIREMENTS:
+- Professional and courteous tone
+- Reference their original response appropriately
+- Be specific about what information is still needed
+- Keep it concise but complete
+- Use HTML format for better presentation
+- When asking to add contact information, use "Property Management Team (raghv@mainstay.io)"
+- Sign emails as "Property Management Team\""""
+
+
+QUESTION_LIST = chr(10).join(f"- {q}" for q in REQUIRED_QUESTIONS)
+
+# Static instructions sent ahead of the per-email part of each prompt, so that
+# providers can cache them; nothing email- or HOA-specific belongs in them
+ANALYSIS_PREFIX = f"""
+You are an AI assistant helping to analyze HOA (Homeowners Association) email responses.
+
+We sent an HOA an email asking for the following information:
+{QUESTION_LIST}
+
+The HOA's details and their email response follow these instructions.
+
+Please analyze the response and categorize it into ONE of these scenarios:
+
+{CATEGORY_DEFINITIONS}
+
+For each answered question, extract the specific information provided.
+
+Respond in this exact JSON format:
+{{
+    "category": "one_of_the_five_categories_above",
+    "confidence": 85,
+    "extracted_data": {EXTRACTED_DATA_FORMAT},
+    "reasoning": "Brief explanation of why you chose this category and what information was found"
+}}
+"""
+
+RESPONSE_PREFIX = f"""
+You are an AI assistant helping to generate professional follow-up emails to HOAs.
+
+The HOA's details, their original response and its analysis follow these
+instructions. Based on the category of the analysis, generate an appropriate
+follow-up email response:
+
+{RESPONSE_INSTRUCTIONS}
+
+Respond in this exact JSON format, with the HOA's name in the subject:
+{{
+    "subject": "Re: Property Management Information Request - HOA name",
+    "body": "HTML formatted email body",
+    "reasoning": "Brief explanation of the response strategy"
+}}
+"""
+
+COMBINED_PREFIX = f"""
+You are an AI assistant helping to analyze HOA (Homeowners Association) email responses
+and to generate professional follow-up emails to HOAs.
+
+We sent an HOA an email asking for the following information:
+{QUESTION_LIST}
+
+The HOA's details and their email response follow these instructions.
+
+First, categorize the response into ONE of these scenarios:
+
+{CATEGORY_DEFINITIONS}
+
+For each answered question, extract the specific information provided.
+
+Then, based on the category you chose, generate an appropriate follow-up email response:
+
+{RESPONSE_INSTRUCTIONS}
+
+Respond in this exact JSON format, with the HOA's name in the subject:
+{{
+    "category": "one_of_the_five_categories_above",
+    "confidence": 85,
+    "extracted_data": {EXTRACTED_DATA_FORMAT},
+    "reasoning": "Brief explanation of why you chose this category and what information was found",
+    "follow_up": {{
+        "subject": "Re: Property Management Information Request - HOA name",
+        "body": "HTML formatted email body",
+        "reasoning": "Brief explanation of the response strategy"
+    }}
+}}
+"""
+
+PROMPT_PREFIXES = {
+    "analysis": ANALYSIS_PREFIX,
+    "response": RESPONSE_PREFIX,
+    "combined": COMBINED_PREFIX,
+}
+
+# EmailResponse fields written while processing a response, for bulk_update
+AI_RESULT_FIELDS = [
+    "normalized_content",
+    "ai_analysis_result",
+    "ai_generated_response",
+    "ai_reasoning",
+    "ai_processed_at",
+    "ai_call_count",
+    "ai_latency_ms",
+    "ai_input_tokens",
+    "ai_output_tokens",
+    "manages_properties",
+    "properties_confirmation",
+    "regular_dues_amount",
+    "payment_method",
+    "payment_address",
+    "master_hoa_name",
+    "phone_number",
+    "management_company",
+    "response_completeness_score",
+]
+
 
 class GeminiEmailAnalyzer:
     """
@@ -23,55 +204,403 @@ class GeminiEmailAnalyzer:
     NO_PROPERTY_MANAGEMENT = "no_property_management"
     PARTIAL_PROPERTY_MANAGEMENT = "partial_property_management"
 
-    def __init__(self):
-        """Initialize the Gemini client"""
-        if not settings.GEMINI_API_KEY:
-            raise ValueError("GEMINI_API_KEY not configured in settings")
+    MODEL = "gemini-2.0-flash-001"
+    # Bump whenever a prompt template changes so cached results of the old
+    # prompts are no longer served
+    PROMPT_VERSION = "3"
 
-        # Create the Gemini client
-        self.client = genai.Client(api_key=settings.GEMINI_API_KEY)
+    def __init__(
+        self, backend: LLMBackend | None = None, models: list[str] | None = None
+    ):
+        """
+        Initialize the analyzer
 
-    def analyze_email_response(self, email_response: EmailResponse) -> dict:
+        Args:
+            backend: Backend to send prompts to (defaults to LLM_BACKEND)
+            models: Models to try, cheapest first (defaults to GEMINI_MODELS)
+
+        Raises:
+            ValueError: If the backend is not configured, e.g. GEMINI_API_KEY is missing
         """
-        Analyze an HOA email response and categorize it into one of the 5 scenarios.
+        # Shared per process so calls reuse keep-alive connections
+        self.backend = backend or get_llm_backend()
+        self.models = models or settings.GEMINI_MODELS or [self.MODEL]
+        # Results are cached under the whole route, not the model that answered
+        self.model_name = self.backend.model_name(">".join(self.models))
+
+    @staticmethod
+    def new_usage() -> dict[str, int]:
+        """Return empty counters for _generate to accumulate into"""
+        return {"calls": 0, "latency_ms": 0, "input_tokens": 0, "output_tokens": 0}
+
+    def _generate(
+        self,
+        prompt: str,
+        usage: dict | None = None,
+        json_output: bool = False,
+        call: dict | None = None,
+        model: str | None = None,
+        prefix: str = "",
+    ) -> str:
+        """
+        Call Gemini and add the call's latency and token counts to usage
 
         Args:
-            email_response: EmailResponse object to analyze
+            prompt: Prompt to send
+            usage: Counters from new_usage() to update, if any
+            json_output: Ask Gemini for a JSON response
+            call: Dictionary to store the call's metrics in for _log_call
+            model: Model to call (defaults to the last, strongest of self.models)
+            prefix: Static start of the prompt, which the backend may cache
 
         Returns:
-            Dictionary containing analysis results
+            The response text
         """
+        call = {} if call is None else call
+        model = model or self.models[-1]
+        started = time.perf_counter()
         try:
-            # Get the email content
-            content = email_response.text_content or email_response.html_content or ""
+            # Deadline, retries, circuit breaker, hedging and the shared rate limit
+            result = self.backend.caller.call(
+                lambda timeout: self.backend.generate(
+                    model, prompt, json_output, timeout, prefix
+                )
+            )
+        except Exception as e:
+            self._record_call(call, started, error=e)
+            raise
+        self._record_call(call, started, result)
+        self._record_usage(usage, call)
+        return result["text"]
+
+    async def _agenerate(
+        self,
+        prompt: str,
+        usage: dict | None = None,
+        json_output: bool = False,
+        call: dict | None = None,
+        model: str | None = None,
+        prefix: str = "",
+    ) -> str:
+        """Async counterpart of _generate using the client's aio interface"""
+        call = {} if call is None else call
+        model = model or self.models[-1]
+        started = time.perf_counter()
+        try:
+            result = await self.backend.caller.acall(
+                lambda timeout: self.backend.agenerate(
+                    model, prompt, json_output, timeout, prefix
+                )
+            )
+        except Exception as e:
+            self._record_call(call, started, error=e)
+            raise
+        self._record_call(call, started, result)
+        self._record_usage(usage, call)
+        return result["text"]
+
+    @staticmethod
+    def _record_call(
+        call: dict,
+        started: float,
+        result: dict | None = None,
+        error: Exception | None = None,
+    ) -> None:
+        call["wall_ms"] = int((time.perf_counter() - started) * 1000)
+        if error is not None:
+            call["success"] = False
+            call["error"] = str(error)
+            return
+        for field in ("ttfb_ms", "input_tokens", "output_tokens", "cached_tokens"):
+            call[field] = result[field]
+
+    @staticmethod
+    def _record_usage(usage: dict | None, call: dict) -> None:
+        if usage is None:
+            return
+        usage["calls"] += 1
+        usage["latency_ms"] += call["wall_ms"]
+        usage["input_tokens"] += call["input_tokens"]
+        usage["output_tokens"] += call["output_tokens"]
+
+    def _log_call(
+        self, kind: str, email_response: EmailResponse, call: dict, model: str
+    ) -> None:
+        """Store the metrics of a Gemini call"""
+        LLMCall.objects.create(
+            email_response=email_response if email_response.pk else None,
+            kind=kind,
+            model=self.backend.model_name(model),
+            prompt_version=self.PROMPT_VERSION,
+            **call,
+        )
+
+    @staticmethod
+    def email_content(email_response: EmailResponse) -> str:
+        """
+        Reply text sent to Gemini: the normalized body, computed on first use
 
-            # Create the analysis prompt
-            analysis_prompt = self._create_analysis_prompt(email_response.hoa, content)
+        The result is kept on email_response.normalized_content and saved with
+        the analysis.
+        """
+        if email_response.normalized_content is None:
+            email_response.normalized_content = normalize_email_response(email_response)
+        return email_response.normalized_content
+
+    def _cache_key(
+        self, kind: str, email_response: EmailResponse, extra: dict | None = None
+    ) -> str | None:
+        """Key for the LLM result cache, or None when caching is disabled"""
+        if not settings.LLM_CACHE_ENABLED:
+            return None
+        hoa = email_response.hoa
+        hoa_context = {
+            "name": hoa.name,
+            "contact_email": hoa.contact_email,
+            "properties": hoa.properties.count(),
+        }
+        content = self.email_content(email_response)
+        return llm_result_cache.make_key(
+            kind, content, hoa_context, self.PROMPT_VERSION, self.model_name, extra
+        )
+
+    def _prepare(
+        self, kind: str, email_response: EmailResponse, extra: dict | None = None
+    ) -> tuple[str | None, object, str | None]:
+        """
+        Look up the cache and build the prompt for one Gemini call
 
-            # Call Gemini API
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash-001", contents=analysis_prompt
-            )
+        Args:
+            kind: "analysis", "response" or "combined"
+            email_response: EmailResponse object being processed
+            extra: Analysis result a response is generated from
 
-            # Parse the response
-            analysis_result = self._parse_analysis_response(response.text)
+        Returns:
+            Tuple of (cache key, cached result or None, prompt or None if cached)
+        """
+        # Identical content and HOA context give identical results
+        cache_key = self._cache_key(kind, email_response, extra)
+        cached = llm_result_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            logger.info(f"Using cached {kind} result for email {email_response.id}")
+            if kind == "response":
+                cached = tuple(cached)
+            elif kind == "combined":
+                cached = (cached[0], tuple(cached[1]))
+            return cache_key, cached, None
+
+        content = self.email_content(email_response)
+        if kind == "analysis":
+            prompt = self._create_analysis_prompt(email_response.hoa, content)
+        elif kind == "response":
+            prompt = self._create_response_prompt(email_response.hoa, content, extra)
+        else:
+            prompt = self._create_combined_prompt(email_response.hoa, content)
+        return cache_key, None, prompt
+
+    def _parse(self, kind: str, response_text: str) -> tuple[object, bool]:
+        """
+        Parse a Gemini response
 
-            logger.info(f"Successfully analyzed email response {email_response.id}")
+        Returns:
+            Tuple of (result, whether it failed to parse)
+        """
+        if kind == "analysis":
+            result = self._parse_analysis_response(response_text)
+            return result, result.get("category") == "error"
+        if kind == "response":
+            result = self._parse_response_generation(response_text)
+            return result, result[2].startswith(PARSE_ERROR)
+        result = self._parse_combined_response(response_text)
+        return result, result[0].get("category") == "error"
+
+    @staticmethod
+    def _needs_escalation(kind: str, result, failed: bool) -> bool:
+        """Whether a result should be retried with a stronger model"""
+        if failed:
+            return True
+        if kind == "response":
+            return False
+        analysis_result = result if kind == "analysis" else result[0]
+        try:
+            confidence = float(analysis_result.get("confidence", 0))
+        except (TypeError, ValueError):
+            return True
+        return confidence < settings.GEMINI_ESCALATION_CONFIDENCE
+
+    def _finish(
+        self,
+        kind: str,
+        email_response: EmailResponse,
+        cache_key: str | None,
+        result,
+        failed: bool,
+        model: str,
+        escalations: int,
+    ):
+        """Record the model that answered and cache the result unless it failed"""
+        if kind == "response":
+            cached = list(result)
+        else:
+            analysis_result = result if kind == "analysis" else result[0]
+            analysis_result["model"] = model
+            analysis_result["escalations"] = escalations
+            cached = result if kind == "analysis" else [result[0], list(result[1])]
+
+        if cache_key and not failed:
+            llm_result_cache.set(
+                cache_key, kind, self.PROMPT_VERSION, self.model_name, cached
+            )
+        logger.info(f"Successfully ran {kind} for email {email_response.id} on {model}")
+        return result
+
+    def _fallback(self, kind: str, email_response: EmailResponse, error: Exception):
+        """Result returned when a Gemini call raised"""
+        logger.error(
+            f"Error running {kind} for email response {email_response.id}: {str(error)}"
+        )
+        analysis_result = {
+            "category": "error",
+            "confidence": 0,
+            "extracted_data": {},
+            "reasoning": f"Error during analysis: {str(error)}",
+        }
+        follow_up = (
+            f"Re: {email_response.subject}",
+            "Thank you for your response. We will review it and get back to you soon.",
+            f"Error during response generation: {str(error)}",
+        )
+        if kind == "analysis":
             return analysis_result
-
+        if kind == "response":
+            return follow_up
+        return analysis_result, follow_up
+
+    def _run(
+        self,
+        kind: str,
+        email_response: EmailResponse,
+        usage: dict | None,
+        extra: dict | None = None,
+    ):
+        try:
+            cache_key, cached, prompt = self._prepare(kind, email_response, extra)
+            if cached is not None:
+                return cached
+            # Cheapest model first, escalating unclear or unparseable results
+            kept = None
+            for tier, model in enumerate(self.models):
+                call = {"tier": tier}
+                try:
+                    response_text = self._generate(
+                        prompt,
+                        usage,
+                        json_output=kind == "combined",
+                        call=call,
+                        model=model,
+                        prefix=PROMPT_PREFIXES[kind],
+                    )
+                    result, failed = self._parse(kind, response_text)
+                    last = tier + 1 == len(self.models)
+                    call["escalated"] = not last and self._needs_escalation(
+                        kind, result, failed
+                    )
+                except Exception as e:
+                    if kept is None:
+                        raise
+                    # Keep the cheaper model's usable result, uncached so that
+                    # the stronger model is tried again next time
+                    logger.warning(
+                        f"Escalating {kind} for email {email_response.id} to {model} failed: {str(e)}"
+                    )
+                    return self._finish(kind, email_response, None, *kept)
+                finally:
+                    self._log_call(kind, email_response, call, model)
+                if not call["escalated"]:
+                    break
+                kept = None if failed else (result, failed, model, tier)
+            return self._finish(
+                kind, email_response, cache_key, result, failed, model, tier
+            )
         except Exception as e:
-            logger.error(
-                f"Error analyzing email response {email_response.id}: {str(e)}"
+            return self._fallback(kind, email_response, e)
+
+    async def _arun(
+        self,
+        kind: str,
+        email_response: EmailResponse,
+        usage: dict | None,
+        extra: dict | None = None,
+    ):
+        # Cache lookups and prompts touch the database, so they run on
+        # Django's sync thread while the Gemini call itself is awaited
+        try:
+            cache_key, cached, prompt = await sync_to_async(self._prepare)(
+                kind, email_response, extra
             )
-            return {
-                "category": "error",
-                "confidence": 0,
-                "extracted_data": {},
-                "reasoning": f"Error during analysis: {str(e)}",
-            }
+            if cached is not None:
+                return cached
+            kept = None
+            for tier, model in enumerate(self.models):
+                call = {"tier": tier}
+                try:
+                    response_text = await self._agenerate(
+                        prompt,
+                        usage,
+                        json_output=kind == "combined",
+                        call=call,
+                        model=model,
+                        prefix=PROMPT_PREFIXES[kind],
+                    )
+                    result, failed = self._parse(kind, response_text)
+                    last = tier + 1 == len(self.models)
+                    call["escalated"] = not last and self._needs_escalation(
+                        kind, result, failed
+                    )
+                except Exception as e:
+                    if kept is None:
+                        raise
+                    # Keep the cheaper model's usable result, uncached so that
+                    # the stronger model is tried again next time
+                    logger.warning(
+                        f"Escalating {kind} for email {email_response.id} to {model} failed: {str(e)}"
+                    )
+                    return await sync_to_async(self._finish)(
+                        kind, email_response, None, *kept
+                    )
+                finally:
+                    await sync_to_async(self._log_call)(
+                        kind, email_response, call, model
+                    )
+                if not call["escalated"]:
+                    break
+                kept = None if failed else (result, failed, model, tier)
+            return await sync_to_async(self._finish)(
+                kind, email_response, cache_key, result, failed, model, tier
+            )
+        except Exception as e:
+            return self._fallback(kind, email_response, e)
+
+    def analyze_email_response(
+        self, email_response: EmailResponse, usage: dict | None = None
+    ) -> dict:
+        """
+        Analyze an HOA email response and categorize it into one of the 5 scenarios.
+
+        Args:
+            email_response: EmailResponse object to analyze
+            usage: Optional counters from new_usage() to record the call in
+
+        Returns:
+            Dictionary containing analysis results
+        """
+        return self._run("analysis", email_response, usage)
 
     def generate_follow_up_response(
-        self, email_response: EmailResponse, analysis_result: dict
+        self,
+        email_response: EmailResponse,
+        analysis_result: dict,
+        usage: dict | None = None,
     ) -> tuple[str, str]:
         """
         Generate an appropriate follow-up email response based on the analysis.
@@ -79,112 +608,53 @@ class GeminiEmailAnalyzer:
         Args:
             email_response: EmailResponse object
             analysis_result: Result from analyze_email_response
+            usage: Optional counters from new_usage() to record the call in
 
         Returns:
             Tuple of (email_subject, email_body, reasoning)
         """
-        try:
-            _ = analysis_result.get("category", "")
-
-            # Create the response generation prompt
-            response_prompt = self._create_response_prompt(
-                email_response.hoa,
-                email_response.text_content or email_response.html_content,
-                analysis_result,
-            )
-
-            # Call Gemini API
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash-001", contents=response_prompt
-            )
+        return self._run("response", email_response, usage, extra=analysis_result)
 
-            # Parse the response
-            email_content = self._parse_response_generation(response.text)
+    def analyze_and_generate(
+        self, email_response: EmailResponse, usage: dict | None = None
+    ) -> tuple[dict, tuple[str, str, str]]:
+        """
+        Analyze an HOA email response and write the follow-up in one Gemini call
 
-            logger.info(
-                f"Successfully generated response for email {email_response.id}"
-            )
-            return email_content
+        Args:
+            email_response: EmailResponse object to process
+            usage: Optional counters from new_usage() to record the call in
 
-        except Exception as e:
-            logger.error(
-                f"Error generating response for email {email_response.id}: {str(e)}"
-            )
-            return (
-                f"Re: {email_response.subject}",
-                "Thank you for your response. We will review it and get back to you soon.",
-                f"Error during response generation: {str(e)}",
-            )
+        Returns:
+            Tuple of (analysis result, (email_subject, email_body, reasoning))
+        """
+        return self._run("combined", email_response, usage)
 
     def _create_analysis_prompt(self, hoa: HOA, email_content: str) -> str:
-        """Create the prompt for email analysis"""
-
-        required_questions = [
-            "Property management confirmation (Do you manage the listed properties?)",
-            "Regular dues amount",
-            "Payment method preference",
-            "Payment address (mailing address for payments)",
-            "Master HOA name (if applicable)",
-            "Phone number for HOA business",
-            "Management company name (if applicable)",
-        ]
+        """Create the per-email part of the analysis prompt, after ANALYSIS_PREFIX"""
 
         prompt = f"""
-You are an AI assistant helping to analyze HOA (Homeowners Association) email responses.
-
 HOA Information:
 - Name: {hoa.name}
 - Contact Email: {hoa.contact_email}
 - Properties Count: {hoa.properties.count()}
 
-We sent this HOA an email asking for the following information:
-{chr(10).join(f"- {q}" for q in required_questions)}
-
 Here is their email response:
 ---
 {email_content}
 ---
-
-Please analyze this response and categorize it into ONE of these scenarios:
-
-1. "complete_response": HOA has answered ALL required questions clearly
-2. "requesting_clarification": HOA is asking for more details/clarification before answering
-3. "incomplete_response": HOA answered SOME but not all required questions
-4. "no_property_management": HOA states they don't manage any properties
-5. "partial_property_management": HOA manages some but not all properties in our database
-
-For each answered question, extract the specific information provided.
-
-Respond in this exact JSON format:
-{{
-    "category": "one_of_the_five_categories_above",
-    "confidence": 85,
-    "extracted_data": {{
-        "manages_properties": true/false/null,
-        "properties_confirmation": "extracted text or null",
-        "regular_dues_amount": "extracted amount or null",
-        "payment_method": "extracted method or null",
-        "payment_address": "extracted address or null",
-        "master_hoa_name": "extracted name or null",
-        "phone_number": "extracted phone or null",
-        "management_company": "extracted company or null"
-    }},
-    "reasoning": "Brief explanation of why you chose this category and what information was found"
-}}
 """
         return prompt
 
     def _create_response_prompt(
         self, hoa: HOA, original_content: str, analysis_result: dict
     ) -> str:
-        """Create the prompt for response generation"""
+        """Create the per-email part of the response prompt, after RESPONSE_PREFIX"""
 
         category = analysis_result.get("category", "")
         extracted_data = analysis_result.get("extracted_data", {})
 
         prompt = f"""
-You are an AI assistant helping to generate professional follow-up emails to HOAs.
-
 HOA Information:
 - Name: {hoa.name}
 - Contact Email: {hoa.contact_email}
@@ -197,55 +667,13 @@ Original HOA Response:
 Analysis Result:
 - Category: {category}
 - Extracted Data: {json.dumps(extracted_data, indent=2)}
-
-Based on the category "{category}", generate an appropriate follow-up email response:
-
-CATEGORY-SPECIFIC INSTRUCTIONS:
-
-If "complete_response":
-- Thank them for providing all the information
-- Ask them to add our contact for future communications regarding this property
-- Use "Property Management Team (raghv@mainstay.io)" as the contact to add
-- Confirm we have all needed details
-
-If "requesting_clarification":
-- Address their specific questions/concerns
-- Provide the clarification they requested
-- Re-ask for the original information we need
-
-If "incomplete_response":
-- Thank them for the partial information
-- Politely ask for the missing information with specific explanations
-- Example: "Please share the payment address - this helps us make timely payments"
-
-If "no_property_management":
-- Thank them for clarifying
-- Ask them to ignore our email
-- Apologize for any confusion
-
-If "partial_property_management":
-- Confirm which properties they don't manage
-- Ask for verification of this detail
-- Request information only for properties they do manage
-
-RESPONSE REQUIREMENTS:
-- Professional and courteous tone
-- Reference their original response appropriately
-- Be specific about what information is still needed
-- Keep it concise but complete
-- Use HTML format for better presentation
-- When asking to add contact information, use "Property Management Team (raghv@mainstay.io)"
-- Sign emails as "Property Management Team"
-
-Respond in this exact JSON format:
-{{
-    "subject": "Re: Property Management Information Request - {hoa.name}",
-    "body": "HTML formatted email body",
-    "reasoning": "Brief explanation of the response strategy"
-}}
 """
         return prompt
 
+    def _create_combined_prompt(self, hoa: HOA, email_content: str) -> str:
+        """Create the per-email part of the single-call prompt, after COMBINED_PREFIX"""
+        return self._create_analysis_prompt(hoa, email_content)
+
     def _parse_analysis_response(self, response_text: str) -> dict:
         """Parse the JSON response from Gemini analysis"""
         try:
@@ -263,7 +691,7 @@ Respond in this exact JSON format:
                 "category": "error",
                 "confidence": 0,
                 "extracted_data": {},
-                "reasoning": f"Failed to parse AI response: {str(e)}",
+                "reasoning": f"{PARSE_ERROR}: {str(e)}",
             }
 
     def _parse_response_generation(self, response_text: str) -> tuple[str, str, str]:
@@ -287,62 +715,77 @@ Respond in this exact JSON format:
             return (
                 "Re: Property Management Information Request",
                 "Thank you for your response. We will review it and get back to you soon.",
-                f"Failed to parse AI response: {str(e)}",
+                f"{PARSE_ERROR}: {str(e)}",
             )
 
-    def process_email_response(self, email_response: EmailResponse) -> bool:
+    def _parse_combined_response(
+        self, response_text: str
+    ) -> tuple[dict, tuple[str, str, str]]:
+        """Split the single-call JSON response into analysis and follow-up parts"""
+        analysis_result = self._parse_analysis_response(response_text)
+        follow_up = analysis_result.pop("follow_up", None) or {}
+        if analysis_result.get("category") == "error":
+            return analysis_result, (
+                "Re: Property Management Information Request",
+                "Thank you for your response. We will review it and get back to you soon.",
+                analysis_result["reasoning"],
+            )
+        return analysis_result, (
+            follow_up.get("subject", "Re: Property Management Information Request"),
+            follow_up.get("body", "Thank you for your response."),
+            follow_up.get("reasoning", "Generated response based on AI analysis"),
+        )
+
+    def process_email_response(
+        self, email_response: EmailResponse, single_call: bool | None = None
+    ) -> bool:
         """
         Complete processing of an email response: analyze and generate follow-up.
 
         Args:
             email_response: EmailResponse object to process
+            single_call: Analyze and generate in one Gemini call instead of two
+                (defaults to GEMINI_SINGLE_CALL)
 
         Returns:
             Boolean indicating success
         """
-        try:
-            # Analyze the email
-            analysis_result = self.analyze_email_response(email_response)
-
-            # Generate follow-up response
-            subject, body, reasoning = self.generate_follow_up_response(
-                email_response, analysis_result
-            )
-
-            # Update the email response object
-            email_response.ai_analysis_result = analysis_result
-            email_response.ai_generated_response = body
-            email_response.ai_reasoning = reasoning
-            email_response.ai_processed_at = timezone.now()
-
-            # Update extracted data fields
-            extracted_data = analysis_result.get("extracted_data", {})
-            if extracted_data.get("manages_properties") is not None:
-                email_response.manages_properties = extracted_data["manages_properties"]
-            if extracted_data.get("properties_confirmation"):
-                email_response.properties_confirmation = extracted_data[
-                    "properties_confirmation"
-                ]
-            if extracted_data.get("regular_dues_amount"):
-                email_response.regular_dues_amount = extracted_data[
-                    "regular_dues_amount"
-                ]
-            if extracted_data.get("payment_method"):
-                email_response.payment_method = extracted_data["payment_method"]
-            if extracted_data.get("payment_address"):
-                email_response.payment_address = extracted_data["payment_address"]
-            if extracted_data.get("master_hoa_name"):
-                email_response.master_hoa_name = extracted_data["master_hoa_name"]
-            if extracted_data.get("phone_number"):
-                email_response.phone_number = extracted_data["phone_number"]
-            if extracted_data.get("management_company"):
-                email_response.management_company = extracted_data["management_company"]
-
-            # Calculate completeness score
-            email_response.response_completeness_score = (
-                self._calculate_completeness_score(extracted_data)
-            )
+        if single_call is None:
+            single_call = settings.GEMINI_SINGLE_CALL
 
+        try:
+            usage = self.new_usage()
+            self.email_content(email_response)
+            extraction, use_local = self._local_extraction(email_response)
+            reused = None if use_local else self._near_duplicate(email_response)
+            if use_local:
+                # Well-structured reply: only the follow-up needs the model
+                analysis_result = local_extractor.analysis_result(extraction)
+                follow_up = self.generate_follow_up_response(
+                    email_response, analysis_result, usage
+                )
+            elif reused:
+                analysis_result, follow_up = reused
+                if follow_up is None:
+                    follow_up = self.generate_follow_up_response(
+                        email_response, analysis_result, usage
+                    )
+            elif single_call:
+                analysis_result, follow_up = self.analyze_and_generate(
+                    email_response, usage
+                )
+            else:
+                # Analyze the email
+                analysis_result = self.analyze_email_response(email_response, usage)
+
+                # Generate follow-up response
+                follow_up = self.generate_follow_up_response(
+                    email_response, analysis_result, usage
+                )
+            if extraction and not use_local and not reused:
+                self._compare_local(analysis_result, extraction)
+
+            self.apply_result(email_response, analysis_result, follow_up, usage)
             email_response.save()
 
             logger.info(f"Successfully processed email response {email_response.id}")
@@ -354,6 +797,163 @@ Respond in this exact JSON format:
             )
             return False
 
+    async def aprocess_email_response(
+        self, email_response: EmailResponse, single_call: bool | None = None
+    ) -> tuple[dict, tuple[str, str, str], dict]:
+        """
+        Async counterpart of process_email_response that leaves saving to the caller
+
+        Args:
+            email_response: EmailResponse object to process, with its HOA loaded
+            single_call: Analyze and generate in one Gemini call instead of two
+                (defaults to GEMINI_SINGLE_CALL)
+
+        Returns:
+            Tuple of (analysis result, (email_subject, email_body, reasoning), usage)
+            to pass to apply_result
+        """
+        if single_call is None:
+            single_call = settings.GEMINI_SINGLE_CALL
+
+        usage = self.new_usage()
+        # Rendering the template to strip from the reply queries the database
+        await sync_to_async(self.email_content)(email_response)
+        extraction, use_local = self._local_extraction(email_response)
+        reused = (
+            None
+            if use_local
+            else await sync_to_async(self._near_duplicate)(email_response)
+        )
+        if use_local:
+            analysis_result = local_extractor.analysis_result(extraction)
+            follow_up = await self._arun(
+                "response", email_response, usage, extra=analysis_result
+            )
+        elif reused:
+            analysis_result, follow_up = reused
+            if follow_up is None:
+                follow_up = await self._arun(
+                    "response", email_response, usage, extra=analysis_result
+                )
+        elif single_call:
+            analysis_result, follow_up = await self._arun(
+                "combined", email_response, usage
+            )
+        else:
+            analysis_result = await self._arun("analysis", email_response, usage)
+            follow_up = await self._arun(
+                "response", email_response, usage, extra=analysis_result
+            )
+        if extraction and not use_local and not reused:
+            self._compare_local(analysis_result, extraction)
+        return analysis_result, follow_up, usage
+
+    def _local_extraction(
+        self, email_response: EmailResponse
+    ) -> tuple[dict | None, bool]:
+        """
+        Run the rule-based extractor on a reply
+
+        Returns:
+            Tuple of (extraction, or None when the extractor is disabled, and
+            whether it is confident enough to replace the model analysis)
+        """
+        if not settings.LOCAL_EXTRACTOR_ENABLED:
+            return None, False
+        content = self.email_content(email_response)
+        extraction = local_extractor.extract(content)
+        # A sample of confident replies still goes to the model so that
+        # agreement between the two can be measured
+        use_local = (
+            local_extractor.is_confident(extraction)
+            and random.random() >= settings.LOCAL_EXTRACTOR_SHADOW_RATE
+        )
+        return extraction, use_local
+
+    def _near_duplicate(
+        self, email_response: EmailResponse
+    ) -> tuple[dict, tuple[str, str, str] | None] | None:
+        """
+        Adapt the analysis of an earlier near-identical reply, if there is one
+
+        Returns:
+            Tuple of (analysis result, follow-up or None if it must be
+            generated), or None
+        """
+        if not settings.NEAR_DUPLICATE_ENABLED or email_response.pk is None:
+            return None
+        content = self.email_content(email_response)
+        reused = near_duplicate_index.adapt(email_response, content)
+        if reused:
+            logger.info(
+                f"Reusing the analysis of email {reused[0]['near_duplicate_of']} "
+                f"for near-duplicate email {email_response.id}"
+            )
+        return reused
+
+    @staticmethod
+    def _compare_local(analysis_result: dict, extraction: dict) -> None:
+        """Store how the model's extraction agreed with the local one"""
+        if analysis_result.get("category") == "error":
+            return
+        analysis_result["local_extraction"] = local_extractor.compare(
+            extraction, analysis_result.get("extracted_data") or {}
+        )
+
+    def apply_result(
+        self,
+        email_response: EmailResponse,
+        analysis_result: dict,
+        follow_up: tuple[str, str, str],
+        usage: dict,
+    ) -> None:
+        """
+        Copy an analysis and generated follow-up onto an email response without saving
+
+        Args:
+            email_response: EmailResponse object to update
+            analysis_result: Result of the analysis
+            follow_up: Tuple of (email_subject, email_body, reasoning)
+            usage: Counters from new_usage()
+        """
+        _subject, body, reasoning = follow_up
+
+        # Update the email response object
+        email_response.ai_analysis_result = analysis_result
+        email_response.ai_generated_response = body
+        email_response.ai_reasoning = reasoning
+        email_response.ai_processed_at = timezone.now()
+        email_response.ai_call_count = usage["calls"]
+        email_response.ai_latency_ms = usage["latency_ms"]
+        email_response.ai_input_tokens = usage["input_tokens"]
+        email_response.ai_output_tokens = usage["output_tokens"]
+
+        # Update extracted data fields
+        extracted_data = analysis_result.get("extracted_data", {})
+        if extracted_data.get("manages_properties") is not None:
+            email_response.manages_properties = extracted_data["manages_properties"]
+        if extracted_data.get("properties_confirmation"):
+            email_response.properties_confirmation = extracted_data[
+                "properties_confirmation"
+            ]
+        if extracted_data.get("regular_dues_amount"):
+            email_response.regular_dues_amount = extracted_data["regular_dues_amount"]
+        if extracted_data.get("payment_method"):
+            email_response.payment_method = extracted_data["payment_method"]
+        if extracted_data.get("payment_address"):
+            email_response.payment_address = extracted_data["payment_address"]
+        if extracted_data.get("master_hoa_name"):
+            email_response.master_hoa_name = extracted_data["master_hoa_name"]
+        if extracted_data.get("phone_number"):
+            email_response.phone_number = extracted_data["phone_number"]
+        if extracted_data.get("management_company"):
+            email_response.management_company = extracted_data["management_company"]
+
+        # Calculate completeness score
+        email_response.response_completeness_score = self._calculate_completeness_score(
+            extracted_data
+        )
+
     def _calculate_completeness_score(self, extracted_data: dict) -> int:
         """Calculate completeness score based on answered questions"""
         total_questions = 7
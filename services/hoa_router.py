@@ -0,0 +1,209 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from hoa_management.models import HOA
+
+logger = logging.getLogger(__name__)
+
+
+class NameAutomaton:
+    """
+    Aho-Corasick automaton over lowercased HOA names
+
+    Finds every name occurring in a piece of text in a single pass, so the
+    cost of a match depends on the length of the text, not on the number
+    of names in the automaton.
+    """
+
+    def __init__(self, patterns: dict[str, int]):
+        """
+        Build the automaton
+
+        Args:
+            patterns: Mapping of lowercased name to the HOA id it routes to
+        """
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[list[tuple[int, int]]] = [[]]
+
+        for pattern, hoa_id in patterns.items():
+            self._add(pattern, hoa_id)
+        self._build_failure_links()
+
+    def _add(self, pattern: str, hoa_id: int) -> None:
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[node][char] = next_node
+            node = next_node
+        self._output[node].append((len(pattern), hoa_id))
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child].extend(self._output[self._fail[child]])
+
+    def best_match(self, text: str) -> int | None:
+        """
+        Return the HOA id of the longest name found in text
+
+        Ties between names of the same length go to the lowest HOA id.
+        """
+        best = None
+        node = 0
+        for char in text:
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for match in self._output[node]:
+                if best is None or (match[0], -match[1]) > (best[0], -best[1]):
+                    best = match
+        return best[1] if best else None
+
+
+class HOARoutingIndex:
+    """
+    Process-local index used to route inbound email to an HOA without
+    scanning the HOA table
+
+    Holds a lowercased contact email map, a lowercased name map and a
+    name automaton for subject matching. The maps are kept up to date from
+    the HOA post_save/post_delete signals; the automaton is recompiled
+    lazily on the next subject match after a change. Because signals only
+    fire in the process that saved the HOA, the whole index is reloaded
+    once it is older than HOA_ROUTING_INDEX_TTL seconds. Reloads build new
+    maps and swap them in, so lookups never see a partial index.
+    """
+
+    def __init__(self, ttl: int | None = None):
+        self.ttl = ttl if ttl is not None else settings.HOA_ROUTING_INDEX_TTL
+        self._lock = threading.RLock()
+        self._loaded_at: float | None = None
+        self._entries: dict[int, tuple[str, str]] = {}
+        self._by_email: dict[str, set[int]] = {}
+        self._by_name: dict[str, set[int]] = {}
+        self._automaton: NameAutomaton | None = None
+
+    @staticmethod
+    def _normalize(value: str | None) -> str:
+        return (value or "").strip().lower()
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and (
+            time.monotonic() - self._loaded_at < self.ttl
+        )
+
+    def _ensure_loaded(self) -> None:
+        if self._is_fresh():
+            return
+        with self._lock:
+            # Another thread may have reloaded the index while this one waited
+            if not self._is_fresh():
+                self.reload()
+
+    def reload(self) -> None:
+        """Rebuild the whole index from the database"""
+        with self._lock:
+            entries: dict[int, tuple[str, str]] = {}
+            by_email: dict[str, set[int]] = {}
+            by_name: dict[str, set[int]] = {}
+            rows = HOA.objects.values_list("id", "name", "contact_email").iterator()
+            for hoa_id, name, contact_email in rows:
+                email_key = self._normalize(contact_email)
+                name_key = self._normalize(name)
+                entries[hoa_id] = (email_key, name_key)
+                if email_key:
+                    by_email.setdefault(email_key, set()).add(hoa_id)
+                if name_key:
+                    by_name.setdefault(name_key, set()).add(hoa_id)
+            automaton = NameAutomaton({name: min(ids) for name, ids in by_name.items()})
+
+            # Lookups read the maps without the lock, so they are only ever
+            # replaced whole, never emptied and refilled
+            self._entries = entries
+            self._by_email = by_email
+            self._by_name = by_name
+            self._automaton = automaton
+            self._loaded_at = time.monotonic()
+            logger.info(f"Loaded HOA routing index with {len(entries)} HOAs")
+
+    def _add(self, hoa_id: int, name: str, contact_email: str) -> None:
+        email_key = self._normalize(contact_email)
+        name_key = self._normalize(name)
+        self._entries[hoa_id] = (email_key, name_key)
+        # Sets are replaced rather than changed in place, for the same reason
+        if email_key:
+            self._by_email[email_key] = self._by_email.get(email_key, set()) | {hoa_id}
+        if name_key:
+            self._by_name[name_key] = self._by_name.get(name_key, set()) | {hoa_id}
+
+    def _discard(self, hoa_id: int) -> None:
+        entry = self._entries.pop(hoa_id, None)
+        if entry is None:
+            return
+        for key, mapping in zip(entry, (self._by_email, self._by_name), strict=True):
+            ids = mapping.get(key, set()) - {hoa_id}
+            if ids:
+                mapping[key] = ids
+            else:
+                mapping.pop(key, None)
+
+    def update(self, hoa: HOA) -> None:
+        """Add or refresh a single HOA (called from post_save)"""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            old_name = self._entries.get(hoa.pk, ("", ""))[1]
+            self._discard(hoa.pk)
+            self._add(hoa.pk, hoa.name, hoa.contact_email)
+            if old_name != self._normalize(hoa.name):
+                self._automaton = None
+
+    def remove(self, hoa_id: int) -> None:
+        """Drop a single HOA (called from post_delete)"""
+        with self._lock:
+            if hoa_id in self._entries:
+                self._discard(hoa_id)
+                self._automaton = None
+
+    def match_email(self, email: str) -> int | None:
+        """Return the HOA id whose contact email matches exactly"""
+        self._ensure_loaded()
+        ids = self._by_email.get(self._normalize(email))
+        return min(ids) if ids else None
+
+    def match_name(self, name: str) -> int | None:
+        """Return the HOA id whose name matches exactly"""
+        self._ensure_loaded()
+        ids = self._by_name.get(self._normalize(name))
+        return min(ids) if ids else None
+
+    def match_subject(self, subject: str) -> int | None:
+        """Return the HOA id of the longest HOA name contained in subject"""
+        self._ensure_loaded()
+        with self._lock:
+            if self._automaton is None:
+                self._automaton = NameAutomaton(
+                    {name: min(ids) for name, ids in self._by_name.items()}
+                )
+            automaton = self._automaton
+        return automaton.best_match(subject.lower())
+
+
+hoa_routing_index = HOARoutingIndex()
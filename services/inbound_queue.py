@@ -0,0 +1,234 @@
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from hoa_management.models import EmailResponse, InboundEmailJob
+from services.email_processor import EmailResponseProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class ClaimLost(Exception):
+    """A job's claim expired before the worker could settle it"""
+
+
+class InboundEmailQueue:
+    """
+    Durable queue of inbound Postmark webhook payloads
+
+    The webhook only inserts the raw request body; workers claim jobs in
+    batches and run them through EmailResponseProcessor. A claim hides the
+    job for the visibility timeout, so jobs held by a crashed worker become
+    claimable again. Failed jobs are retried with exponential backoff and
+    moved to the dead-letter state once their attempts are used up. Done
+    jobs drop their payload and rejected ones its attachments.
+    """
+
+    def __init__(
+        self,
+        visibility_timeout: int | None = None,
+        max_attempts: int | None = None,
+        retry_backoff: int | None = None,
+    ):
+        self.visibility_timeout = (
+            visibility_timeout or settings.INBOUND_QUEUE_VISIBILITY_TIMEOUT
+        )
+        self.max_attempts = max_attempts or settings.INBOUND_QUEUE_MAX_ATTEMPTS
+        self.retry_backoff = retry_backoff or settings.INBOUND_QUEUE_RETRY_BACKOFF
+        self.processor = EmailResponseProcessor()
+
+    def enqueue(self, payload: str) -> InboundEmailJob:
+        """
+        Store a raw webhook body for later processing
+
+        Args:
+            payload: The undecoded webhook request body
+
+        Returns:
+            The created InboundEmailJob
+        """
+        return InboundEmailJob.objects.create(
+            payload=payload, max_attempts=self.max_attempts
+        )
+
+    def claim_batch(self, worker_id: str, batch_size: int) -> list[InboundEmailJob]:
+        """
+        Claim up to batch_size jobs for a worker
+
+        Candidates are selected first and then claimed with a conditional
+        UPDATE, so two workers racing for the same rows never both win.
+
+        Args:
+            worker_id: Identifier of the claiming worker
+            batch_size: Maximum number of jobs to claim
+
+        Returns:
+            List of claimed jobs
+        """
+        now = timezone.now()
+        claimable = Q(status__in=["pending", "processing"], available_at__lte=now)
+
+        # Jobs whose final attempt timed out are not retried again
+        InboundEmailJob.objects.filter(
+            status="processing",
+            available_at__lte=now,
+            attempts__gte=F("max_attempts"),
+        ).update(
+            status="dead",
+            claim_token=None,
+            last_error="Visibility timeout expired on final attempt",
+            updated_at=now,
+        )
+
+        candidate_ids = list(
+            InboundEmailJob.objects.filter(claimable)
+            .order_by("available_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not candidate_ids:
+            return []
+
+        claim_token = uuid.uuid4().hex
+        InboundEmailJob.objects.filter(claimable, id__in=candidate_ids).update(
+            status="processing",
+            attempts=F("attempts") + 1,
+            available_at=now + timedelta(seconds=self.visibility_timeout),
+            claim_token=claim_token,
+            claimed_by=worker_id,
+            updated_at=now,
+        )
+        return list(InboundEmailJob.objects.filter(claim_token=claim_token))
+
+    def _finish(self, job: InboundEmailJob, **fields) -> bool:
+        # Only the current claim holder may settle the job
+        fields.setdefault("claim_token", None)
+        fields["updated_at"] = timezone.now()
+        return bool(
+            InboundEmailJob.objects.filter(
+                pk=job.pk, claim_token=job.claim_token
+            ).update(**fields)
+        )
+
+    def fail(self, job: InboundEmailJob, error: str) -> None:
+        """Schedule a retry with exponential backoff, or dead-letter the job"""
+        if job.attempts >= job.max_attempts:
+            self._finish(job, status="dead", last_error=error)
+            logger.error(f"Inbound job {job.id} moved to dead letter: {error}")
+            return
+
+        delay = self.retry_backoff * 2 ** (job.attempts - 1)
+        self._finish(
+            job,
+            status="pending",
+            available_at=timezone.now() + timedelta(seconds=delay),
+            last_error=error,
+        )
+        logger.warning(
+            f"Inbound job {job.id} failed (attempt {job.attempts}), retrying in {delay}s: {error}"
+        )
+
+    def process_job(self, job: InboundEmailJob) -> None:
+        """
+        Run a claimed job through the inbound email processor
+
+        The email is stored in the same transaction that settles the job, so
+        a job is only ever re-run when nothing of it was committed.
+        """
+        try:
+            postmark_data = json.loads(job.payload)
+        except json.JSONDecodeError:
+            self._finish(job, status="dead", last_error="Invalid JSON payload")
+            logger.error(f"Inbound job {job.id} has an invalid JSON payload")
+            return
+
+        try:
+            # The stored email and the job's new state commit together, so a
+            # crash in between cannot leave a stored email on a pending job
+            with transaction.atomic():
+                success, message, email_response = self.processor.process_inbound_email(
+                    postmark_data, raise_errors=True
+                )
+                if not self._settle(
+                    job, postmark_data, success, message, email_response
+                ):
+                    raise ClaimLost
+        except ClaimLost:
+            # Another worker holds the job now and will store the email
+            logger.warning(f"Inbound job {job.id} claim expired before it was settled")
+            return
+        except Exception as e:
+            self.fail(job, str(e))
+            return
+        if not success:
+            logger.warning(f"Inbound job {job.id} rejected: {message}")
+
+    def _settle(
+        self,
+        job: InboundEmailJob,
+        postmark_data: dict,
+        success: bool,
+        message: str,
+        email_response: EmailResponse | None,
+    ) -> bool:
+        # Settled jobs don't keep the body: the email response holds the raw
+        # payload and attachments, and rejected ones only need the headers
+        if success:
+            return self._finish(
+                job,
+                status="done",
+                email_response=email_response,
+                last_error=None,
+                payload="",
+            )
+        # Unroutable or duplicate emails will not succeed on retry
+        postmark_data.pop("Attachments", None)
+        return self._finish(
+            job,
+            status="rejected",
+            last_error=message,
+            payload=json.dumps(postmark_data),
+        )
+
+    def run_worker(
+        self,
+        batch_size: int | None = None,
+        poll_interval: float | None = None,
+        once: bool = False,
+    ) -> int:
+        """
+        Claim and process jobs until stopped
+
+        Args:
+            batch_size: Jobs to claim per round trip
+            poll_interval: Seconds to sleep when the queue is empty
+            once: Return as soon as the queue is drained
+
+        Returns:
+            Number of jobs processed
+        """
+        batch_size = batch_size or settings.INBOUND_QUEUE_BATCH_SIZE
+        poll_interval = poll_interval or settings.INBOUND_QUEUE_POLL_INTERVAL
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        processed = 0
+
+        logger.info(f"Inbound queue worker {worker_id} started")
+        while True:
+            jobs = self.claim_batch(worker_id, batch_size)
+            if not jobs:
+                if once:
+                    return processed
+                time.sleep(poll_interval)
+                continue
+
+            for job in jobs:
+                self.process_job(job)
+            processed += len(jobs)
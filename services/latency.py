@@ -0,0 +1,50 @@
+import random
+from collections.abc import Callable
+
+
+def parse_latency(spec: str, rng: random.Random | None = None) -> Callable[[], float]:
+    """
+    Build a latency sampler from a distribution spec, in milliseconds
+
+    Supported specs: "fixed:50", "uniform:20,80", "exponential:50" (mean),
+    "lognormal:50,0.5" (median, sigma) and "normal:50,10" (mean, stddev).
+    Pass a seeded rng for a reproducible sequence of latencies.
+
+    Returns:
+        Function returning a latency in seconds
+    """
+    kind, _, args = spec.partition(":")
+    try:
+        params = [float(arg) for arg in args.split(",")] if args else []
+    except ValueError as e:
+        raise ValueError(f"Invalid latency spec: {spec}") from e
+
+    expected = {"fixed": 1, "exponential": 1, "uniform": 2, "lognormal": 2, "normal": 2}
+    if expected.get(kind) != len(params):
+        raise ValueError(f"Invalid latency spec: {spec}")
+    rng = rng or random
+
+    def sample() -> float:
+        if kind == "fixed":
+            value = params[0]
+        elif kind == "uniform":
+            value = rng.uniform(params[0], params[1])
+        elif kind == "exponential":
+            value = rng.expovariate(1 / params[0]) if params[0] else 0.0
+        elif kind == "lognormal":
+            value = params[0] * rng.lognormvariate(0, params[1])
+        else:
+            value = rng.gauss(params[0], params[1])
+        return max(value, 0.0) / 1000
+
+    return sample
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    """p50/p95/p99 of sorted values in seconds, reported in milliseconds"""
+    if not values:
+        return {}
+    return {
+        name: round(values[min(int(len(values) * q), len(values) - 1)] * 1000, 2)
+        for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+    }
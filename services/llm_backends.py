@@ -0,0 +1,442 @@
+import asyncio
+import functools
+import json
+import logging
+import random
+import re
+import threading
+import time
+
+import httpx
+from django.conf import settings
+from google.genai import errors, types
+
+from services.clients import get_gemini_client
+from services.email_normalizer import estimate_tokens
+from services.latency import parse_latency
+from services.local_extractor import local_extractor
+from services.prompt_cache import prompt_prefix_cache
+from services.resilience import CircuitBreaker, ResilientCaller, gemini_caller
+
+logger = logging.getLogger(__name__)
+
+# Stop using a cached prefix this many seconds before Gemini expires it
+PREFIX_EXPIRY_MARGIN = 60
+
+# Blocks of the analyzer's prompts the offline backend reads its input from
+EMAIL_BLOCK_RE = re.compile(r"\n---\n(.*?)\n---\n", re.DOTALL)
+HOA_NAME_RE = re.compile(r"^- Name: (.*)$", re.MULTILINE)
+CATEGORY_RE = re.compile(r"^- Category: (.*)$", re.MULTILINE)
+
+
+class LLMBackend:
+    """
+    Service GeminiEmailAnalyzer sends its prompts to
+
+    generate and agenerate make a single attempt and return a dictionary
+    with the response text, time to first byte in milliseconds (or None) and
+    input, output and cached token counts. The prompt is prefix followed by
+    prompt; backends may cache the static prefix. Retries, deadlines and the
+    circuit breaker are applied around them by the backend's caller.
+    """
+
+    name = ""
+    caller: ResilientCaller
+
+    def model_name(self, model: str) -> str:
+        """Name results of the model are cached and recorded under"""
+        return model
+
+    def generate(
+        self,
+        model: str,
+        prompt: str,
+        json_output: bool,
+        timeout: float,
+        prefix: str = "",
+    ) -> dict:
+        raise NotImplementedError
+
+    async def agenerate(
+        self,
+        model: str,
+        prompt: str,
+        json_output: bool,
+        timeout: float,
+        prefix: str = "",
+    ) -> dict:
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through the shared genai client, with streamed responses"""
+
+    name = "gemini"
+
+    def __init__(self):
+        if not settings.GEMINI_API_KEY:
+            raise ValueError("GEMINI_API_KEY not configured in settings")
+        self.caller = gemini_caller
+
+    @staticmethod
+    def _config(
+        json_output: bool, timeout: float, cached_content: str | None = None
+    ) -> types.GenerateContentConfig:
+        """Request config, limiting the request to timeout seconds"""
+        return types.GenerateContentConfig(
+            response_mime_type="application/json" if json_output else None,
+            cached_content=cached_content,
+            # The SDK takes the timeout in milliseconds
+            http_options=types.HttpOptions(
+                timeout=max(int(min(timeout, settings.GEMINI_TIMEOUT) * 1000), 1)
+            ),
+        )
+
+    @staticmethod
+    def _prefix_key(model: str, prefix: str) -> str | None:
+        """Prompt cache key of a prefix worth caching with Gemini, or None"""
+        if (
+            not prefix
+            or not settings.GEMINI_PROMPT_CACHE_ENABLED
+            # Gemini rejects cached contents below a model-specific size
+            or estimate_tokens(prefix) < settings.GEMINI_PROMPT_CACHE_MIN_TOKENS
+        ):
+            return None
+        return prompt_prefix_cache.make_key(GeminiBackend.name, model, prefix)
+
+    @staticmethod
+    def _cache_config(prefix: str) -> types.CreateCachedContentConfig:
+        return types.CreateCachedContentConfig(
+            contents=[prefix], ttl=f"{settings.GEMINI_PROMPT_CACHE_TTL}s"
+        )
+
+    @staticmethod
+    def _remember(key: str, cached_content: str | None) -> str | None:
+        # Forget the name shortly before Gemini expires the cached content
+        ttl = settings.GEMINI_PROMPT_CACHE_TTL - PREFIX_EXPIRY_MARGIN
+        prompt_prefix_cache.set(key, cached_content, ttl)
+        return cached_content
+
+    def _cached_prefix(self, key: str | None, model: str, prefix: str) -> str | None:
+        """Name of the Gemini cached content holding prefix, created on first use"""
+        if key is None:
+            return None
+        found, cached_content = prompt_prefix_cache.get(key)
+        if found:
+            return cached_content
+        try:
+            cache = get_gemini_client().caches.create(
+                model=model, config=self._cache_config(prefix)
+            )
+        except errors.APIError as e:
+            logger.warning(f"Could not cache prompt prefix for {model}: {str(e)}")
+            return self._remember(key, None)
+        return self._remember(key, cache.name)
+
+    async def _acached_prefix(
+        self, key: str | None, model: str, prefix: str
+    ) -> str | None:
+        if key is None:
+            return None
+        found, cached_content = prompt_prefix_cache.get(key)
+        if found:
+            return cached_content
+        try:
+            cache = await get_gemini_client().aio.caches.create(
+                model=model, config=self._cache_config(prefix)
+            )
+        except errors.APIError as e:
+            logger.warning(f"Could not cache prompt prefix for {model}: {str(e)}")
+            return self._remember(key, None)
+        return self._remember(key, cache.name)
+
+    @staticmethod
+    def _cache_dropped(error: errors.ClientError, cached_content: str | None) -> bool:
+        """Whether a request failed because its cached prefix no longer exists"""
+        return cached_content is not None and error.code in (400, 403, 404)
+
+    def generate(
+        self,
+        model: str,
+        prompt: str,
+        json_output: bool,
+        timeout: float,
+        prefix: str = "",
+    ) -> dict:
+        key = self._prefix_key(model, prefix)
+        cached_content = self._cached_prefix(key, model, prefix)
+        try:
+            return self._stream(
+                model,
+                prompt if cached_content else prefix + prompt,
+                self._config(json_output, timeout, cached_content),
+            )
+        except errors.ClientError as e:
+            if not self._cache_dropped(e, cached_content):
+                raise
+            # Expired or deleted early: send the prefix inline this time
+            prompt_prefix_cache.invalidate(key)
+            return self._stream(
+                model, prefix + prompt, self._config(json_output, timeout)
+            )
+
+    async def agenerate(
+        self,
+        model: str,
+        prompt: str,
+        json_output: bool,
+        timeout: float,
+        prefix: str = "",
+    ) -> dict:
+        key = self._prefix_key(model, prefix)
+        cached_content = await self._acached_prefix(key, model, prefix)
+        try:
+            return await self._astream(
+                model,
+                prompt if cached_content else prefix + prompt,
+                self._config(json_output, timeout, cached_content),
+            )
+        except errors.ClientError as e:
+            if not self._cache_dropped(e, cached_content):
+                raise
+            prompt_prefix_cache.invalidate(key)
+            return await self._astream(
+                model, prefix + prompt, self._config(json_output, timeout)
+            )
+
+    def _stream(
+        self, model: str, contents: str, config: types.GenerateContentConfig
+    ) -> dict:
+        """Make one streamed request, noting when the first chunk arrived"""
+        started = time.perf_counter()
+        first_chunk = None
+        chunks = []
+        # Looked up per call so that forked workers get their own client
+        for chunk in get_gemini_client().models.generate_content_stream(
+            model=model, contents=contents, config=config
+        ):
+            first_chunk = first_chunk or time.perf_counter()
+            chunks.append(chunk)
+        return self._join_chunks(chunks, started, first_chunk)
+
+    async def _astream(
+        self, model: str, contents: str, config: types.GenerateContentConfig
+    ) -> dict:
+        started = time.perf_counter()
+        first_chunk = None
+        chunks = []
+        async for chunk in await get_gemini_client().aio.models.generate_content_stream(
+            model=model, contents=contents, config=config
+        ):
+            first_chunk = first_chunk or time.perf_counter()
+            chunks.append(chunk)
+        return self._join_chunks(chunks, started, first_chunk)
+
+    @staticmethod
+    def _join_chunks(chunks: list, started: float, first_chunk: float | None) -> dict:
+        """Response text, time to first byte and token counts of a streamed response"""
+        # Token counts arrive with the last chunks
+        metadata = next(
+            (
+                chunk.usage_metadata
+                for chunk in reversed(chunks)
+                if chunk.usage_metadata
+            ),
+            None,
+        )
+        return {
+            "text": "".join(chunk.text or "" for chunk in chunks),
+            "ttfb_ms": int((first_chunk - started) * 1000) if first_chunk else None,
+            "input_tokens": (metadata and metadata.prompt_token_count) or 0,
+            "output_tokens": (metadata and metadata.candidates_token_count) or 0,
+            "cached_tokens": (metadata and metadata.cached_content_token_count) or 0,
+        }
+
+
+class OfflineBackend(LLMBackend):
+    """
+    Deterministic local stand-in for Gemini, for benchmarks and CI
+
+    Answers are built from the reply in the prompt with the rule-based local
+    extractor, so the same prompt always gets the same schema-valid JSON.
+    Latency is sampled from a parse_latency spec, and failure_rate of the
+    attempts fail with a retryable 503, both from a generator seeded with
+    seed. Each attempt also takes prefill_ms per 1,000 prompt tokens not
+    served from the local prompt prefix cache. Results are cached and recorded under "offline/<model>" and the
+    backend has its own circuit breaker, so it never mixes with Gemini's.
+    """
+
+    name = "offline"
+
+    def __init__(
+        self,
+        latency: str | None = None,
+        failure_rate: float | None = None,
+        seed: int | None = None,
+        prefill_ms: float | None = None,
+    ):
+        self._rng = random.Random(settings.LLM_OFFLINE_SEED if seed is None else seed)
+        self._lock = threading.Lock()
+        self._latency = parse_latency(
+            latency or settings.LLM_OFFLINE_LATENCY, self._rng
+        )
+        self.failure_rate = (
+            settings.LLM_OFFLINE_FAILURE_RATE if failure_rate is None else failure_rate
+        )
+        self.prefill_ms = (
+            settings.LLM_OFFLINE_PREFILL_MS if prefill_ms is None else prefill_ms
+        )
+        self.caller = ResilientCaller(
+            CircuitBreaker(
+                "offline",
+                failure_rate=settings.GEMINI_BREAKER_FAILURE_RATE,
+                min_calls=settings.GEMINI_BREAKER_MIN_CALLS,
+                window=settings.GEMINI_BREAKER_WINDOW,
+                reset_timeout=settings.GEMINI_BREAKER_RESET,
+            )
+        )
+
+    def model_name(self, model: str) -> str:
+        return f"{self.name}/{model}"
+
+    def _prompt(self, model: str, prompt: str, prefix: str) -> tuple[str, int]:
+        """
+        Full prompt and the number of its tokens served from the local prefix cache
+        """
+        if not prefix or not settings.GEMINI_PROMPT_CACHE_ENABLED:
+            return prefix + prompt, 0
+        key = prompt_prefix_cache.make_key(self.name, model, prefix)
+        found, _handle = prompt_prefix_cache.get(key)
+        if not found:
+            prompt_prefix_cache.set(key, True, settings.GEMINI_PROMPT_CACHE_TTL)
+        return prefix + prompt, estimate_tokens(prefix) if found else 0
+
+    def _plan(self, timeout: float, uncached_tokens: int) -> tuple[float, bool]:
+        """Latency of the next attempt and whether it fails"""
+        with self._lock:
+            latency = self._latency()
+            fails = self._rng.random() < self.failure_rate
+        # Processing the uncached part of the prompt before the first token
+        latency += uncached_tokens / 1000 * self.prefill_ms / 1000
+        return min(latency, timeout), fails or latency > timeout
+
+    def _result(
+        self,
+        prompt: str,
+        latency: float,
+        failed: bool,
+        timeout: float,
+        cached_tokens: int,
+    ) -> dict:
+        if failed and latency >= timeout:
+            raise httpx.ReadTimeout("Offline backend timed out")
+        if failed:
+            raise errors.ServerError(
+                503,
+                {
+                    "error": {
+                        "code": 503,
+                        "message": "Injected failure",
+                        "status": "UNAVAILABLE",
+                    }
+                },
+            )
+        text = self.respond(prompt)
+        return {
+            "text": text,
+            "ttfb_ms": int(latency * 1000),
+            "input_tokens": estimate_tokens(prompt),
+            "output_tokens": estimate_tokens(text),
+            "cached_tokens": cached_tokens,
+        }
+
+    def generate(
+        self,
+        model: str,
+        prompt: str,
+        json_output: bool,
+        timeout: float,
+        prefix: str = "",
+    ) -> dict:
+        prompt, cached_tokens = self._prompt(model, prompt, prefix)
+        latency, failed = self._plan(timeout, estimate_tokens(prompt) - cached_tokens)
+        time.sleep(latency)
+        return self._result(prompt, latency, failed, timeout, cached_tokens)
+
+    async def agenerate(
+        self,
+        model: str,
+        prompt: str,
+        json_output: bool,
+        timeout: float,
+        prefix: str = "",
+    ) -> dict:
+        prompt, cached_tokens = self._prompt(model, prompt, prefix)
+        latency, failed = self._plan(timeout, estimate_tokens(prompt) - cached_tokens)
+        await asyncio.sleep(latency)
+        return self._result(prompt, latency, failed, timeout, cached_tokens)
+
+    @staticmethod
+    def analyze(content: str) -> dict:
+        """Analysis result for a reply, in the format the analysis prompt asks for"""
+        extraction = local_extractor.extract(content)
+        return {
+            "category": local_extractor.categorize(extraction),
+            "confidence": int(extraction["confidence"] * 100),
+            "extracted_data": extraction["extracted_data"],
+            "reasoning": "Offline backend: extracted from the numbered answers",
+        }
+
+    @staticmethod
+    def follow_up(hoa_name: str, category: str) -> dict:
+        """Follow-up email in the format the response prompt asks for"""
+        if category == "complete_response":
+            message = "Thank you for providing all of the requested information."
+        elif category == "no_property_management":
+            message = "Thank you for letting us know; we will update our records."
+        else:
+            message = (
+                "Thank you for your reply. Could you please send the remaining details?"
+            )
+        return {
+            "subject": f"Re: Property Management Information Request - {hoa_name}",
+            "body": f"<p>Dear {hoa_name} team,</p><p>{message}</p><p>Best regards</p>",
+            "reasoning": f"Offline backend: template reply for {category}",
+        }
+
+    def respond(self, prompt: str) -> str:
+        """Deterministic JSON response to one of the analyzer's prompts"""
+        email_block = EMAIL_BLOCK_RE.search(prompt)
+        content = email_block.group(1) if email_block else ""
+        hoa_name = HOA_NAME_RE.search(prompt)
+        hoa_name = hoa_name.group(1).strip() if hoa_name else "HOA"
+
+        if "Original HOA Response:" in prompt:
+            category = CATEGORY_RE.search(prompt)
+            return json.dumps(
+                self.follow_up(hoa_name, category.group(1).strip() if category else "")
+            )
+        analysis = self.analyze(content)
+        if '"follow_up"' in prompt:
+            analysis["follow_up"] = self.follow_up(hoa_name, analysis["category"])
+        return json.dumps(analysis)
+
+
+LLM_BACKENDS = {
+    GeminiBackend.name: GeminiBackend,
+    OfflineBackend.name: OfflineBackend,
+}
+
+
+@functools.cache
+def get_llm_backend(name: str | None = None) -> LLMBackend:
+    """
+    Return the shared backend of the given name (defaults to LLM_BACKEND)
+
+    Raises:
+        ValueError: If the backend is unknown or not configured
+    """
+    name = name or settings.LLM_BACKEND
+    if name not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {name}")
+    return LLM_BACKENDS[name]()
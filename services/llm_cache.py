@@ -0,0 +1,208 @@
+import contextlib
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Any
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from hoa_management.models import LLMCacheEntry
+from services.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_content(content: str) -> str:
+    """Collapse whitespace so formatting-only differences share a cache key"""
+    return " ".join((content or "").split())
+
+
+class LLMResultCache:
+    """
+    Two-tier cache of parsed Gemini results
+
+    Lookups go to a per-process LRU first and then to the LLMCacheEntry
+    table, which is shared by every worker. Entries expire after ttl seconds
+    and the table is trimmed to max_entries least recently used rows.
+    Because the prompt version and model are part of the key, bumping either
+    stops old entries from being served; they are pruned on the next sweep.
+    """
+
+    # Writes between expiry and size sweeps of the database tier
+    PRUNE_EVERY = 100
+
+    def __init__(
+        self,
+        ttl: int | None = None,
+        max_entries: int | None = None,
+        memory_size: int | None = None,
+    ):
+        self.ttl = ttl or settings.LLM_CACHE_TTL
+        self.max_entries = max_entries or settings.LLM_CACHE_MAX_ENTRIES
+        self.memory = LRUCache(maxsize=memory_size or settings.LLM_CACHE_MEMORY_SIZE)
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        kind: str,
+        content: str,
+        hoa_context: dict,
+        prompt_version: str,
+        model: str,
+        extra: Any = None,
+    ) -> str:
+        """
+        Hash the inputs that determine a Gemini result
+
+        Args:
+            kind: Which call is cached (analysis, response or combined)
+            content: Email content; whitespace is normalized
+            hoa_context: HOA fields interpolated into the prompt
+            prompt_version: Version of the prompt templates
+            model: Gemini model name
+            extra: Any further prompt input, e.g. the analysis a response is based on
+
+        Returns:
+            Hex SHA-256 digest
+        """
+        parts = [
+            kind,
+            normalize_content(content),
+            hoa_context,
+            prompt_version,
+            model,
+            extra,
+        ]
+        encoded = json.dumps(parts, sort_keys=True, default=str).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    def get(self, key: str) -> Any:
+        """
+        Return a cached result or None
+
+        Args:
+            key: Key from make_key
+
+        Returns:
+            A copy of the cached result, or None on a miss
+        """
+        cached = self.memory.get(key)
+        if cached is not None:
+            expires_at, result = cached
+            if expires_at > time.time():
+                with self._lock:
+                    self.memory_hits += 1
+                return copy.deepcopy(result)
+            self.memory.pop(key)
+
+        now = timezone.now()
+        entry = (
+            LLMCacheEntry.objects.filter(key=key, expires_at__gt=now)
+            .only("result", "expires_at")
+            .first()
+        )
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        LLMCacheEntry.objects.filter(pk=entry.pk).update(
+            hit_count=F("hit_count") + 1, last_used_at=now
+        )
+        self.memory.set(key, (entry.expires_at.timestamp(), entry.result))
+        with self._lock:
+            self.db_hits += 1
+        return copy.deepcopy(entry.result)
+
+    def set(
+        self, key: str, kind: str, prompt_version: str, model: str, result: Any
+    ) -> None:
+        """
+        Store a result in both tiers
+
+        Args:
+            key: Key from make_key
+            kind: Which call is cached
+            prompt_version: Version of the prompt templates
+            model: Gemini model name
+            result: JSON-serializable parsed result
+        """
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=self.ttl)
+        defaults = {
+            "kind": kind,
+            "prompt_version": prompt_version,
+            "model": model,
+            "result": result,
+            "last_used_at": now,
+            "expires_at": expires_at,
+        }
+        # Another worker may store the same result concurrently
+        with contextlib.suppress(IntegrityError):
+            LLMCacheEntry.objects.update_or_create(key=key, defaults=defaults)
+        self.memory.set(key, (expires_at.timestamp(), copy.deepcopy(result)))
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self) -> int:
+        """
+        Delete expired entries and trim the table to max_entries
+
+        Returns:
+            Number of entries deleted
+        """
+        deleted, _ = LLMCacheEntry.objects.filter(
+            expires_at__lte=timezone.now()
+        ).delete()
+
+        # Everything used no later than the first entry past the limit goes
+        overflow = list(
+            LLMCacheEntry.objects.order_by("-last_used_at").values_list(
+                "last_used_at", flat=True
+            )[self.max_entries : self.max_entries + 1]
+        )
+        if overflow:
+            trimmed, _ = LLMCacheEntry.objects.filter(
+                last_used_at__lte=overflow[0]
+            ).delete()
+            deleted += trimmed
+
+        if deleted:
+            logger.info(f"Pruned {deleted} LLM cache entries")
+        return deleted
+
+    def clear(self) -> None:
+        """Drop every entry from both tiers"""
+        self.memory.clear()
+        LLMCacheEntry.objects.all().delete()
+
+    def stats(self) -> dict[str, int | float]:
+        """Return per-tier hit counts and the overall hit rate of this process"""
+        hits = self.memory_hits + self.db_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_size": len(self.memory),
+            "db_entries": LLMCacheEntry.objects.count(),
+        }
+
+
+llm_result_cache = LLMResultCache()
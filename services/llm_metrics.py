@@ -0,0 +1,83 @@
+from django.db.models import Avg, Count, Q, QuerySet, Sum
+
+from hoa_management.models import LLMCall
+from services.latency import percentiles
+
+TOKEN_TOTALS = {
+    "input_tokens": Sum("input_tokens"),
+    "output_tokens": Sum("output_tokens"),
+    "cached_tokens": Sum("cached_tokens"),
+}
+
+
+def _percentiles_ms(calls: QuerySet, field: str) -> dict[str, float]:
+    values = calls.filter(**{f"{field}__isnull": False}).order_by(field)
+    return percentiles([ms / 1000 for ms in values.values_list(field, flat=True)])
+
+
+def summarize_calls(calls: QuerySet | None = None) -> dict:
+    """
+    Aggregate latency and token usage of recorded Gemini calls
+
+    Args:
+        calls: LLMCall queryset to summarize (defaults to every call)
+
+    Returns:
+        Dictionary with call and token totals, the share of input tokens
+        served from the prompt cache, p50/p95/p99 wall time and time to first
+        byte of successful calls, per-kind and model rows with their p95 wall
+        time, escalation rate and average wall time with and without cached
+        tokens, and per-category rows
+    """
+    calls = LLMCall.objects.all() if calls is None else calls
+    totals = calls.aggregate(
+        calls=Count("id"), failures=Count("id", filter=Q(success=False)), **TOKEN_TOTALS
+    )
+    successful = calls.filter(success=True)
+    by_kind = list(
+        calls.values("kind", "model", "tier")
+        .annotate(
+            calls=Count("id"),
+            failures=Count("id", filter=Q(success=False)),
+            escalations=Count("id", filter=Q(escalated=True)),
+            cached_calls=Count("id", filter=Q(cached_tokens__gt=0)),
+            avg_wall_ms=Avg("wall_ms"),
+            # The latency delta of serving the prompt prefix from the cache
+            avg_wall_cached_ms=Avg(
+                "wall_ms", filter=Q(success=True, cached_tokens__gt=0)
+            ),
+            avg_wall_uncached_ms=Avg(
+                "wall_ms", filter=Q(success=True, cached_tokens=0)
+            ),
+            **TOKEN_TOTALS,
+        )
+        .order_by("kind", "tier", "model")
+    )
+    for row in by_kind:
+        route = successful.filter(
+            kind=row["kind"], model=row["model"], tier=row["tier"]
+        )
+        row["p95_wall_ms"] = _percentiles_ms(route, "wall_ms").get("p95", 0)
+        row["escalation_rate"] = row["escalations"] / row["calls"]
+        row["cached_ratio"] = (row["cached_tokens"] or 0) / (row["input_tokens"] or 1)
+    # Category the email response was finally given
+    by_category = (
+        successful.values("email_response__ai_analysis_result__category")
+        .annotate(calls=Count("id"), avg_input=Avg("input_tokens"), **TOKEN_TOTALS)
+        .order_by("email_response__ai_analysis_result__category")
+    )
+    return {
+        **{key: value or 0 for key, value in totals.items()},
+        "cached_ratio": (totals["cached_tokens"] or 0) / (totals["input_tokens"] or 1),
+        "wall_ms": _percentiles_ms(successful, "wall_ms"),
+        "ttfb_ms": _percentiles_ms(successful, "ttfb_ms"),
+        "by_kind": by_kind,
+        "by_category": [
+            {
+                "category": row.pop("email_response__ai_analysis_result__category")
+                or "unknown",
+                **row,
+            }
+            for row in by_category
+        ],
+    }
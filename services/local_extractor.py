@@ -0,0 +1,336 @@
+import re
+
+from django.conf import settings
+
+from services.email_normalizer import strip_quoted_history
+
+# Fields of extracted_data answered by each numbered onboarding question
+QUESTION_FIELDS = {
+    1: "manages_properties",
+    2: "regular_dues_amount",
+    3: "payment_method",
+    4: "payment_address",
+    5: "master_hoa_name",
+    6: "phone_number",
+    7: "management_company",
+}
+
+# Fields that must be answered for a reply to count as complete, matching
+# GeminiEmailAnalyzer._calculate_completeness_score
+REQUIRED_FIELDS = [
+    "manages_properties",
+    "regular_dues_amount",
+    "payment_method",
+    "payment_address",
+    "phone_number",
+]
+
+NUMBERED_LINE_RE = re.compile(r"^\s*(?:Q\s*)?([1-7])\s*[.):-]\s*", re.MULTILINE)
+# "Regular Dues Amount:" style labels echoed from the onboarding email
+LABEL_RE = re.compile(r"^[A-Za-z][A-Za-z /]{2,40}:\s*")
+DOLLAR_RE = re.compile(r"\$\s?\d[\d,]*(?:\.\d{2})?")
+PHONE_RE = re.compile(r"(?:\+?1[\s.-]?)?\(?\b\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}\b")
+STATE_ZIP_RE = re.compile(r"\b[A-Z]{2}\s+\d{5}(?:-\d{4})?\b")
+STREET_RE = re.compile(
+    r"\b\d+\s+[A-Za-z0-9 .]+|\bP\.?\s?O\.?\s+Box\s+\d+", re.IGNORECASE
+)
+
+PERIODS = [
+    ("monthly", ("month", "monthly", "/mo")),
+    ("quarterly", ("quarter", "quarterly")),
+    ("annually", ("annual", "annually", "year", "yearly")),
+]
+PAYMENT_METHODS = [
+    ("ACH transfer", r"\bACH\b|bank transfer|direct deposit"),
+    ("Wire transfer", r"\bwire"),
+    ("Check", r"\bchecks?\b|\bcheques?\b"),
+    ("Online payment", r"\bonline\b|\bportal\b|\bwebsite\b"),
+    ("Credit card", r"credit card|debit card"),
+    ("Zelle", r"\bzelle\b"),
+]
+NEGATIVE_RE = re.compile(
+    r"^(?:no\b|none\b|n/a\b|not applicable)|\bno master\b|\bthere is no\b|"
+    r"\bdo(?:es)? not have\b|\bdon't have\b",
+    re.IGNORECASE,
+)
+SELF_MANAGED_RE = re.compile(
+    r"self[- ]managed|no management company|manage (?:it|ourselves)", re.IGNORECASE
+)
+MANAGES_YES_RE = re.compile(
+    r"^(?:yes|correct|confirmed)\b|\bwe (?:currently |do )?manage all\b", re.IGNORECASE
+)
+MANAGES_NO_RE = re.compile(
+    r"^no\b|\bdo(?:es)? not manage\b|\bdon't manage\b|\bnot manage any\b",
+    re.IGNORECASE,
+)
+# Qualified yeses ("yes but we stopped managing 12 Oak St") name exceptions
+MANAGES_PARTIAL_RE = re.compile(
+    r"\bnot all\b|\bsome of\b|\bexcept\b|\bno longer\b|\bremove|\bbut\b|"
+    r"\bhowever\b|\bstopped\b|\bsold\b|\bother than\b|\bexcluding\b",
+    re.IGNORECASE,
+)
+NAME_PREFIX_RE = re.compile(
+    r"^(?:yes,?\s*)?(?:(?:it is|it's|the master hoa is|we are (?:managed|overseen) by|"
+    r"managed by|our management company is|overseen by)\s+)",
+    re.IGNORECASE,
+)
+
+
+def segment_answers(text: str) -> dict[int, str]:
+    """
+    Split a reply into the answers to the numbered onboarding questions
+
+    Returns:
+        Mapping of question number to answer text, without number or label
+    """
+    matches = list(NUMBERED_LINE_RE.finditer(text))
+    answers = {}
+    for index, match in enumerate(matches):
+        number = int(match.group(1))
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        answer = text[match.end() : end]
+        # The last answer runs into the sign-off; keep its first paragraph
+        if index + 1 == len(matches):
+            answer = answer.split("\n\n")[0]
+        answer = LABEL_RE.sub("", answer.strip(), count=1).strip()
+        if number not in answers and answer:
+            answers[number] = answer
+    return answers
+
+
+def extract_manages_properties(answer: str) -> tuple[bool | None, float]:
+    if MANAGES_PARTIAL_RE.search(answer):
+        # Partial management needs the model to work out which properties
+        return None, 0.0
+    if MANAGES_NO_RE.search(answer):
+        return False, 0.9
+    if MANAGES_YES_RE.search(answer):
+        return True, 0.95
+    return None, 0.3
+
+
+def extract_dues(answer: str) -> tuple[str | None, float]:
+    amounts = DOLLAR_RE.findall(answer)
+    if not amounts:
+        return None, 0.2
+    lowered = answer.lower()
+    parts = [amounts[0].replace(" ", "")]
+    if "per unit" in lowered:
+        parts.append("per unit")
+    period = next(
+        (name for name, words in PERIODS if any(word in lowered for word in words)),
+        None,
+    )
+    if period:
+        parts.append(period)
+    if len(set(amounts)) > 1:
+        # Several amounts (e.g. dues plus an assessment) are ambiguous
+        return " ".join(parts), 0.5
+    return " ".join(parts), 0.95 if period else 0.75
+
+
+def extract_payment_method(answer: str) -> tuple[str | None, float]:
+    methods = [
+        name for name, pattern in PAYMENT_METHODS if re.search(pattern, answer, re.I)
+    ]
+    if not methods:
+        return None, 0.2
+    if len(methods) > 1:
+        return ", ".join(methods), 0.6
+    return methods[0], 0.9
+
+
+def extract_address(answer: str) -> tuple[str | None, float]:
+    lines = [line.strip(" ,") for line in answer.splitlines() if line.strip()]
+    # Drop a lead-in such as "Please send all correspondence to:"
+    if len(lines) > 1 and lines[0].endswith(":"):
+        lines = lines[1:]
+    address = ", ".join(lines)
+    if not address:
+        return None, 0.0
+    if STATE_ZIP_RE.search(address) and STREET_RE.search(address):
+        return address, 0.9
+    return address, 0.4
+
+
+def extract_phone(answer: str) -> tuple[str | None, float]:
+    phones = {match.group(0).strip() for match in PHONE_RE.finditer(answer)}
+    if not phones:
+        return None, 0.2
+    if len(phones) > 1:
+        return sorted(phones)[0], 0.5
+    return phones.pop(), 0.95
+
+
+def extract_name(answer: str, none_pattern: re.Pattern) -> tuple[str | None, float]:
+    """Extract an organisation name, or None when the answer says there is none"""
+    if none_pattern.search(answer):
+        return None, 0.9
+    name = NAME_PREFIX_RE.sub("", answer.splitlines()[0]).strip(" .")
+    if not name or len(name) > 100:
+        return None, 0.2
+    # A bare name is trusted, a sentence around it is left to the model
+    return name, 0.85 if len(name.split()) <= 6 else 0.6
+
+
+class LocalExtractor:
+    """
+    Rule-based extraction of the onboarding answers from well-structured replies
+
+    Replies that answer the numbered questions line by line are segmented by
+    number, and each answer is run through a field-specific regex with a
+    confidence between 0 and 1. A reply's confidence is the lowest field
+    confidence, so a single unclear answer sends it to Gemini.
+    """
+
+    def __init__(self, min_confidence: float | None = None):
+        self.min_confidence = (
+            settings.LOCAL_EXTRACTOR_MIN_CONFIDENCE
+            if min_confidence is None
+            else min_confidence
+        )
+
+    def extract(self, text: str) -> dict:
+        """
+        Extract the onboarding answers from a reply
+
+        Args:
+            text: Plain-text email content
+
+        Returns:
+            Dictionary with extracted_data, per-field confidence and the
+            overall confidence
+        """
+        reply = strip_quoted_history(text or "")
+        answers = segment_answers(reply)
+        extracted_data = dict.fromkeys(QUESTION_FIELDS.values())
+        extracted_data["properties_confirmation"] = None
+        confidence = {}
+
+        for number, field in QUESTION_FIELDS.items():
+            answer = answers.get(number)
+            if answer is None:
+                confidence[field] = 0.0
+                continue
+            if field == "manages_properties":
+                value, confidence[field] = extract_manages_properties(answer)
+                extracted_data["properties_confirmation"] = answer
+            elif field == "regular_dues_amount":
+                value, confidence[field] = extract_dues(answer)
+            elif field == "payment_method":
+                value, confidence[field] = extract_payment_method(answer)
+            elif field == "payment_address":
+                value, confidence[field] = extract_address(answer)
+            elif field == "phone_number":
+                value, confidence[field] = extract_phone(answer)
+            elif field == "master_hoa_name":
+                value, confidence[field] = extract_name(answer, NEGATIVE_RE)
+            else:
+                value, confidence[field] = extract_name(answer, SELF_MANAGED_RE)
+                if value is None and confidence[field] >= 0.9:
+                    value = "Self-managed"
+            extracted_data[field] = value
+
+        overall = min(confidence.values())
+        # Questions back to us need a tailored answer from the model
+        if "?" in reply:
+            overall = min(overall, 0.5)
+        if extracted_data["manages_properties"] is False:
+            # Nothing else needs answering when they manage none of the properties
+            overall = confidence["manages_properties"]
+
+        return {
+            "extracted_data": extracted_data,
+            "field_confidence": confidence,
+            "confidence": overall,
+        }
+
+    def is_confident(self, extraction: dict) -> bool:
+        return extraction["confidence"] >= self.min_confidence
+
+    @staticmethod
+    def categorize(extraction: dict) -> str:
+        """Category a confident extraction corresponds to"""
+        extracted_data = extraction["extracted_data"]
+        if extracted_data["manages_properties"] is False:
+            return "no_property_management"
+        if all(extracted_data.get(field) is not None for field in REQUIRED_FIELDS):
+            return "complete_response"
+        return "incomplete_response"
+
+    def compare(self, extraction: dict, model_data: dict) -> dict:
+        """
+        Record which confident local fields Gemini agreed with
+
+        Args:
+            extraction: Result of extract
+            model_data: extracted_data returned by Gemini
+
+        Returns:
+            Summary stored under analysis_result["local_extraction"]
+        """
+        agreement = {
+            field: fields_agree(
+                field, extraction["extracted_data"][field], model_data.get(field)
+            )
+            for field, confidence in extraction["field_confidence"].items()
+            if confidence >= self.min_confidence
+        }
+        return {"confidence": extraction["confidence"], "agreement": agreement}
+
+    def analysis_result(self, extraction: dict) -> dict:
+        """Build an analysis result in the same shape Gemini returns"""
+        return {
+            "category": self.categorize(extraction),
+            "confidence": int(extraction["confidence"] * 100),
+            "extracted_data": extraction["extracted_data"],
+            "reasoning": "Extracted locally from the numbered answers in the reply",
+            "source": "local",
+            "field_confidence": extraction["field_confidence"],
+        }
+
+
+def _digits(value) -> str:
+    return re.sub(r"\D", "", str(value or ""))
+
+
+def _words(value) -> str:
+    return re.sub(r"[^a-z0-9]", "", str(value or "").lower())
+
+
+def fields_agree(field: str, local_value, model_value) -> bool:
+    """
+    Compare a locally extracted value with Gemini's, ignoring formatting
+
+    Args:
+        field: extracted_data key
+        local_value: Value from LocalExtractor
+        model_value: Value from Gemini
+
+    Returns:
+        True if both describe the same answer
+    """
+    if model_value in ("", "null"):
+        model_value = None
+    if local_value is None or model_value is None:
+        return local_value is None and model_value is None
+    if field == "manages_properties":
+        return bool(local_value) == bool(model_value)
+    if field == "phone_number":
+        return _digits(local_value)[-10:] == _digits(model_value)[-10:]
+    if field == "regular_dues_amount":
+        local_amount = DOLLAR_RE.search(str(local_value))
+        model_amount = DOLLAR_RE.search(str(model_value))
+        return bool(local_amount and model_amount) and _digits(
+            local_amount.group(0)
+        ) == _digits(model_amount.group(0))
+    if field == "payment_address":
+        local_zip = STATE_ZIP_RE.search(str(local_value))
+        model_zip = STATE_ZIP_RE.search(str(model_value))
+        if local_zip and model_zip:
+            return _words(local_zip.group(0)) == _words(model_zip.group(0))
+    local_words, model_words = _words(local_value), _words(model_value)
+    return local_words in model_words or model_words in local_words
+
+
+local_extractor = LocalExtractor()
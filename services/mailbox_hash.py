@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+KEY_SALT = "services.mailbox_hash"
+
+
+def _signature(outbound_email_id: int) -> str:
+    return salted_hmac(KEY_SALT, str(outbound_email_id)).hexdigest()[:12]
+
+
+def make_mailbox_hash(outbound_email_id: int) -> str:
+    """
+    Build the signed mailbox hash identifying an outbound email
+
+    The signature stops senders from routing mail to an arbitrary HOA by
+    guessing ids.
+    """
+    return f"{outbound_email_id}-{_signature(outbound_email_id)}"
+
+
+def parse_mailbox_hash(mailbox_hash: str | None) -> int | None:
+    """Return the outbound email id in a mailbox hash, or None if it is invalid"""
+    outbound_email_id, _, signature = (mailbox_hash or "").partition("-")
+    if not outbound_email_id.isdigit():
+        return None
+    if not constant_time_compare(signature, _signature(int(outbound_email_id))):
+        return None
+    return int(outbound_email_id)
+
+
+def reply_to_address(outbound_email_id: int) -> str:
+    """Return the plus-addressed inbound address for an outbound email"""
+    local_part, _, domain = settings.POSTMARK_INBOUND_EMAIL.partition("@")
+    return f"{local_part}+{make_mailbox_hash(outbound_email_id)}@{domain}"
@@ -0,0 +1,279 @@
+import copy
+import hashlib
+import random
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from hoa_management.models import EmailResponse, NearDuplicateBand
+from services.local_extractor import QUESTION_FIELDS, local_extractor, segment_answers
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Words per shingle
+SHINGLE_SIZE = 3
+# Candidates checked against the full signature per lookup
+MAX_CANDIDATES = 50
+
+_PRIME = (1 << 61) - 1
+# Fixed seed: signatures must match across processes and deploys
+_rng = random.Random(20240601)
+PERMUTATIONS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)
+]
+WORD_RE = re.compile(r"[a-z0-9$@.]+")
+HOA_PLACEHOLDER = "{hoa}"
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest())
+
+
+def mask_hoa_name(text: str, hoa_name: str) -> str:
+    """Replace the HOA's name so that replies differing only in it match"""
+    if not hoa_name:
+        return text
+    return re.sub(re.escape(hoa_name), HOA_PLACEHOLDER, text, flags=re.IGNORECASE)
+
+
+def shingles(text: str) -> set[int]:
+    """Hashes of the overlapping SHINGLE_SIZE-word sequences of a text"""
+    words = WORD_RE.findall(text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {_hash64(" ".join(words))}
+    return {
+        _hash64(" ".join(words[i : i + SHINGLE_SIZE]))
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def minhash(text: str) -> list[int]:
+    """MinHash signature of a text's shingles, NUM_PERM values long"""
+    hashes = shingles(text)
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in PERMUTATIONS]
+
+
+def similarity(signature: list[int], other: list[int]) -> float:
+    """Estimated Jaccard similarity of the texts two signatures were made from"""
+    return sum(x == y for x, y in zip(signature, other, strict=True)) / NUM_PERM
+
+
+def band_buckets(signature: list[int]) -> list[int]:
+    """LSH bucket of each band of a signature, as signed 64-bit integers"""
+    return [
+        int.from_bytes(
+            hashlib.blake2b(
+                repr(signature[band * ROWS : (band + 1) * ROWS]).encode(),
+                digest_size=8,
+            ).digest(),
+            signed=True,
+        )
+        for band in range(BANDS)
+    ]
+
+
+def outside_answers(text: str, answers: dict[int, str]) -> str:
+    """The words of a reply that are not part of its numbered answers"""
+    for answer in answers.values():
+        text = text.replace(answer, " ", 1)
+    return " ".join(WORD_RE.findall(text.lower()))
+
+
+class NearDuplicateIndex:
+    """
+    Finds earlier analyzed replies that are near-duplicates of a new one
+
+    Management companies answer for many HOAs with the same template, so
+    their replies differ only in the HOA name and a few answers. Signatures
+    of the normalized text with the HOA name masked are split into BANDS
+    bands of ROWS rows; replies sharing any band bucket are candidates, and
+    the most similar candidate above the threshold is reused.
+    """
+
+    def __init__(self, threshold: float | None = None):
+        self.threshold = (
+            settings.NEAR_DUPLICATE_THRESHOLD if threshold is None else threshold
+        )
+
+    @staticmethod
+    def index(email_response: EmailResponse, content: str) -> list[int]:
+        """
+        Store the signature and LSH bands of a saved email response
+
+        Returns:
+            The signature
+        """
+        signature = minhash(mask_hoa_name(content, email_response.hoa.name))
+        email_response.minhash_signature = signature
+        with transaction.atomic():
+            EmailResponse.objects.filter(pk=email_response.pk).update(
+                minhash_signature=signature
+            )
+            NearDuplicateBand.objects.filter(email_response=email_response).delete()
+            NearDuplicateBand.objects.bulk_create(
+                NearDuplicateBand(
+                    email_response=email_response, band=band, bucket=bucket
+                )
+                for band, bucket in enumerate(band_buckets(signature))
+            )
+        return signature
+
+    def split_batch(
+        self, email_responses: list[EmailResponse], contents: list[str]
+    ) -> tuple[list[EmailResponse], list[EmailResponse]]:
+        """
+        Separate responses that are near-duplicates of an earlier one in the list
+
+        Args:
+            email_responses: Responses about to be analyzed together
+            contents: Their normalized contents
+
+        Returns:
+            Tuple of (responses to analyze first, near-duplicates of them)
+        """
+        first, held_back, signatures = [], [], []
+        for email_response, content in zip(email_responses, contents, strict=True):
+            signature = minhash(mask_hoa_name(content, email_response.hoa.name))
+            if any(
+                similarity(signature, other) >= self.threshold for other in signatures
+            ):
+                held_back.append(email_response)
+            else:
+                first.append(email_response)
+                signatures.append(signature)
+        return first, held_back
+
+    def find(
+        self, email_response: EmailResponse, content: str
+    ) -> tuple[EmailResponse, float] | None:
+        """
+        Index a reply and find the most similar earlier analyzed reply
+
+        Args:
+            email_response: Saved EmailResponse with its HOA
+            content: Its normalized content
+
+        Returns:
+            Tuple of (near-duplicate, estimated similarity), or None
+        """
+        signature = self.index(email_response, content)
+        in_a_bucket = Q()
+        for band, bucket in enumerate(band_buckets(signature)):
+            in_a_bucket |= Q(band=band, bucket=bucket)
+        candidate_ids = (
+            NearDuplicateBand.objects.filter(in_a_bucket)
+            .exclude(email_response=email_response)
+            .values_list("email_response_id", flat=True)
+            .distinct()
+        )
+        candidates = (
+            EmailResponse.objects.filter(
+                id__in=candidate_ids,
+                ai_analysis_result__isnull=False,
+                minhash_signature__isnull=False,
+            )
+            .exclude(ai_analysis_result__category="error")
+            .select_related("hoa")
+            .order_by("-ai_processed_at")[:MAX_CANDIDATES]
+        )
+
+        best = None
+        for candidate in candidates:
+            score = similarity(signature, candidate.minhash_signature)
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (candidate, score)
+        return best
+
+    def adapt(
+        self, email_response: EmailResponse, content: str
+    ) -> tuple[dict, tuple[str, str, str] | None] | None:
+        """
+        Reuse the analysis of a near-duplicate reply
+
+        Answers that differ from the near-duplicate's are extracted again with
+        the local extractor; when one of them cannot be extracted confidently,
+        or the replies also differ outside their numbered answers, the reply
+        is left to the model.
+
+        Args:
+            email_response: Saved EmailResponse with its HOA
+            content: Its normalized content
+
+        Returns:
+            Tuple of (analysis result, follow-up to reuse or None when it must
+            be generated), or None when there is no usable near-duplicate
+        """
+        match = self.find(email_response, content)
+        if match is None:
+            return None
+        source, score = match
+        source_content = mask_hoa_name(
+            source.normalized_content or source.text_content or "", source.hoa.name
+        )
+        masked = mask_hoa_name(content, email_response.hoa.name)
+
+        changed = []
+        if masked != source_content:
+            source_answers = segment_answers(source_content)
+            answers = segment_answers(masked)
+            # Without numbered answers the differences cannot be located
+            if not source_answers or not answers:
+                return None
+            # Text outside the answers (a P.S., a question) needs the model
+            if outside_answers(masked, answers) != outside_answers(
+                source_content, source_answers
+            ):
+                return None
+            changed = [
+                field
+                for number, field in QUESTION_FIELDS.items()
+                if answers.get(number) != source_answers.get(number)
+            ]
+
+        analysis_result = copy.deepcopy(source.ai_analysis_result)
+        analysis_result.pop("local_extraction", None)
+        extracted_data = analysis_result.setdefault("extracted_data", {})
+        if changed:
+            extraction = local_extractor.extract(content)
+            for field in changed:
+                if (
+                    extraction["field_confidence"][field]
+                    < local_extractor.min_confidence
+                ):
+                    return None
+                extracted_data[field] = extraction["extracted_data"][field]
+                if field == "manages_properties":
+                    extracted_data["properties_confirmation"] = extraction[
+                        "extracted_data"
+                    ]["properties_confirmation"]
+            if analysis_result.get("category") in (
+                "complete_response",
+                "incomplete_response",
+            ):
+                analysis_result["category"] = local_extractor.categorize(
+                    {"extracted_data": extracted_data}
+                )
+        analysis_result.update(
+            source="near_duplicate",
+            near_duplicate_of=source.id,
+            similarity=round(score, 3),
+            reextracted_fields=changed,
+        )
+
+        follow_up = None
+        # The follow-up may quote the changed answers, so only reuse it as is
+        if not changed and source.ai_generated_response:
+            follow_up = (
+                f"Re: Property Management Information Request - {email_response.hoa.name}",
+                mask_hoa_name(source.ai_generated_response, source.hoa.name).replace(
+                    HOA_PLACEHOLDER, email_response.hoa.name
+                ),
+                f"Adapted from the follow-up to email response {source.id}",
+            )
+        return analysis_result, follow_up
+
+
+near_duplicate_index = NearDuplicateIndex()
@@ -0,0 +1,263 @@
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from postmarker.exceptions import ClientError
+
+from hoa_management.models import OutboundEmail, OutboxMessage
+from services.email_service import EmailService
+
+logger = logging.getLogger(__name__)
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Return True for errors a later attempt may not hit again
+
+    Postmark rejections (invalid or inactive recipients, bad requests) are
+    final; rate limiting, server errors and network failures are retried.
+    """
+    if isinstance(error, ClientError):
+        response = getattr(error.__cause__, "response", None)
+        status_code = response.status_code if response is not None else None
+        return status_code is None or status_code == 429 or status_code >= 500
+    return True
+
+
+class EmailOutbox:
+    """
+    Worker side of the transactional outbox
+
+    Messages are claimed in batches with the same conditional UPDATE scheme as
+    the inbound queue, limited to OUTBOX_DOMAIN_CONCURRENCY in-flight sends per
+    recipient domain across all workers. Claimed messages are sent on a thread
+    pool; results are recorded on the worker's own thread. Transient failures
+    are retried with capped exponential backoff and full jitter.
+    """
+
+    def __init__(
+        self,
+        email_service: EmailService | None = None,
+        concurrency: int | None = None,
+        domain_concurrency: int | None = None,
+        visibility_timeout: int | None = None,
+        retry_backoff: int | None = None,
+        max_backoff: int | None = None,
+    ):
+        self.email_service = email_service or EmailService()
+        self.concurrency = concurrency or settings.OUTBOX_CONCURRENCY
+        self.domain_concurrency = (
+            domain_concurrency or settings.OUTBOX_DOMAIN_CONCURRENCY
+        )
+        self.visibility_timeout = (
+            visibility_timeout or settings.OUTBOX_VISIBILITY_TIMEOUT
+        )
+        self.retry_backoff = retry_backoff or settings.OUTBOX_RETRY_BACKOFF
+        self.max_backoff = max_backoff or settings.OUTBOX_MAX_BACKOFF
+
+    def claim_batch(self, worker_id: str, batch_size: int) -> list[OutboxMessage]:
+        """
+        Claim up to batch_size messages, respecting per-domain limits
+
+        Args:
+            worker_id: Identifier of the claiming worker
+            batch_size: Maximum number of messages to claim
+
+        Returns:
+            List of claimed messages
+        """
+        now = timezone.now()
+        claimable = Q(status__in=["pending", "sending"], available_at__lte=now)
+
+        # Messages whose final attempt timed out are not retried again
+        OutboxMessage.objects.filter(
+            status="sending",
+            available_at__lte=now,
+            attempts__gte=F("max_attempts"),
+        ).update(
+            status="dead",
+            claim_token=None,
+            last_error="Visibility timeout expired on final attempt",
+            updated_at=now,
+        )
+
+        in_flight = dict(
+            OutboxMessage.objects.filter(status="sending", available_at__gt=now)
+            .values("destination_domain")
+            .annotate(count=Count("id"))
+            .values_list("destination_domain", "count")
+        )
+
+        candidate_ids = []
+        candidates = (
+            OutboxMessage.objects.filter(claimable)
+            .order_by("available_at")
+            .values_list("id", "destination_domain")[: batch_size * 4]
+        )
+        for message_id, domain in candidates:
+            if in_flight.get(domain, 0) >= self.domain_concurrency:
+                continue
+            in_flight[domain] = in_flight.get(domain, 0) + 1
+            candidate_ids.append(message_id)
+            if len(candidate_ids) >= batch_size:
+                break
+        if not candidate_ids:
+            return []
+
+        claim_token = uuid.uuid4().hex
+        OutboxMessage.objects.filter(claimable, id__in=candidate_ids).update(
+            status="sending",
+            attempts=F("attempts") + 1,
+            available_at=now + timedelta(seconds=self.visibility_timeout),
+            claim_token=claim_token,
+            claimed_by=worker_id,
+            updated_at=now,
+        )
+        return list(
+            OutboxMessage.objects.filter(claim_token=claim_token).select_related(
+                "outbound_email"
+            )
+        )
+
+    def _finish(self, outbox_message: OutboxMessage, **fields) -> bool:
+        # Only the current claim holder may settle the message
+        fields.setdefault("claim_token", None)
+        fields["updated_at"] = timezone.now()
+        return bool(
+            OutboxMessage.objects.filter(
+                pk=outbox_message.pk, claim_token=outbox_message.claim_token
+            ).update(**fields)
+        )
+
+    def retry_delay(self, attempts: int) -> float:
+        """Full-jitter exponential backoff for the given attempt number"""
+        ceiling = min(self.max_backoff, self.retry_backoff * 2 ** (attempts - 1))
+        return random.uniform(0, ceiling)
+
+    def send(
+        self, outbox_message: OutboxMessage
+    ) -> tuple[str | None, Exception | None]:
+        """Send one message; runs on a worker thread and never touches the outbox"""
+        email_data = {
+            **outbox_message.message,
+            "Metadata": {"idempotency_key": outbox_message.idempotency_key},
+        }
+        try:
+            return self.email_service.deliver(email_data), None
+        except Exception as e:
+            return None, e
+
+    def record_result(
+        self,
+        outbox_message: OutboxMessage,
+        message_id: str | None,
+        error: Exception | None,
+    ) -> None:
+        """Settle a claimed message and its OutboundEmail after a send attempt"""
+        now = timezone.now()
+        if error is None:
+            # The ledger is updated even if the claim was lost meanwhile, so
+            # whichever worker holds the message next will not resend it
+            with transaction.atomic():
+                OutboundEmail.objects.filter(
+                    pk=outbox_message.outbound_email_id
+                ).update(
+                    status="sent",
+                    message_id=message_id or None,
+                    sent_at=now,
+                    updated_at=now,
+                )
+                self._finish(outbox_message, status="sent", last_error=None)
+            return
+
+        if (
+            is_retryable(error)
+            and outbox_message.attempts < outbox_message.max_attempts
+        ):
+            delay = self.retry_delay(outbox_message.attempts)
+            self._finish(
+                outbox_message,
+                status="pending",
+                available_at=now + timedelta(seconds=delay),
+                last_error=str(error),
+            )
+            logger.warning(
+                f"Outbox message {outbox_message.id} failed (attempt {outbox_message.attempts}), "
+                f"retrying in {delay:.0f}s: {str(error)}"
+            )
+            return
+
+        status = "failed" if not is_retryable(error) else "dead"
+        with transaction.atomic():
+            if self._finish(outbox_message, status=status, last_error=str(error)):
+                OutboundEmail.objects.filter(
+                    pk=outbox_message.outbound_email_id
+                ).update(
+                    status="failed",
+                    error_code=getattr(error, "error_code", None),
+                    error_message=str(error),
+                    updated_at=now,
+                )
+        logger.error(f"Outbox message {outbox_message.id} {status}: {str(error)}")
+
+    def process_batch(
+        self, executor: ThreadPoolExecutor, outbox_messages: list[OutboxMessage]
+    ) -> None:
+        """Send a claimed batch concurrently and record the results"""
+        to_send = []
+        for outbox_message in outbox_messages:
+            # A previous attempt was delivered but the worker died before
+            # settling the outbox row; never send it twice
+            if outbox_message.outbound_email.status == "sent":
+                self._finish(outbox_message, status="sent", last_error=None)
+            else:
+                to_send.append(outbox_message)
+
+        for outbox_message, (message_id, error) in zip(
+            to_send, executor.map(self.send, to_send), strict=True
+        ):
+            self.record_result(outbox_message, message_id, error)
+
+    def run_worker(
+        self,
+        batch_size: int | None = None,
+        poll_interval: float | None = None,
+        once: bool = False,
+    ) -> int:
+        """
+        Claim and deliver messages until stopped
+
+        Args:
+            batch_size: Messages to claim per round trip
+            poll_interval: Seconds to sleep when nothing is claimable
+            once: Return as soon as nothing is claimable
+
+        Returns:
+            Number of messages processed
+        """
+        batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        poll_interval = poll_interval or settings.OUTBOX_POLL_INTERVAL
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        processed = 0
+
+        logger.info(f"Outbox worker {worker_id} started")
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            while True:
+                outbox_messages = self.claim_batch(worker_id, batch_size)
+                if not outbox_messages:
+                    if once:
+                        return processed
+                    time.sleep(poll_interval)
+                    continue
+
+                self.process_batch(executor, outbox_messages)
+                processed += len(outbox_messages)
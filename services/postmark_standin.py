@@ -0,0 +1,316 @@
+import heapq
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from services.latency import parse_latency, percentiles
+
+logger = logging.getLogger(__name__)
+
+
+class PostmarkStandIn:
+    """
+    Local HTTP server speaking Postmark's /email and /email/batch endpoints
+
+    Requests are delayed by a configurable latency distribution and can fail
+    with 5xx errors, 429 throttling (randomly or above max_rps) and per-message
+    inactive-recipient rejections. Accepted messages can be answered with a
+    simulated HOA reply posted to the inbound webhook, carrying the reply-to
+    MailboxHash and In-Reply-To header a real reply would have.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8025,
+        latency: str = "fixed:0",
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        reject_rate: float = 0.0,
+        max_rps: float | None = None,
+        webhook_url: str | None = None,
+        reply_rate: float = 0.0,
+        reply_delay: str = "fixed:0",
+        server_token: str | None = None,
+    ):
+        self.sample_latency = parse_latency(latency)
+        self.sample_reply_delay = parse_latency(reply_delay)
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.reject_rate = reject_rate
+        self.max_rps = max_rps
+        self.webhook_url = webhook_url
+        self.reply_rate = reply_rate
+        self.server_token = server_token
+
+        self._lock = threading.Lock()
+        self._tokens = max_rps or 0.0
+        self._refilled_at = time.monotonic()
+        self._replies: list[tuple[float, int, dict]] = []
+        self._reply_sequence = itertools.count()
+        self._reply_ready = threading.Condition(self._lock)
+        self._stopped = threading.Event()
+        self.started_at = time.time()
+        self.counters = {
+            "requests": 0,
+            "messages": 0,
+            "accepted": 0,
+            "rejected": 0,
+            "errors": 0,
+            "throttled": 0,
+            "unauthorized": 0,
+            "webhooks_sent": 0,
+            "webhook_failures": 0,
+        }
+        self.latencies: list[float] = []
+        self.webhook_latencies: list[float] = []
+
+        self.server = ThreadingHTTPServer((host, port), StandInHandler)
+        self.server.daemon_threads = True
+        self.server.standin = self
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def _over_rate_limit(self) -> bool:
+        """Token bucket enforcing max_rps across all handler threads"""
+        if not self.max_rps:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.max_rps, self._tokens + (now - self._refilled_at) * self.max_rps
+            )
+            self._refilled_at = now
+            if self._tokens < 1:
+                return True
+            self._tokens -= 1
+            return False
+
+    def handle_send(self, messages: list[dict]) -> tuple[int, dict | list]:
+        """
+        Apply the configured latency and failure behaviour to a send request
+
+        Returns:
+            Tuple of (HTTP status, JSON response body)
+        """
+        started = time.perf_counter()
+        self.count("requests")
+        self.count("messages", len(messages))
+        time.sleep(self.sample_latency())
+
+        try:
+            if self._over_rate_limit() or random.random() < self.throttle_rate:
+                self.count("throttled")
+                return 429, {"ErrorCode": 429, "Message": "Rate limit exceeded."}
+            if random.random() < self.error_rate:
+                self.count("errors")
+                return 500, {"ErrorCode": 500, "Message": "Internal server error."}
+
+            return 200, [self._accept(message) for message in messages]
+        finally:
+            with self._lock:
+                self.latencies.append(time.perf_counter() - started)
+
+    def _accept(self, message: dict) -> dict:
+        """Build the per-message result and schedule a reply if sampled"""
+        if random.random() < self.reject_rate:
+            self.count("rejected")
+            return {
+                "ErrorCode": 406,
+                "Message": "You tried to send to a recipient that has been marked as inactive.",
+                "To": message.get("To"),
+            }
+
+        message_id = str(uuid.uuid4())
+        self.count("accepted")
+        if self.webhook_url and random.random() < self.reply_rate:
+            self.schedule_reply(message, message_id)
+        return {
+            "ErrorCode": 0,
+            "Message": "OK",
+            "MessageID": message_id,
+            "SubmittedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "To": message.get("To"),
+        }
+
+    def schedule_reply(self, message: dict, message_id: str) -> None:
+        """Queue a simulated HOA reply to an accepted message"""
+        due = time.monotonic() + self.sample_reply_delay()
+        with self._reply_ready:
+            heapq.heappush(
+                self._replies,
+                (
+                    due,
+                    next(self._reply_sequence),
+                    self.build_reply(message, message_id),
+                ),
+            )
+            self._reply_ready.notify()
+
+    @staticmethod
+    def build_reply(message: dict, message_id: str) -> dict:
+        """Build the inbound webhook payload Postmark would post for a reply"""
+        reply_to = message.get("ReplyTo") or ""
+        local_part, _, _ = reply_to.partition("@")
+        _, _, mailbox_hash = local_part.partition("+")
+        thread_id = f"<{message_id}@mtasv.net>"
+        sender = message.get("To", "hoa@example.com")
+
+        return {
+            "From": sender,
+            "FromFull": {"Email": sender, "Name": "", "MailboxHash": ""},
+            "To": reply_to,
+            "OriginalRecipient": reply_to,
+            "MailboxHash": mailbox_hash,
+            "Subject": f"Re: {message.get('Subject', '')}",
+            "MessageID": str(uuid.uuid4()),
+            "Date": formatdate(),
+            "TextBody": (
+                "Hi, yes we manage all of the listed properties. "
+                "Monthly dues are $250 per unit and there are no special assessments.\n\n"
+                f"On {formatdate()}, {message.get('From', '')} wrote:\n> ..."
+            ),
+            "HtmlBody": "",
+            "Headers": [
+                {"Name": "In-Reply-To", "Value": thread_id},
+                {"Name": "References", "Value": thread_id},
+            ],
+            "Attachments": [],
+        }
+
+    def _deliver_replies(self) -> None:
+        """Post due replies to the webhook on a background thread"""
+        session = requests.Session()
+        while not self._stopped.is_set():
+            with self._reply_ready:
+                while not self._replies and not self._stopped.is_set():
+                    self._reply_ready.wait(0.5)
+                if self._stopped.is_set():
+                    return
+                due, _, payload = self._replies[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._reply_ready.wait(delay)
+                    continue
+                heapq.heappop(self._replies)
+
+            started = time.perf_counter()
+            try:
+                response = session.post(self.webhook_url, json=payload, timeout=30)
+                response.raise_for_status()
+                self.count("webhooks_sent")
+            except requests.RequestException as e:
+                self.count("webhook_failures")
+                logger.warning(f"Inbound webhook failed: {str(e)}")
+            with self._lock:
+                self.webhook_latencies.append(time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        """Return counters and latency percentiles in milliseconds"""
+        with self._lock:
+            stats = dict(self.counters)
+            latencies = sorted(self.latencies)
+            webhook_latencies = sorted(self.webhook_latencies)
+            stats["pending_replies"] = len(self._replies)
+
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        stats["uptime_seconds"] = round(elapsed, 1)
+        stats["messages_per_second"] = round(stats["messages"] / elapsed, 1)
+        stats["latency_ms"] = percentiles(latencies)
+        stats["webhook_latency_ms"] = percentiles(webhook_latencies)
+        return stats
+
+    def start(self) -> "PostmarkStandIn":
+        """Serve on background threads and return immediately"""
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        if self.webhook_url:
+            threading.Thread(target=self._deliver_replies, daemon=True).start()
+        return self
+
+    def serve_forever(self) -> None:
+        """Serve on the calling thread until interrupted"""
+        if self.webhook_url:
+            threading.Thread(target=self._deliver_replies, daemon=True).start()
+        self.server.serve_forever()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        with self._reply_ready:
+            self._reply_ready.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Request handler for PostmarkStandIn"""
+
+    protocol_version = "HTTP/1.1"
+    # Avoid Nagle/delayed-ACK stalls between the header and body writes
+    disable_nagle_algorithm = True
+
+    def send_json(self, status: int, data) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self.send_json(200, self.server.standin.stats())
+        else:
+            self.send_json(404, {"ErrorCode": 404, "Message": "Not found."})
+
+    def do_POST(self):
+        standin = self.server.standin
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            data = json.loads(self.rfile.read(length) or b"null")
+        except json.JSONDecodeError:
+            self.send_json(422, {"ErrorCode": 402, "Message": "Invalid JSON."})
+            return
+
+        token = self.headers.get("X-Postmark-Server-Token")
+        if not token or (standin.server_token and token != standin.server_token):
+            standin.count("unauthorized")
+            self.send_json(
+                401,
+                {
+                    "ErrorCode": 10,
+                    "Message": "Request does not contain a valid Server token.",
+                },
+            )
+            return
+
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/email" and isinstance(data, dict):
+            status, result = standin.handle_send([data])
+            if status == 200:
+                result = result[0]
+                # Single sends report rejections as HTTP 422
+                status = 422 if result["ErrorCode"] else 200
+            self.send_json(status, result)
+        elif path == "/email/batch" and isinstance(data, list):
+            status, result = standin.handle_send(data)
+            self.send_json(status, result)
+        else:
+            self.send_json(404, {"ErrorCode": 404, "Message": "Not found."})
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
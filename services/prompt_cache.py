@@ -0,0 +1,61 @@
+import hashlib
+import threading
+import time
+
+
+class PromptPrefixCache:
+    """
+    Static prompt prefixes registered with an LLM backend, per process
+
+    Entries map a backend, model and prefix to the handle the backend uses to
+    refer to the cached prefix (the name of a Gemini cached content, or True
+    for the offline backend) until they expire. A failed registration is
+    stored as None so that the prefix is sent inline until the entry expires
+    instead of being registered again on every call.
+    """
+
+    def __init__(self):
+        self._entries: dict[str, tuple[float, object]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(backend: str, model: str, prefix: str) -> str:
+        digest = hashlib.sha256(prefix.encode()).hexdigest()
+        return f"{backend}:{model}:{digest}"
+
+    def get(self, key: str) -> tuple[bool, object]:
+        """
+        Look up a prefix
+
+        Returns:
+            Tuple of (whether an unexpired entry exists, its handle)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key: str, handle: object, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, handle)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+prompt_prefix_cache = PromptPrefixCache()
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from hoa_management.models import RateLimitBucket
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when no token became available before the timeout"""
+
+
+class TokenBucketRateLimiter:
+    """
+    Named token bucket stored in the database so that every WSGI and queue
+    worker draws from the same budget
+
+    Each acquire reads the bucket row, refills it for the time elapsed and
+    writes the new token count back with a compare-and-swap on the version
+    column; a lost race simply re-reads the row.
+    """
+
+    # Compare-and-swap attempts before a contended acquire backs off
+    MAX_CAS_ATTEMPTS = 10
+
+    def __init__(self, name: str, rate: float, capacity: float):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+
+    def _get_bucket(self) -> RateLimitBucket:
+        try:
+            return RateLimitBucket.objects.get(name=self.name)
+        except RateLimitBucket.DoesNotExist:
+            pass
+        try:
+            with transaction.atomic():
+                return RateLimitBucket.objects.create(
+                    name=self.name,
+                    rate=self.rate,
+                    capacity=self.capacity,
+                    tokens=self.capacity,
+                    refilled_at=time.time(),
+                )
+        except IntegrityError:
+            # Another worker created the bucket first
+            return RateLimitBucket.objects.get(name=self.name)
+
+    def _take(self, tokens: float, waited: float) -> float:
+        """
+        Try to take tokens from the bucket
+
+        Returns:
+            0 when the tokens were taken, otherwise the seconds until enough
+            tokens will be available
+        """
+        for _attempt in range(self.MAX_CAS_ATTEMPTS):
+            bucket = self._get_bucket()
+            now = time.time()
+            elapsed = max(now - bucket.refilled_at, 0)
+            available = min(self.capacity, bucket.tokens + elapsed * self.rate)
+            if available < tokens:
+                return (tokens - available) / self.rate
+
+            updated = RateLimitBucket.objects.filter(
+                pk=bucket.pk, version=bucket.version
+            ).update(
+                tokens=available - tokens,
+                refilled_at=now,
+                rate=self.rate,
+                capacity=self.capacity,
+                version=F("version") + 1,
+                acquired_count=F("acquired_count") + 1,
+                waited_count=F("waited_count") + (1 if waited else 0),
+                total_wait_seconds=F("total_wait_seconds") + waited,
+                max_wait_seconds=Greatest(F("max_wait_seconds"), waited),
+            )
+            if updated:
+                return 0
+        # Heavily contended; let the caller back off briefly
+        return 1 / self.rate
+
+    def _reject(self) -> None:
+        RateLimitBucket.objects.filter(name=self.name).update(
+            rejected_count=F("rejected_count") + 1
+        )
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """
+        Take tokens without waiting
+
+        Args:
+            tokens: Number of tokens to take
+
+        Returns:
+            True if the tokens were taken
+        """
+        if self._take(tokens, waited=0):
+            self._reject()
+            return False
+        return True
+
+    def acquire(self, tokens: float = 1, timeout: float | None = None) -> float:
+        """
+        Take tokens, waiting until they become available
+
+        Args:
+            tokens: Number of tokens to take
+            timeout: Maximum seconds to wait (defaults to RATE_LIMIT_TIMEOUT)
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            RateLimitExceeded: If the tokens could not be taken within timeout
+        """
+        if tokens > self.capacity:
+            raise ValueError(
+                f"Cannot acquire {tokens} tokens from {self.name} bucket "
+                f"with capacity {self.capacity}"
+            )
+        timeout = settings.RATE_LIMIT_TIMEOUT if timeout is None else timeout
+        started = time.monotonic()
+        waited = 0.0
+
+        while True:
+            retry_after = self._take(tokens, waited)
+            if not retry_after:
+                if waited > 0.1:
+                    logger.info(f"Waited {waited:.2f}s for {self.name} rate limit")
+                return waited
+
+            if waited + retry_after > timeout:
+                self._reject()
+                raise RateLimitExceeded(
+                    f"{self.name} rate limit: no token available within {timeout:g}s"
+                )
+            time.sleep(retry_after)
+            waited = time.monotonic() - started
+
+    async def aacquire(self, tokens: float = 1, timeout: float | None = None) -> float:
+        """Async counterpart of acquire that waits without blocking the event loop"""
+        if tokens > self.capacity:
+            raise ValueError(
+                f"Cannot acquire {tokens} tokens from {self.name} bucket "
+                f"with capacity {self.capacity}"
+            )
+        timeout = settings.RATE_LIMIT_TIMEOUT if timeout is None else timeout
+        started = time.monotonic()
+        waited = 0.0
+
+        while True:
+            retry_after = await sync_to_async(self._take)(tokens, waited)
+            if not retry_after:
+                if waited > 0.1:
+                    logger.info(f"Waited {waited:.2f}s for {self.name} rate limit")
+                return waited
+
+            if waited + retry_after > timeout:
+                await sync_to_async(self._reject)()
+                raise RateLimitExceeded(
+                    f"{self.name} rate limit: no token available within {timeout:g}s"
+                )
+            await asyncio.sleep(retry_after)
+            waited = time.monotonic() - started
+
+    def stats(self) -> dict[str, float]:
+        """Return the shared acquire and wait-time counters of the bucket"""
+        bucket = self._get_bucket()
+        return {
+            "acquired": bucket.acquired_count,
+            "rejected": bucket.rejected_count,
+            "waited": bucket.waited_count,
+            "average_wait_ms": bucket.average_wait_ms,
+            "max_wait_ms": bucket.max_wait_seconds * 1000,
+        }
+
+
+postmark_rate_limiter = TokenBucketRateLimiter(
+    "postmark", settings.POSTMARK_RATE_LIMIT, settings.POSTMARK_RATE_BURST
+)
+gemini_rate_limiter = TokenBucketRateLimiter(
+    "gemini", settings.GEMINI_RATE_LIMIT, settings.GEMINI_RATE_BURST
+)
@@ -0,0 +1,446 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import TypeVar
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from google.genai import errors
+
+from hoa_management.models import CircuitBreakerState
+from services.rate_limiter import TokenBucketRateLimiter, gemini_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Statuses worth retrying: request timeout, rate limiting and server errors
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose circuit breaker is open"""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a call did not complete within its deadline"""
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Return True for Gemini errors a later attempt may not hit again
+
+    Rate limiting, server errors, timeouts and connection failures are
+    retried; invalid requests and other 4xx errors are not.
+    """
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    return isinstance(error, httpx.TransportError)
+
+
+def is_timeout(error: Exception) -> bool:
+    return isinstance(error, DeadlineExceeded | httpx.TimeoutException)
+
+
+class CircuitBreaker:
+    """
+    Named circuit breaker stored in the database so that every worker sees
+    the same state
+
+    Calls are counted in fixed windows. Once a window has at least min_calls
+    calls and failure_rate of them failed, the breaker opens and calls fail
+    immediately. After reset_timeout one probe call is let through: success
+    closes the breaker, failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float,
+        min_calls: int,
+        window: float,
+        reset_timeout: float,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+
+    def _get_state(self) -> CircuitBreakerState:
+        try:
+            return CircuitBreakerState.objects.get(name=self.name)
+        except CircuitBreakerState.DoesNotExist:
+            pass
+        try:
+            with transaction.atomic():
+                return CircuitBreakerState.objects.create(
+                    name=self.name, window_started_at=time.time()
+                )
+        except IntegrityError:
+            # Another worker created the breaker first
+            return CircuitBreakerState.objects.get(name=self.name)
+
+    def count(self, **amounts: int) -> None:
+        """Add to the breaker's metric counters"""
+        CircuitBreakerState.objects.filter(name=self.name).update(
+            **{field: F(field) + amount for field, amount in amounts.items()}
+        )
+
+    def allow(self) -> bool:
+        """
+        Return True if a call may be made now
+
+        While open, only the caller that claims the probe after reset_timeout
+        is allowed through.
+        """
+        state = self._get_state()
+        if state.state == "closed":
+            return True
+
+        now = time.time()
+        if now - (state.opened_at or 0) >= self.reset_timeout:
+            # A probe that never reported back is replaced after reset_timeout
+            claimed = CircuitBreakerState.objects.filter(
+                pk=state.pk, state=state.state, opened_at=state.opened_at
+            ).update(state="half_open", opened_at=now)
+            if claimed:
+                logger.info(f"{self.name} circuit breaker half-open, probing")
+                return True
+
+        self.count(short_circuits=1)
+        return False
+
+    def record(self, success: bool, timeout: bool = False) -> None:
+        """
+        Record the outcome of a call
+
+        Args:
+            success: False if the call failed with a retryable error or timeout
+            timeout: The failure was a timeout
+        """
+        now = time.time()
+        state = self._get_state()
+        counters = {
+            "total_calls": F("total_calls") + 1,
+            "total_failures": F("total_failures") + (0 if success else 1),
+            "timeouts": F("timeouts") + (1 if timeout else 0),
+        }
+
+        if state.state != "closed":
+            if success:
+                CircuitBreakerState.objects.filter(pk=state.pk).update(
+                    state="closed",
+                    opened_at=None,
+                    window_started_at=now,
+                    window_calls=0,
+                    window_failures=0,
+                    **counters,
+                )
+                logger.info(f"{self.name} circuit breaker closed")
+            else:
+                CircuitBreakerState.objects.filter(pk=state.pk).update(
+                    state="open", opened_at=now, **counters
+                )
+            return
+
+        if now - state.window_started_at >= self.window:
+            CircuitBreakerState.objects.filter(
+                pk=state.pk, window_started_at=state.window_started_at
+            ).update(window_started_at=now, window_calls=0, window_failures=0)
+        CircuitBreakerState.objects.filter(pk=state.pk).update(
+            window_calls=F("window_calls") + 1,
+            window_failures=F("window_failures") + (0 if success else 1),
+            **counters,
+        )
+        if success:
+            return
+
+        state.refresh_from_db(fields=["state", "window_calls", "window_failures"])
+        if (
+            state.state == "closed"
+            and state.window_calls >= self.min_calls
+            and state.window_failures / state.window_calls >= self.failure_rate
+        ):
+            tripped = CircuitBreakerState.objects.filter(
+                pk=state.pk, state="closed"
+            ).update(state="open", opened_at=now, trips=F("trips") + 1)
+            if tripped:
+                logger.warning(
+                    f"{self.name} circuit breaker opened: {state.window_failures} of "
+                    f"{state.window_calls} calls failed"
+                )
+
+    def stats(self) -> dict:
+        """Return the breaker state and its call, retry and hedge counters"""
+        state = self._get_state()
+        return {
+            "state": state.state,
+            "calls": state.total_calls,
+            "failures": state.total_failures,
+            "timeouts": state.timeouts,
+            "retries": state.retries,
+            "hedges": state.hedges,
+            "hedge_wins": state.hedge_wins,
+            "short_circuits": state.short_circuits,
+            "trips": state.trips,
+        }
+
+
+class LatencyTracker:
+    """Recent successful call latencies of this process"""
+
+    # Fewer samples than this give no usable p95
+    MIN_SAMPLES = 20
+
+    def __init__(self, size: int = 200):
+        self._latencies: deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def percentile(self, q: float, default: float) -> float:
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < self.MIN_SAMPLES:
+            return default
+        return latencies[min(int(len(latencies) * q), len(latencies) - 1)]
+
+
+# Runs primary and hedged requests when hedging; threads make HTTP calls only
+hedge_executor = ThreadPoolExecutor(thread_name_prefix="hedge")
+
+
+class ResilientCaller:
+    """
+    Calls an external service with a deadline, retries, a circuit breaker and
+    optional hedging
+
+    Each attempt is passed the seconds left before the deadline, to use as
+    its request timeout. Retryable failures are retried with full-jitter
+    exponential backoff while the deadline allows. With hedging, a second
+    request is sent when the first has not answered after the recent p95
+    latency, and whichever answers first wins.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        rate_limiter: TokenBucketRateLimiter | None = None,
+        deadline: float | None = None,
+        max_retries: int | None = None,
+        backoff: float | None = None,
+        max_backoff: float | None = None,
+        hedge: bool | None = None,
+        hedge_delay: float | None = None,
+    ):
+        self.breaker = breaker
+        self.rate_limiter = rate_limiter
+        self.deadline = deadline or settings.GEMINI_DEADLINE
+        self.max_retries = (
+            settings.GEMINI_MAX_RETRIES if max_retries is None else max_retries
+        )
+        self.backoff = backoff or settings.GEMINI_RETRY_BACKOFF
+        self.max_backoff = max_backoff or settings.GEMINI_MAX_BACKOFF
+        self.hedge = settings.GEMINI_HEDGE_ENABLED if hedge is None else hedge
+        self.default_hedge_delay = hedge_delay or settings.GEMINI_HEDGE_DELAY
+        self.latencies = LatencyTracker()
+
+    def retry_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given attempt number"""
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        )
+
+    def hedge_delay(self) -> float:
+        return self.latencies.percentile(0.95, self.default_hedge_delay)
+
+    @staticmethod
+    def _limiter_timeout(deadline: float) -> float:
+        return max(min(settings.RATE_LIMIT_TIMEOUT, deadline - time.monotonic()), 0)
+
+    def _start_attempt(self, deadline: float) -> None:
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.breaker.name} circuit breaker is open")
+        if time.monotonic() >= deadline:
+            raise DeadlineExceeded(f"{self.breaker.name} call deadline exceeded")
+
+    def _handle_failure(self, error: Exception, attempt: int, deadline: float) -> float:
+        """
+        Record a failed attempt and decide whether to retry it
+
+        Returns:
+            Seconds to wait before retrying
+
+        Raises:
+            The error, when it is final or no retry fits in the deadline
+        """
+        retryable = is_retryable(error)
+        if retryable or is_timeout(error):
+            self.breaker.record(False, timeout=is_timeout(error))
+        if not retryable or attempt > self.max_retries:
+            raise error
+
+        delay = self.retry_delay(attempt)
+        if time.monotonic() + delay >= deadline:
+            raise error
+        self.breaker.count(retries=1)
+        logger.warning(
+            f"{self.breaker.name} call failed (attempt {attempt}), "
+            f"retrying in {delay:.1f}s: {str(error)}"
+        )
+        return delay
+
+    def _record_success(self, started: float) -> None:
+        self.latencies.record(time.monotonic() - started)
+        self.breaker.record(True)
+
+    def call(self, fn: Callable[[float], T]) -> T:
+        """
+        Call fn(timeout) under the resilience policy
+
+        Args:
+            fn: Makes one attempt, given the seconds left before the deadline
+
+        Returns:
+            The result of the first successful attempt
+
+        Raises:
+            CircuitOpenError: If the breaker is open
+            DeadlineExceeded: If no attempt succeeded before the deadline
+        """
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            attempt += 1
+            self._start_attempt(deadline)
+            if self.rate_limiter:
+                self.rate_limiter.acquire(timeout=self._limiter_timeout(deadline))
+
+            started = time.monotonic()
+            try:
+                result = self._attempt(fn, deadline)
+            except Exception as e:
+                time.sleep(self._handle_failure(e, attempt, deadline))
+                continue
+            self._record_success(started)
+            return result
+
+    def _attempt(self, fn: Callable[[float], T], deadline: float) -> T:
+        if not self.hedge:
+            return fn(deadline - time.monotonic())
+
+        primary = hedge_executor.submit(fn, deadline - time.monotonic())
+        pending = {primary}
+        done, _ = wait(
+            pending, timeout=min(self.hedge_delay(), deadline - time.monotonic())
+        )
+        # A hedge needs its own rate-limit token, but never waits for one
+        if not done and (not self.rate_limiter or self.rate_limiter.try_acquire()):
+            hedged = hedge_executor.submit(fn, deadline - time.monotonic())
+            pending.add(hedged)
+            self.breaker.count(hedges=1)
+        else:
+            hedged = None
+
+        error = None
+        while pending:
+            done, pending = wait(
+                pending,
+                timeout=max(deadline - time.monotonic(), 0),
+                return_when=FIRST_COMPLETED,
+            )
+            if not done:
+                raise DeadlineExceeded(f"{self.breaker.name} call deadline exceeded")
+            for future in done:
+                if future.exception() is None:
+                    if future is hedged:
+                        self.breaker.count(hedge_wins=1)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def acall(self, fn: Callable[[float], Awaitable[T]]) -> T:
+        """Async counterpart of call for a coroutine function"""
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            attempt += 1
+            await sync_to_async(self._start_attempt)(deadline)
+            if self.rate_limiter:
+                await self.rate_limiter.aacquire(
+                    timeout=self._limiter_timeout(deadline)
+                )
+
+            started = time.monotonic()
+            try:
+                result = await self._aattempt(fn, deadline)
+            except Exception as e:
+                delay = await sync_to_async(self._handle_failure)(e, attempt, deadline)
+                await asyncio.sleep(delay)
+                continue
+            await sync_to_async(self._record_success)(started)
+            return result
+
+    async def _aattempt(
+        self, fn: Callable[[float], Awaitable[T]], deadline: float
+    ) -> T:
+        def remaining() -> float:
+            return max(deadline - time.monotonic(), 0)
+
+        primary = asyncio.ensure_future(fn(remaining()))
+        tasks = {primary}
+        hedged = None
+        try:
+            if self.hedge:
+                done, _ = await asyncio.wait(
+                    tasks, timeout=min(self.hedge_delay(), remaining())
+                )
+                if not done and (
+                    not self.rate_limiter
+                    or await sync_to_async(self.rate_limiter.try_acquire)()
+                ):
+                    hedged = asyncio.ensure_future(fn(remaining()))
+                    tasks.add(hedged)
+                    await sync_to_async(self.breaker.count)(hedges=1)
+
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(
+                    tasks, timeout=remaining(), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise DeadlineExceeded(
+                        f"{self.breaker.name} call deadline exceeded"
+                    )
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedged:
+                            await sync_to_async(self.breaker.count)(hedge_wins=1)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Cancel the slower request
+            for task in tasks:
+                task.cancel()
+
+
+gemini_breaker = CircuitBreaker(
+    "gemini",
+    failure_rate=settings.GEMINI_BREAKER_FAILURE_RATE,
+    min_calls=settings.GEMINI_BREAKER_MIN_CALLS,
+    window=settings.GEMINI_BREAKER_WINDOW,
+    reset_timeout=settings.GEMINI_BREAKER_RESET,
+)
+gemini_caller = ResilientCaller(gemini_breaker, gemini_rate_limiter)